@@ -0,0 +1,1076 @@
+#!/usr/bin/env python3
+"""Benchmarks for HDRezka Downloader against a local stand-in site + CDN.
+
+The mock server emulates everything the downloader talks to:
+
+* ``/``                        — homepage, sets a session cookie;
+* ``/search/``                 — search results markup;
+* ``/series/<id>-*.html``      — title pages with ``initCDNSeriesEvents``;
+* ``/ajax/get_cdn_series/``    — ``get_episodes`` / ``get_stream`` /
+  ``get_movie`` answers with streams encoded in the ``StreamDecoder``
+  format;
+* ``/cdn/...mp4``              — large synthetic MP4-shaped files with
+  configurable latency, per-connection bandwidth cap, Range support and
+  injected failures.
+
+Usage::
+
+    python benchmark.py run --episodes 20 --size-mb 50 --threads 10
+    python benchmark.py run --transports requests urllib3 --repeat 3
+    python benchmark.py serve --port 8080      # mock only, for manual runs
+    python benchmark.py startup --budget-ms 50 # import-time gate
+    python benchmark.py scale --episodes 5000  # memory vs. series length
+    python benchmark.py resolve --cassette site.json --latency-scale 0
+    python benchmark.py play --episodes 8 --link-mbps 400
+"""
+
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TITLE_ID_BASE = 1000
+TRANSLATOR_ID_BASE = 56
+QUALITIES = ("360p", "480p", "720p", "1080p")
+MOOV_SIZE = 1024
+HERE = os.path.dirname(os.path.abspath(__file__))
+# must not be imported by ``import main`` — they are loaded on first use
+DEFERRED_MODULES = ("requests", "bs4", "colorama", "urllib3")
+PATTERN_SIZE = 64 * 1024
+WRITE_BLOCK = 64 * 1024
+REPLAY_SITE = "http://replay.invalid"  # never contacted: cassettes ignore it
+
+
+# ─────────────────────── Stream encoding ─────────────────────────
+def encode_streams(plain: str, seed: int = 0) -> str:
+    """Encode a quality list the way the site does.
+
+    base64 of the plain ``[label]url,...`` string, split into pieces
+    joined by ``//_//`` with a base64 "trash" code prepended to each
+    piece and a ``#h`` marker in front.
+    """
+    from main import TRASH_CODES, StreamDecoder
+
+    rng = random.Random(seed)
+    codes = TRASH_CODES
+    b64 = base64.b64encode(plain.encode()).decode()
+    for _ in range(16):
+        pieces, pos = [], 0
+        while pos < len(b64):
+            step = rng.randint(16, 48)
+            pieces.append(b64[pos:pos + step])
+            pos += step
+        encoded = "#h" + pieces[0] + "".join(
+            "//_//" + rng.choice(codes) + p for p in pieces[1:]
+        )
+        if StreamDecoder.decode(encoded) == plain:
+            return encoded
+    # no split decoded cleanly; the decoder also takes the plain list
+    return plain
+
+
+# ─────────────────────── Synthetic MP4 ───────────────────────────
+def mp4_header(size: int) -> bytes:
+    """``ftyp`` + ``moov`` + ``mdat`` header for a file of ``size`` bytes."""
+    ftyp = struct.pack(">I4s4sI4s4s", 24, b"ftyp", b"isom", 512,
+                       b"isom", b"mp41")
+    moov = struct.pack(">I4s", MOOV_SIZE, b"moov") + b"\0" * (MOOV_SIZE - 8)
+    mdat_size = size - len(ftyp) - len(moov)
+    if mdat_size < 2 ** 32:
+        mdat = struct.pack(">I4s", mdat_size, b"mdat")
+    else:
+        mdat = struct.pack(">I4sQ", 1, b"mdat", mdat_size)
+    return ftyp + moov + mdat
+
+
+_PATTERN = bytes(range(256)) * (PATTERN_SIZE // 256)
+
+
+def iter_body(size: int, start: int, end: int):
+    """Yield bytes ``start..end`` (inclusive) of a synthetic file."""
+    header = mp4_header(size)
+    pos = start
+    if pos < len(header):
+        chunk = header[pos:min(end + 1, len(header))]
+        yield chunk
+        pos += len(chunk)
+    while pos <= end:
+        off = pos % PATTERN_SIZE
+        n = min(PATTERN_SIZE - off, end + 1 - pos, WRITE_BLOCK)
+        yield _PATTERN[off:off + n]
+        pos += n
+
+
+# ─────────────────────── Mock site ───────────────────────────────
+class MockOptions:
+    def __init__(self, titles=5, seasons=1, episodes=10, voices=1,
+                 size=20 * 1024 ** 2, size_jitter=0.0,
+                 site_latency=0.0, cdn_latency=0.0, bandwidth=0,
+                 fail_rate=0.0, ranges=True, seed=0, gaps=0, link=0):
+        self.titles = titles
+        self.seasons = seasons
+        self.episodes = episodes
+        self.voices = voices
+        self.size = size
+        self.size_jitter = size_jitter
+        self.site_latency = site_latency
+        self.cdn_latency = cdn_latency
+        self.bandwidth = bandwidth
+        self.fail_rate = fail_rate
+        self.ranges = ranges
+        self.seed = seed
+        self.gaps = gaps  # every Nth episode number is not listed
+        self.link = link  # bytes/s shared by all CDN connections, 0 = off
+
+    def has_episode(self, season: int, episode: int) -> bool:
+        return (1 <= season <= self.seasons
+                and 1 <= episode <= self.episodes
+                and not (self.gaps and episode % self.gaps == 0))
+
+    def episode_numbers(self) -> list:
+        """Listed episode numbers of every season, up to ``episodes``."""
+        return [e for e in range(1, self.episodes + 1)
+                if not (self.gaps and e % self.gaps == 0)]
+
+    def file_size(self, season: int, episode: int) -> int:
+        if not self.size_jitter:
+            return self.size
+        spread = ((season * 31 + episode) * 7919 % 100) / 100.0
+        return int(self.size * (1 - self.size_jitter * spread))
+
+
+class MockSite(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, opts: MockOptions):
+        super().__init__(addr, _MockHandler)
+        self.opts = opts
+        self.rng = random.Random(opts.seed)
+        self.rng_lock = threading.Lock()
+        self.stats = {"requests": 0, "cdn_bytes": 0, "failures": 0}
+        self.link_lock = threading.Lock()
+        self.link_free = 0.0  # when the shared link can send again
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def roll_failure(self) -> bool:
+        if not self.opts.fail_rate:
+            return False
+        with self.rng_lock:
+            return self.rng.random() < self.opts.fail_rate
+
+    def link_wait(self, n: int):
+        """Pace ``n`` bytes on the link all CDN connections share."""
+        now = time.perf_counter()
+        with self.link_lock:
+            self.link_free = max(self.link_free, now) + n / self.opts.link
+            delay = self.link_free - now
+        time.sleep(delay)
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out separately
+    server: MockSite
+
+    def log_message(self, *args):
+        pass
+
+    # ── helpers ──
+    def _send(self, body: bytes, ctype="text/html; charset=utf-8",
+              status=200, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _json(self, obj):
+        self._send(json.dumps(obj, ensure_ascii=False).encode(),
+                   "application/json; charset=utf-8")
+
+    def _title_url(self, tid: int) -> str:
+        return f"{self.server.base_url}/series/drama/{tid}-bench-{tid}.html"
+
+    # ── routes ──
+    def do_GET(self):
+        self.server.stats["requests"] += 1
+        path = urlparse(self.path).path
+        if path.startswith("/cdn/"):
+            return self._cdn(path)
+        if self.server.opts.site_latency:
+            time.sleep(self.server.opts.site_latency)
+        if path == "/":
+            return self._send(
+                b"<html><body>home</body></html>",
+                headers={"Set-Cookie": "PHPSESSID=bench; path=/"},
+            )
+        if path == "/search/":
+            return self._search()
+        m = re.match(r"^/series/\w+/(\d+)-", path)
+        if m:
+            return self._title_page(int(m.group(1)))
+        self._send(b"not found", status=404)
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        self.server.stats["requests"] += 1
+        length = int(self.headers.get("Content-Length", 0))
+        form = {
+            k: v[0] for k, v in
+            parse_qs(self.rfile.read(length).decode()).items()
+        }
+        if self.server.opts.site_latency:
+            time.sleep(self.server.opts.site_latency)
+        if not urlparse(self.path).path.startswith("/ajax/get_cdn_series"):
+            return self._send(b"not found", status=404)
+        action = form.get("action")
+        if action == "get_episodes":
+            return self._json(self._episodes(int(form.get("id", 0))))
+        if action in ("get_stream", "get_movie"):
+            season = int(form.get("season", 1))
+            episode = int(form.get("episode", 1))
+            opts = self.server.opts
+            if not opts.has_episode(season, episode):
+                return self._json({"success": False,
+                                   "message": "Нет данных"})
+            return self._json({
+                "success": True,
+                "url": self._streams(form, season, episode),
+            })
+        self._json({"success": False, "message": "bad action"})
+
+    def _search(self):
+        items = []
+        for i in range(self.server.opts.titles):
+            tid = TITLE_ID_BASE + i
+            url = self._title_url(tid)
+            items.append(
+                f'<div class="b-content__inline_item" data-id="{tid}">'
+                f'<div class="b-content__inline_item-cover">'
+                f'<a href="{url}"><img src=""/></a>'
+                f'<i class="entity">Сериал</i></div>'
+                f'<div class="b-content__inline_item-link">'
+                f'<a href="{url}">Bench Series {i + 1}</a>'
+                f'<div>2020, Benchland, Drama</div></div></div>'
+            )
+        self._send(("<html><body>" + "".join(items)
+                    + "</body></html>").encode())
+
+    def _episode_lists(self):
+        opts = self.server.opts
+        tabs = "".join(
+            f'<li class="b-simple_season__item" data-tab_id="{s}">'
+            f'Сезон {s}</li>'
+            for s in range(1, opts.seasons + 1)
+        )
+        lists = "".join(
+            f'<ul id="simple-episodes-list-{s}">' + "".join(
+                f'<li class="b-simple_episode__item" data-season_id="{s}"'
+                f' data-episode_id="{e}">Серия {e}</li>'
+                for e in opts.episode_numbers()
+            ) + "</ul>"
+            for s in range(1, opts.seasons + 1)
+        )
+        return tabs, lists
+
+    def _title_page(self, tid: int):
+        opts = self.server.opts
+        voices = "".join(
+            f'<li data-translator_id="{TRANSLATOR_ID_BASE + v}">'
+            f'Voice {v + 1}</li>'
+            for v in range(opts.voices)
+        )
+        tabs, lists = self._episode_lists()
+        html = (
+            "<html><body>"
+            f"<h1>Bench Series {tid - TITLE_ID_BASE + 1}</h1>"
+            '<table><tr><td itemprop="duration">45 мин.</td></tr></table>'
+            '<span itemprop="genre">Drama</span>'
+            '<span class="b-post__info_rates imdb"><span>8.1</span></span>'
+            f'<ul id="translators-list">{voices}</ul>'
+            f'<ul id="simple-seasons-tabs">{tabs}</ul>{lists}'
+            "<script>$(function(){sof.tv.initCDNSeriesEvents("
+            f"{tid}, {TRANSLATOR_ID_BASE}, 1, 1, false, 'bench', false, "
+            "{});});</script>"
+            "</body></html>"
+        )
+        self._send(html.encode())
+
+    def _episodes(self, tid: int) -> dict:
+        tabs, lists = self._episode_lists()
+        return {"success": True, "seasons": tabs, "episodes": lists}
+
+    def _streams(self, form: dict, season: int, episode: int) -> str:
+        base = self.server.base_url
+        tid = form.get("id", "0")
+        voice = form.get("translator_id", "0")
+        plain = ",".join(
+            f"[{q}]{base}/cdn/{tid}/{voice}/s{season}e{episode}-{q}.mp4"
+            f":hls:manifest.m3u8 or "
+            f"{base}/cdn/{tid}/{voice}/s{season}e{episode}-{q}.mp4"
+            for q in QUALITIES
+        )
+        return encode_streams(plain, seed=season * 1000 + episode)
+
+    def _cdn(self, path: str):
+        opts = self.server.opts
+        m = re.search(r"/s(\d+)e(\d+)-", path)
+        season, episode = (int(m.group(1)), int(m.group(2))) if m else (1, 1)
+        size = opts.file_size(season, episode)
+        if opts.cdn_latency:
+            time.sleep(opts.cdn_latency)
+        failing = self.server.roll_failure()
+        if failing and self.server.rng.random() < 0.5:
+            self.server.stats["failures"] += 1
+            return self._send(b"busy", status=503,
+                              headers={"Retry-After": "1"})
+
+        start, end, status = 0, size - 1, 200
+        rng = self.headers.get("Range")
+        if rng and opts.ranges:
+            m = re.match(r"bytes=(\d*)-(\d*)", rng)
+            if m and m.group(1):
+                start = int(m.group(1))
+                if m.group(2):
+                    end = min(int(m.group(2)), size - 1)
+                status = 206
+            if start >= size:
+                return self._send(
+                    b"", status=416,
+                    headers={"Content-Range": f"bytes */{size}"},
+                )
+        self.send_response(status)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(end - start + 1))
+        if opts.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range",
+                             f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+
+        cut = None
+        if failing:
+            self.server.stats["failures"] += 1
+            cut = start + int((end - start) * self.server.rng.random())
+        sent, began = 0, time.perf_counter()
+        try:
+            for block in iter_body(size, start, end):
+                if cut is not None and start + sent + len(block) > cut:
+                    self.close_connection = True
+                    return
+                if opts.link:
+                    self.server.link_wait(len(block))
+                self.wfile.write(block)
+                sent += len(block)
+                if opts.bandwidth:
+                    ahead = sent / opts.bandwidth - (
+                        time.perf_counter() - began
+                    )
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            self.server.stats["cdn_bytes"] += sent
+
+
+def _serve(opts: MockOptions, host: str, port: int, ready=None):
+    server = MockSite((host, port), opts)
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_mock(opts: MockOptions, host: str = "127.0.0.1"):
+    """Run the mock site in a child process; return (process, base_url)."""
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    proc = ctx.Process(target=_serve, args=(opts, host, 0, ready),
+                       daemon=True)
+    proc.start()
+    port = ready.get(timeout=30)
+    return proc, f"http://{host}:{port}"
+
+
+# ─────────────────────── Engines ─────────────────────────────────
+def _engine_threadpool(site_url: str, workdir: str, args) -> dict:
+    """Current engine: Search → MediaInfo → Downloader thread pool."""
+    import main
+
+    main.DOWNLOADS_DIR = workdir
+    config = main.Config.from_dict({
+        "threads": args.threads, "site_url": site_url, "credentials": {},
+    })
+    client = main.HttpClient(site_url, {}, session_file=None,
+                             transport=args.transport, dns_cache=True)
+    search = main.Search("bench", client, site_url)
+    media = main.MediaInfo(search.get(1), client).data
+    voices = media["translations_list"]
+    dl = main.Downloader(media, args.quality, config, client,
+                         translator_id=voices[0]["id"] if voices else None)
+    dl.download_episodes(1, 1, args.episodes)
+    return {"episodes": args.episodes}
+
+
+ENGINES = {
+    "threadpool": _engine_threadpool,
+}
+
+
+def _rusage():
+    if resource is None:
+        return 0.0, 0
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    peak = ru.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return ru.ru_utime + ru.ru_stime, peak
+
+
+def _ajax_latency(site_url: str, transport: str, calls: int) -> list:
+    """Milliseconds of ``calls`` sequential ``get_stream`` POSTs."""
+    import main
+
+    client = main.HttpClient(site_url, {}, session_file=None,
+                             transport=transport)
+    url = site_url + "/ajax/get_cdn_series/"
+    samples = []
+    try:
+        for i in range(calls):
+            t0 = time.perf_counter()
+            client.post_ajax(url, {
+                "id": TITLE_ID_BASE, "translator_id": TRANSLATOR_ID_BASE,
+                "season": 1, "episode": 1 + i % 10, "action": "get_stream",
+            }).json()
+            samples.append((time.perf_counter() - t0) * 1000)
+    finally:
+        client.close()
+    return sorted(samples)
+
+
+def _run_engine(name: str, site_url: str, args, results):
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w", encoding="utf-8")
+    try:
+        cpu0, _ = _rusage()
+        t0 = time.perf_counter()
+        info = ENGINES[name](site_url, workdir, args)
+        wall = time.perf_counter() - t0
+        cpu1, peak = _rusage()
+        ajax = _ajax_latency(site_url, args.transport, args.ajax_calls)
+        total = 0
+        files = 0
+        for root, _, names in os.walk(workdir):
+            for n in names:
+                if n.endswith(".mp4"):
+                    files += 1
+                    total += os.path.getsize(os.path.join(root, n))
+        results.put({
+            "engine": name,
+            "transport": args.transport,
+            "episodes": files,
+            "requested": info.get("episodes", files),
+            "bytes": total,
+            "wall_s": round(wall, 3),
+            "episodes_per_min": round(files / wall * 60, 2) if wall else 0,
+            "gb_per_s": round(total / wall / 1024 ** 3, 4) if wall else 0,
+            "cpu_s": round(cpu1 - cpu0, 3),
+            "cpu_s_per_gb": round(
+                (cpu1 - cpu0) / (total / 1024 ** 3), 3
+            ) if total else None,
+            "peak_rss_mb": round(peak / 1024 ** 2, 1),
+            "ajax_p50_ms": round(ajax[len(ajax) // 2], 2) if ajax else None,
+            "ajax_p95_ms": (round(ajax[int(len(ajax) * 0.95)], 2)
+                            if ajax else None),
+        })
+    except Exception as exc:
+        results.put({"engine": name, "transport": args.transport,
+                     "error": repr(exc)})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _scale_run(site_url: str, workdir: str, args, results):
+    """Download a whole series, tracing Python allocations from the
+    moment the title is loaded."""
+    import tracemalloc
+    import main
+
+    sys.stdout = open(os.devnull, "w", encoding="utf-8")
+    main.DOWNLOADS_DIR = workdir
+    try:
+        config = main.Config.from_dict({
+            "threads": args.threads, "site_url": site_url,
+            "credentials": {},
+        })
+        client = main.HttpClient(site_url, {}, session_file=None,
+                                 transport=args.transport)
+        search = main.Search("bench", client, site_url)
+        media = main.MediaInfo(search.get(1), client).data
+        dl = main.Downloader(media, args.quality, config, client)
+        # fill the write buffer pool up front: its size is fixed, but it
+        # grows lazily and would blur the per-episode numbers
+        pool = client._buffers
+        for buf in [pool.acquire() for _ in range(pool.count)]:
+            pool.release(buf)
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        dl.download_all()
+        wall = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+        _, rss = _rusage()
+        files = sum(
+            n.endswith(".mp4")
+            for _, _, names in os.walk(workdir) for n in names
+        )
+        results.put({
+            "episodes": media["allepisodes"],
+            "files": files,
+            "wall_s": round(wall, 2),
+            "episodes_per_s": round(files / wall, 1) if wall else 0,
+            "peak_traced_kb": round(peak / 1024),
+            "peak_rss_mb": round(rss / 1024 ** 2, 1),
+        })
+    except Exception as exc:
+        results.put({"episodes": args.episodes, "error": repr(exc)})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def cmd_scale(args):
+    """Peak memory of a full-series download at two series lengths;
+    non-zero if the long one needs over ``--max-growth`` times more."""
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for count in (args.baseline_episodes, args.episodes):
+        proc, site_url = start_mock(MockOptions(
+            titles=1, episodes=count, size=int(args.size_kb * 1024),
+            gaps=args.gaps, seed=args.seed,
+        ))
+        try:
+            results = ctx.Queue()
+            p = ctx.Process(target=_scale_run, args=(
+                site_url, tempfile.mkdtemp(prefix="bench-scale-"), args,
+                results,
+            ))
+            p.start()
+            rows.append(results.get())
+            p.join()
+        finally:
+            proc.terminate()
+
+    cols = ("episodes", "files", "wall_s", "episodes_per_s",
+            "peak_traced_kb", "peak_rss_mb")
+    print("  ".join(f"{c:>15}" for c in cols))
+    for row in rows:
+        if "error" in row:
+            print(f"{row['episodes']:>15}  ERROR {row['error']}")
+        else:
+            print("  ".join(f"{str(row.get(c)):>15}" for c in cols))
+    if any("error" in r for r in rows):
+        return 1
+    small, large = rows
+    growth = large["peak_traced_kb"] / max(small["peak_traced_kb"], 1)
+    print(f"{large['episodes'] / small['episodes']:.1f}x the episodes, "
+          f"{growth:.2f}x the peak traced memory "
+          f"(limit {args.max_growth:.2f}x)")
+    if large["files"] < large["episodes"] or growth > args.max_growth:
+        print("FAIL: " + ("missing files" if large["files"] <
+                          large["episodes"] else "memory grows with "
+                          "series length"))
+        return 1
+    return 0
+
+
+def _resolve_path(client, quality: str, episodes: int) -> dict:
+    """Search → title page → voice discovery → stream URLs of the first
+    ``episodes`` episodes; seconds per stage and a digest of the URLs."""
+    import hashlib
+    import main
+
+    row = {}
+    t0 = time.perf_counter()
+    search = main.Search("bench", client, client.site_url)
+    result = search.get(1)
+    t1 = time.perf_counter()
+    media = main.MediaInfo(result, client).data
+    t2 = time.perf_counter()
+    stream = main.StreamFetcher(client)
+    voice = main.VoiceInfo.best(stream.discover_voices(media))
+    t3 = time.perf_counter()
+    urls = [
+        stream.get_stream_url(
+            media["url"],
+            stream.probe_payload(media, voice.translator_id, 1, e),
+            quality, is_series=True,
+        )
+        for e in range(1, episodes + 1)
+    ]
+    t4 = time.perf_counter()
+    row.update(
+        search_s=round(t1 - t0, 4), title_s=round(t2 - t1, 4),
+        voices_s=round(t3 - t2, 4), streams_s=round(t4 - t3, 4),
+        digest=hashlib.sha256("\n".join(urls).encode()).hexdigest()[:12],
+    )
+    return row
+
+
+def _resolve_run(site_url: str, cassette_path: str, replay: bool, args,
+                 results):
+    import main
+
+    try:
+        cassette = main.Cassette(cassette_path, replay=replay,
+                                 latency=args.latency_scale)
+        client = main.HttpClient(site_url, {}, session_file=None,
+                                 transport=args.transport,
+                                 cassette=cassette)
+        cpu0, _ = _rusage()
+        t0 = time.perf_counter()
+        try:
+            row = _resolve_path(client, args.quality, args.episodes)
+        finally:
+            client.close()
+        row["wall_s"] = round(time.perf_counter() - t0, 4)
+        row["cpu_s"] = round(_rusage()[0] - cpu0, 3)
+        row["mode"] = "replay" if replay else "record"
+        row["latency"] = args.latency_scale if replay else 1.0
+        row["exchanges"] = len(cassette.exchanges)
+        results.put(row)
+    except Exception as exc:
+        results.put({"mode": "replay" if replay else "record",
+                     "error": repr(exc)})
+
+
+def cmd_resolve(args):
+    """Time the resolve path offline from a cassette (recorded from the
+    mock first unless ``--cassette`` names an existing one); non-zero
+    if a replay resolves different stream URLs than the recording."""
+    ctx = multiprocessing.get_context("spawn")
+    path = args.cassette or os.path.join(
+        tempfile.mkdtemp(prefix="bench-cassette-"), "site.json"
+    )
+    rows = []
+
+    def run(site_url: str, replay: bool):
+        results = ctx.Queue()
+        p = ctx.Process(target=_resolve_run,
+                        args=(site_url, path, replay, args, results))
+        p.start()
+        rows.append(results.get())
+        p.join()
+
+    if args.record or not os.path.exists(path):
+        proc, site_url = start_mock(MockOptions(
+            episodes=max(args.episodes, 10), voices=args.voices,
+            site_latency=args.site_latency_ms / 1000.0, seed=args.seed,
+        ))
+        try:
+            run(site_url, replay=False)
+        finally:
+            proc.terminate()
+    for _ in range(args.repeat):
+        run(REPLAY_SITE, replay=True)
+
+    cols = ("mode", "latency", "exchanges", "wall_s", "cpu_s", "search_s",
+            "title_s", "voices_s", "streams_s", "digest")
+    print("  ".join(f"{c:>12}" for c in cols))
+    for row in rows:
+        if "error" in row:
+            print(f"{row['mode']:>12}  ERROR {row['error']}")
+        else:
+            print("  ".join(f"{str(row.get(c)):>12}" for c in cols))
+    print(f"cassette: {path}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    if any("error" in r for r in rows):
+        return 1
+    if len({r["digest"] for r in rows}) > 1:
+        print("FAIL: replays resolved different stream URLs")
+        return 1
+    return 0
+
+
+def _play_run(site_url: str, workdir: str, args, play: bool, results):
+    """Download a season; time until the first episode can be played:
+    the first ``--first-mb`` read from the stream server with ``play``,
+    the finished file without it."""
+    import hashlib
+    import urllib.error
+    import urllib.request
+    import main
+
+    sys.stdout = open(os.devnull, "w", encoding="utf-8")
+    main.DOWNLOADS_DIR = workdir
+    server = main.StreamServer(workdir, port=0) if play else None
+    try:
+        config = main.Config.from_dict({
+            "threads": args.threads, "site_url": site_url,
+            "credentials": {},
+        })
+        client = main.HttpClient(site_url, {}, session_file=None,
+                                 transport=args.transport)
+        search = main.Search("bench", client, site_url)
+        media = main.MediaInfo(search.get(1), client).data
+        dl = main.Downloader(media, args.quality, config, client,
+                             server=server)
+        dest = dl._episode_path(1, 1)
+        t0 = time.perf_counter()
+        job = threading.Thread(target=dl.download_episodes,
+                               args=(1, 1, args.episodes))
+        job.start()
+        row = {"mode": "play" if play else "plain"}
+        first = args.first_mb * 1024 ** 2
+        if play:
+            digest = hashlib.sha256()
+            got = 0
+            while True:
+                try:
+                    resp = urllib.request.urlopen(server.url(dest))
+                    break
+                except urllib.error.HTTPError as e:
+                    if e.code != 404:
+                        raise
+                    time.sleep(0.01)  # not published yet
+            with resp:
+                while True:
+                    chunk = resp.read(64 * 1024)
+                    if not chunk:
+                        break
+                    if got < first <= got + len(chunk):
+                        row["first_frame_s"] = round(
+                            time.perf_counter() - t0, 3)
+                    got += len(chunk)
+                    digest.update(chunk)
+            row["episode1_s"] = round(time.perf_counter() - t0, 3)
+            row["streamed_mb"] = round(got / 1024 ** 2, 1)
+        else:
+            while not os.path.exists(dest) and job.is_alive():
+                time.sleep(0.01)
+            row["episode1_s"] = row["first_frame_s"] = round(
+                time.perf_counter() - t0, 3)
+        job.join()
+        row["wall_s"] = round(time.perf_counter() - t0, 2)
+        client.close()
+        if play:
+            with open(dest, "rb") as f:
+                row["stream_ok"] = (
+                    hashlib.sha256(f.read()).hexdigest()
+                    == digest.hexdigest()
+                )
+        results.put(row)
+    except Exception as exc:
+        results.put({"mode": "play" if play else "plain",
+                     "error": repr(exc)})
+    finally:
+        if server is not None:
+            server.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def cmd_play(args):
+    """Time to first frame of a season's first episode with and without
+    ``--play`` on a link shared by all transfers; non-zero if the
+    stream differs from the file or playing is not faster."""
+    ctx = multiprocessing.get_context("spawn")
+    proc, site_url = start_mock(MockOptions(
+        titles=1, episodes=args.episodes, size=int(args.size_mb * 1024 ** 2),
+        link=int(args.link_mbps * 1024 ** 2 / 8), seed=args.seed,
+    ))
+    rows = []
+    try:
+        for play in (False, True):
+            results = ctx.Queue()
+            p = ctx.Process(target=_play_run, args=(
+                site_url, tempfile.mkdtemp(prefix="bench-play-"), args,
+                play, results,
+            ))
+            p.start()
+            rows.append(results.get())
+            p.join()
+    finally:
+        proc.terminate()
+
+    cols = ("mode", "first_frame_s", "episode1_s", "wall_s",
+            "streamed_mb", "stream_ok")
+    print("  ".join(f"{c:>13}" for c in cols))
+    for row in rows:
+        if "error" in row:
+            print(f"{row['mode']:>13}  ERROR {row['error']}")
+        else:
+            print("  ".join(f"{str(row.get(c, '-')):>13}" for c in cols))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    if any("error" in r for r in rows):
+        return 1
+    plain, play = rows
+    print(f"time to first frame: {plain['first_frame_s']:.2f}s -> "
+          f"{play['first_frame_s']:.2f}s "
+          f"({plain['first_frame_s'] / play['first_frame_s']:.1f}x)")
+    if not play["stream_ok"]:
+        print("FAIL: streamed bytes differ from the downloaded file")
+        return 1
+    if play["first_frame_s"] >= plain["first_frame_s"]:
+        print("FAIL: playing while downloading is not faster")
+        return 1
+    return 0
+
+
+def _mock_options(args) -> MockOptions:
+    return MockOptions(
+        seasons=1, episodes=args.episodes, voices=args.voices,
+        size=int(args.size_mb * 1024 ** 2), size_jitter=args.size_jitter,
+        site_latency=args.site_latency_ms / 1000.0,
+        cdn_latency=args.cdn_latency_ms / 1000.0,
+        bandwidth=int(args.bandwidth_mbps * 1024 ** 2 / 8),
+        fail_rate=args.fail_rate, ranges=not args.no_range,
+        seed=args.seed,
+    )
+
+
+def _print_table(rows: list):
+    cols = ("engine", "transport", "episodes", "wall_s",
+            "episodes_per_min", "gb_per_s", "cpu_s", "cpu_s_per_gb",
+            "peak_rss_mb", "ajax_p50_ms", "ajax_p95_ms")
+    print("  ".join(f"{c:>16}" for c in cols))
+    for row in rows:
+        if "error" in row:
+            print(f"{row['engine']:>16}  {row['transport']:>16}  "
+                  f"ERROR {row['error']}")
+            continue
+        print("  ".join(f"{str(row.get(c)):>16}" for c in cols))
+
+
+def cmd_run(args):
+    proc, site_url = start_mock(_mock_options(args))
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    try:
+        for name in args.engines:
+            for transport in args.transports:
+                run_args = argparse.Namespace(**vars(args))
+                run_args.transport = transport
+                del run_args.func
+                for _ in range(args.repeat):
+                    results = ctx.Queue()
+                    p = ctx.Process(target=_run_engine,
+                                    args=(name, site_url, run_args, results))
+                    p.start()
+                    rows.append(results.get())
+                    p.join()
+    finally:
+        proc.terminate()
+    _print_table(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    return 1 if any("error" in r for r in rows) else 0
+
+
+def cmd_serve(args):
+    opts = _mock_options(args)
+    server = MockSite((args.host, args.port), opts)
+    print(f"Mock site on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _importtime(code: str) -> list:
+    """Run ``python -X importtime -c code``; return (module, self, cum) µs."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=HERE, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)),
+                         len(m.group(3))))
+    return rows
+
+
+def cmd_startup(args):
+    """Import-time report for ``main`` with a budget; non-zero if over."""
+    samples, rows = [], []
+    for _ in range(args.repeat):
+        rows = _importtime("import main")
+        samples.append(next(r[2] for r in rows if r[0] == "main"))
+    import_ms = sorted(samples)[len(samples) // 2] / 1000
+
+    end = next(i for i, r in enumerate(rows) if r[0] == "main")
+    begin = end
+    while begin > 0 and rows[begin - 1][3] > 0:
+        begin -= 1
+    in_main = [r for r in rows[begin:end] if r[3] == 2]
+    loaded = [
+        r[0] for r in rows[begin:end]
+        if r[0].split(".")[0] in DEFERRED_MODULES
+    ]
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", "--help"], cwd=HERE,
+                   capture_output=True, check=True)
+    help_ms = (time.perf_counter() - t0) * 1000
+
+    print(f"import main : {import_ms:.1f} ms (median of {args.repeat}, "
+          f"budget {args.budget_ms:.0f} ms)")
+    print(f"main --help : {help_ms:.1f} ms wall, incl. interpreter")
+    print("top imports under main (cumulative µs):")
+    for name, _, cum, _ in sorted(in_main, key=lambda r: -r[2])[:10]:
+        print(f"  {cum:>8}  {name}")
+
+    failed = False
+    if loaded:
+        print(f"FAIL: eagerly imported: {', '.join(sorted(set(loaded)))}")
+        failed = True
+    if import_ms > args.budget_ms:
+        print("FAIL: import time over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+def _add_mock_args(p):
+    p.add_argument("--episodes", type=int, default=10)
+    p.add_argument("--voices", type=int, default=1)
+    p.add_argument("--size-mb", type=float, default=20,
+                   help="synthetic file size per episode")
+    p.add_argument("--size-jitter", type=float, default=0.0,
+                   help="shrink files by up to this fraction")
+    p.add_argument("--site-latency-ms", type=float, default=0)
+    p.add_argument("--cdn-latency-ms", type=float, default=0)
+    p.add_argument("--bandwidth-mbps", type=float, default=0,
+                   help="per-connection CDN cap, 0 = unlimited")
+    p.add_argument("--fail-rate", type=float, default=0.0,
+                   help="fraction of CDN requests that fail")
+    p.add_argument("--no-range", action="store_true",
+                   help="CDN ignores Range requests")
+    p.add_argument("--seed", type=int, default=0)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="end-to-end download benchmark")
+    _add_mock_args(run)
+    run.add_argument("--engines", nargs="+", default=list(ENGINES),
+                     choices=list(ENGINES))
+    run.add_argument("--transports", nargs="+", default=["requests"],
+                     metavar="NAME",
+                     help="HTTP backends to compare (main.TRANSPORTS)")
+    run.add_argument("--ajax-calls", type=int, default=50,
+                     help="sequential AJAX calls timed after each run")
+    run.add_argument("--threads", type=int, default=10)
+    run.add_argument("--quality", default="720p")
+    run.add_argument("--repeat", type=int, default=1)
+    run.add_argument("--json", metavar="FILE")
+    run.add_argument("--verbose", action="store_true",
+                     help="show the engine's own output")
+    run.set_defaults(func=cmd_run)
+
+    startup = sub.add_parser("startup", help="import-time budget check")
+    startup.add_argument("--budget-ms", type=float, default=50)
+    startup.add_argument("--repeat", type=int, default=5)
+    startup.set_defaults(func=cmd_startup)
+
+    scale = sub.add_parser("scale",
+                           help="memory use vs. series length")
+    scale.add_argument("--episodes", type=int, default=5000)
+    scale.add_argument("--baseline-episodes", type=int, default=1000)
+    scale.add_argument("--gaps", type=int, default=10,
+                       help="leave every Nth episode number unlisted")
+    scale.add_argument("--size-kb", type=float, default=16,
+                       help="synthetic file size per episode")
+    scale.add_argument("--threads", type=int, default=10)
+    scale.add_argument("--transport", default="urllib3", metavar="NAME")
+    scale.add_argument("--quality", default="720p")
+    scale.add_argument("--max-growth", type=float, default=1.5)
+    scale.add_argument("--seed", type=int, default=0)
+    scale.set_defaults(func=cmd_scale)
+
+    resolve = sub.add_parser(
+        "resolve", help="resolve-path timings replayed from a cassette",
+    )
+    resolve.add_argument("--cassette", metavar="FILE",
+                         help="cassette to replay (recorded first if "
+                              "missing; default: a temporary file)")
+    resolve.add_argument("--record", action="store_true",
+                         help="re-record --cassette from the mock site")
+    resolve.add_argument("--latency-scale", type=float, default=1.0,
+                         help="replay delay per recorded second "
+                              "(0 = CPU only)")
+    resolve.add_argument("--episodes", type=int, default=10,
+                         help="stream URLs resolved per run")
+    resolve.add_argument("--voices", type=int, default=3)
+    resolve.add_argument("--site-latency-ms", type=float, default=20,
+                         help="mock latency while recording")
+    resolve.add_argument("--transport", default="requests", metavar="NAME",
+                         help="HTTP backend used while recording")
+    resolve.add_argument("--quality", default="720p")
+    resolve.add_argument("--repeat", type=int, default=3)
+    resolve.add_argument("--json", metavar="FILE")
+    resolve.add_argument("--seed", type=int, default=0)
+    resolve.set_defaults(func=cmd_resolve)
+
+    play = sub.add_parser(
+        "play", help="time to first frame while a season downloads",
+    )
+    play.add_argument("--episodes", type=int, default=8)
+    play.add_argument("--size-mb", type=float, default=40,
+                      help="synthetic file size per episode")
+    play.add_argument("--link-mbps", type=float, default=400,
+                      help="CDN bandwidth shared by all transfers")
+    play.add_argument("--first-mb", type=float, default=2,
+                      help="bytes a player needs before the first frame")
+    play.add_argument("--threads", type=int, default=8)
+    play.add_argument("--transport", default="requests", metavar="NAME")
+    play.add_argument("--quality", default="720p")
+    play.add_argument("--json", metavar="FILE")
+    play.add_argument("--seed", type=int, default=0)
+    play.set_defaults(func=cmd_play)
+
+    serve = sub.add_parser("serve", help="run only the mock site")
+    _add_mock_args(serve)
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.set_defaults(func=cmd_serve)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    _args = parse_args()
+    sys.exit(_args.func(_args))
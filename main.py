@@ -1,29 +1,47 @@
 #!/usr/bin/env python3
 """HDRezka Downloader — скачивание фильмов и сериалов с HDRezka."""
 
+from __future__ import annotations
+
+import argparse
 import json
+import logging
 import os
+import queue
+import random
 import re
+import shutil
+import socket
+import struct
 import sys
+import threading
 import time
 import base64
+from abc import ABC, abstractmethod
 from binascii import Error as BinasciiError
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from itertools import product
-from typing import Optional, Tuple, List
+from collections import deque
+from collections import OrderedDict
+from concurrent.futures import (FIRST_COMPLETED, Future,
+                                ThreadPoolExecutor, wait)
+from contextlib import ExitStack, contextmanager, nullcontext
+from itertools import chain, islice, product
+from typing import (TYPE_CHECKING, AsyncIterator, Callable, Iterable,
+                    Iterator, Optional, Sequence, Tuple, List)
 from urllib.parse import urlparse
 
-import requests
-from bs4 import BeautifulSoup
-from colorama import Fore, Style, init
-from tqdm import tqdm
-
-init(autoreset=True)
+if TYPE_CHECKING:  # imported lazily at runtime, see parse_html / Transport
+    from http.cookiejar import Cookie, CookieJar
+    from typing import Union
+    import requests
+    from bs4 import BeautifulSoup
+    Response = Union[requests.Response, "Urllib3Response"]
 
 # ─────────────────────────── Constants ───────────────────────────
 DEFAULT_SITE_URL = "https://rezka.ag"
 ALT_SITE_URL = "https://standby-rezka.tv"
 CONFIG_FILE = "config.json"
+SESSION_FILE = "session.json"
+SESSION_TTL = 12 * 3600      # seconds a saved cookie jar is trusted
 DOWNLOADS_DIR = "downloads"
 USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -32,22 +50,156 @@ USER_AGENT = (
 )
 
 MAX_THREADS = 20
-MAX_RETRIES = 5
-RETRY_DELAY = 3
+MAX_RETRIES = 5             # attempts per operation
+RETRY_BASE_DELAY = 1.0      # seconds, doubled per attempt (full jitter)
+RETRY_MAX_DELAY = 30.0      # backoff cap
+RETRY_AFTER_MAX = 120.0     # cap for server-sent Retry-After
+RETRY_BUDGET = 40           # retries a download job can burst through
+RETRY_REFILL = 0.2          # retries regained per second (one per 5 s)
 CHUNK_SIZE = 1024 * 1024  # 1 MB chunks for faster download
+STALL_TIMEOUT = 20          # seconds without data before a CDN is dropped
+STALL_WINDOW = 30           # seconds of history for the throughput check
+STALL_MIN_RATE = 64 * 1024  # bytes/s below which a transfer is stalled
+READ_SLICE = 16 * 1024      # bytes per read into a CHUNK_SIZE buffer
+MAX_CDN_SWITCHES = 3        # re-resolutions per transfer attempt
+DNS_CACHE_TTL = 300         # seconds a resolved host is reused
+DNS_CACHE_MAX = 256         # resolved (host, port, ...) entries kept
+PREWARM_INTERVAL = 30       # seconds between pre-warms of one CDN host
+CDN_POOL_SIZE = MAX_THREADS + 4  # pooled connections per CDN host
+WRITE_BUFFERS = 2 * MAX_THREADS  # CHUNK_SIZE buffers for disk writers
 MAX_SEASONS_SCAN = 30
-MAX_EPISODES_SCAN = 500
-SIZE_TOLERANCE = 0.95
+EPISODE_PROBE_LIMIT = 1 << 16  # sanity bound when probing episode counts
+SEARCH_CACHE_TTL = 10 * 60   # seconds before a search is revalidated
+TITLE_CACHE_TTL = 30 * 60    # seconds before a title page is revalidated
+CACHE_MAX_ENTRIES = 256
+PREFETCH_TOP_N = 3           # title pages parsed ahead while choosing
+AJAX_CACHE_TTL = 60          # seconds a successful AJAX answer is reused
+AJAX_CACHE_MAX = 512
+DISCOVERY_WORKERS = 6        # voices probed concurrently
+DISCOVERY_TIMEOUT = 30       # seconds for the whole voice discovery
+PREFLIGHT_WORKERS = 8        # episodes resolved + HEAD-ed concurrently
+PREFLIGHT_BATCH = 200        # episodes per preflight round of a long job
+ETA_PROBE_BYTES = 2 * 1024 ** 2  # read to time a CDN without ETA history
+MESSAGE_BACKLOG = 1000       # undrawn status lines kept by a board
+EVENT_BACKLOG = 1000         # job events kept before anyone reads them
+PLAY_PORT = 8765             # default port of the --play stream server
+PRIORITY_SHARE = 0.25        # others' bytes per byte of the played file
+PRIORITY_SLOTS = 2           # other transfers connected while it runs
+PRIORITY_FLOOR = 512 * 1024  # bytes/s the other transfers get at least
+WATCHLIST_FILE = "watchlist.json"
+CATALOG_FILE = "catalog.db"
+CATALOG_FIND_LIMIT = 36      # offline matches listed when search fails
+SYNC_WORKERS = 16            # watchlist titles checked concurrently
+SYNC_INTERVAL = 6 * 3600     # default seconds between checks of a title
+PROGRESS_REFRESH = 0.5       # seconds between redraws on a terminal
+PROGRESS_LOG_INTERVAL = 10   # seconds between status lines without a TTY
+PROGRESS_ROWS = 8            # max per-file rows in the terminal view
+PROGRESS_RATE_WINDOW = 5     # seconds of history for throughput / ETA
+PROGRESS_EVENT_INTERVAL = 1  # seconds between Progress events of a job
+METRICS_INTERVAL = 30        # seconds between periodic JSON dumps
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 300, 1800,
+)
+RATE_BUCKETS = tuple(  # bytes per second, 64 KB/s … 256 MB/s
+    64 * 1024 * 4 ** i for i in range(7)
+)
+WRITE_BUCKETS = (  # seconds per disk write of one buffer
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5,
+)
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32)  # buffers queued for a writer
 
 TRASH_CHARS = ["@", "#", "!", "^", "$"]
 SEPARATORS = ["//_//", "////", "///"]
+# base64 of every 2–3 char TRASH_CHARS combination, longest first
+TRASH_CODES = tuple(sorted(
+    (
+        base64.b64encode("".join(combo).encode()).decode()
+        for length in (2, 3)
+        for combo in product(TRASH_CHARS, repeat=length)
+    ),
+    key=len, reverse=True,
+))
+
+MP4_REQUIRED_BOXES = ("ftyp", "moov", "mdat")
+CHECKSUM_SUFFIX = ".sha256"  # sha256sum-format sidecar of each download
+
+LOG_LEVELS = ("debug", "info", "warning", "error")
+
+
+class Fore:
+    """ANSI colors — the codes colorama uses, without importing it."""
+    RED = "\x1b[31m"
+    GREEN = "\x1b[32m"
+    YELLOW = "\x1b[33m"
+    MAGENTA = "\x1b[35m"
+    CYAN = "\x1b[36m"
+
+
+class Style:
+    RESET_ALL = "\x1b[0m"
+
 
-DEBUG = True
+def init_console():
+    """Let colorama translate/strip ANSI codes (Windows, pipes)."""
+    from colorama import init
+    init(autoreset=True)
 
+log = logging.getLogger("hdrezka")
+log.addHandler(logging.NullHandler())
 
-def debug(msg: str):
-    if DEBUG:
-        print(f"{Fore.MAGENTA}[DEBUG] {msg}{Style.RESET_ALL}")
+
+def debug(msg: str, *args):
+    """Lazy debug log: ``msg % args`` is only built when enabled."""
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(msg, *args)
+
+
+class _ColorFormatter(logging.Formatter):
+    _COLORS = {
+        logging.DEBUG: Fore.MAGENTA,
+        logging.INFO: Fore.CYAN,
+        logging.WARNING: Fore.YELLOW,
+        logging.ERROR: Fore.RED,
+    }
+
+    def format(self, record: logging.LogRecord) -> str:
+        color = self._COLORS.get(record.levelno, Fore.RED)
+        return (f"{color}[{record.levelname}] "
+                f"{super().format(record)}{Style.RESET_ALL}")
+
+
+class _JsonFormatter(logging.Formatter):
+    """One JSON object per line; ``extra=`` fields are kept as keys."""
+    _RESERVED = set(vars(logging.makeLogRecord({}))) | {"message"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key, val in vars(record).items():
+            if key not in self._RESERVED:
+                entry[key] = val
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: str = "warning", json_format: bool = False,
+                  stream=None):
+    """Attach a stderr handler to the ``hdrezka`` logger."""
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(
+        _JsonFormatter() if json_format else _ColorFormatter()
+    )
+    for old in list(log.handlers):
+        log.removeHandler(old)
+    log.addHandler(handler)
+    log.setLevel(getattr(logging, level.upper()))
+    log.propagate = False
 
 
 # ─────────────────────────── Exceptions ──────────────────────────
@@ -69,6 +221,27 @@ class EpisodeOutOfRangeError(DownloaderError):
 class SeasonOutOfRangeError(DownloaderError):
     pass
 
+class SessionExpiredError(DownloaderError):
+    pass
+
+class InsufficientSpaceError(DownloaderError):
+    pass
+
+class StallError(DownloaderError):
+    pass
+
+class RangeMismatchError(DownloaderError):
+    pass
+
+class CassetteMissError(DownloaderError):
+    pass
+
+class HttpStatusError(OSError):
+    """HTTP error status; ``response`` is the offending response."""
+    def __init__(self, message: str, response=None):
+        super().__init__(message)
+        self.response = response
+
 
 # ─────────────────────────── Utilities ───────────────────────────
 def prompt_int(message: str, min_val: int = 1, max_val: int = 100,
@@ -88,6 +261,30 @@ def prompt_int(message: str, min_val: int = 1, max_val: int = 100,
             print(f"{Fore.RED}Enter a valid number.{Style.RESET_ALL}")
 
 
+def prompt_indices(message: str, max_val: int,
+                   default: Optional[int] = None) -> List[int]:
+    """Read 1-based choices such as ``2``, ``1,3``, ``2-4`` or ``all``."""
+    while True:
+        suffix = f" [default: {default}]" if default is not None else ""
+        raw = input(f"{Fore.YELLOW}{message}{suffix}: {Style.RESET_ALL}")
+        raw = raw.strip().lower()
+        if not raw and default is not None:
+            return [default]
+        if raw in ("a", "all"):
+            return list(range(1, max_val + 1))
+        picked: List[int] = []
+        try:
+            for part in raw.replace(" ", "").split(","):
+                lo, _, hi = part.partition("-")
+                picked += range(int(lo), int(hi or lo) + 1)
+        except ValueError:
+            picked = []
+        if picked and all(1 <= i <= max_val for i in picked):
+            return list(dict.fromkeys(picked))
+        print(f"{Fore.RED}Enter numbers between 1 and {max_val}, "
+              f"e.g. 1,3 or 2-4.{Style.RESET_ALL}")
+
+
 def prompt_choice(message: str, options: list, default: str = "") -> str:
     while True:
         raw = input(
@@ -99,6 +296,11 @@ def prompt_choice(message: str, options: list, default: str = "") -> str:
               f"{', '.join(o for o in options if o)}{Style.RESET_ALL}")
 
 
+def parse_html(markup) -> BeautifulSoup:
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(markup, "html.parser")
+
+
 def sanitize_filename(name: str) -> str:
     return re.sub(r'[<>:"/\\|?*]', "_", name).strip(". ")
 
@@ -121,6 +323,657 @@ def format_size(size_bytes: int) -> str:
     return f"{size_bytes:.1f} PB"
 
 
+def quality_rank(label: str) -> int:
+    """Sort key for labels like ``[1080p Ultra]``, ``[720p]``, ``[4K]``."""
+    label = label.lower()
+    if "4k" in label:
+        return 2160 * 10
+    if "2k" in label:
+        return 1440 * 10
+    m = re.search(r"(\d{3,4})p", label)
+    if not m:
+        return 0
+    return int(m.group(1)) * 10 + ("ultra" in label)
+
+
+def format_duration(seconds: float) -> str:
+    """Format seconds as 1h02m / 4m05s / 12s."""
+    seconds = int(max(seconds, 0))
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    if h:
+        return f"{h}h{m:02d}m"
+    if m:
+        return f"{m}m{s:02d}s"
+    return f"{s}s"
+
+
+# ─────────────────────── Events ──────────────────────────────────
+class Event:
+    """Something that happened to the file at ``path`` ("" for the job).
+
+    Subclasses only add fields; ``time`` is the wall-clock timestamp.
+    """
+    __slots__ = ("path", "time")
+
+    def __init__(self, path: str = "", **fields):
+        self.path = path
+        self.time = time.time()
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{n}={getattr(self, n)!r}"
+                           for n in ("path",) + type(self).__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Info(Event):
+    """Status line; ``level`` is info, ok, warning or error."""
+    __slots__ = ("text", "level")
+
+
+class Resolved(Event):
+    """Stream URL found; ``size`` is ``None`` until known."""
+    __slots__ = ("url", "size")
+
+
+class Started(Event):
+    """Transfer opened; ``total`` is 0 when the CDN sent no length."""
+    __slots__ = ("total",)
+
+
+class Progress(Event):
+    __slots__ = ("done", "total")
+
+
+class Completed(Event):
+    """File saved (or ``skipped``: already on disk and valid)."""
+    __slots__ = ("size", "seconds", "skipped")
+
+
+class Failed(Event):
+    """File given up on; ``done`` counts the bytes fetched in vain."""
+    __slots__ = ("error", "done")
+
+
+# ─────────────────────── Progress ────────────────────────────────
+class Transfer:
+    """Byte counters of one file.
+
+    Only the worker that owns the transfer writes ``done``; the renderer
+    just reads it, so the hot path is a plain attribute increment.
+    """
+    __slots__ = ("path", "name", "total", "done", "started", "finished",
+                 "ok", "ttfb")
+
+    def __init__(self, path: str, total: int = 0,
+                 name: Optional[str] = None):
+        self.path = path
+        self.name = name or os.path.basename(path)
+        self.total = total
+        self.done = 0
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.ok = False
+        self.ttfb: Optional[float] = None
+
+    def add(self, n: int):
+        self.done += n
+
+
+class ProgressBoard:
+    """Registry of active transfers and pending status lines.
+
+    Workers register a :class:`Transfer`, bump its counter per chunk and
+    post messages; a single :class:`ProgressRenderer` draws everything.
+    Lifecycle changes are also passed to ``listener`` as :class:`Event`
+    objects (per-chunk progress is not; poll :meth:`active` for that).
+    """
+
+    def __init__(self, listener: Optional[Callable[[Event], None]] = None):
+        self.listener = listener
+        self._lock = threading.Lock()
+        self._active: List[Transfer] = []
+        # without a renderer draining it only the latest lines are kept
+        self._messages: deque = deque(maxlen=MESSAGE_BACKLOG)
+        self._wasted: dict = {}  # path -> bytes of failed attempts
+        self.started = time.time()
+        self.expected = 0  # bytes planned by preflight, for the ETA
+        self.closed_bytes = 0
+        self.completed = 0
+        self.failed = 0
+
+    def expect(self, size: int):
+        """Add ``size`` bytes of planned transfers (ETA beyond the
+        active files)."""
+        with self._lock:
+            self.expected += size
+
+    def emit(self, event: Event):
+        if self.listener is not None:
+            self.listener(event)
+
+    def open(self, path: str, total: int = 0,
+             name: Optional[str] = None) -> Transfer:
+        t = Transfer(path, total, name)
+        with self._lock:
+            self._active.append(t)
+        self.emit(Started(path, total=total))
+        return t
+
+    def close(self, t: Transfer, ok: bool = True):
+        t.finished = time.time()
+        t.ok = ok
+        with self._lock:
+            if t in self._active:
+                self._active.remove(t)
+            self.closed_bytes += t.done
+            if ok:
+                self.completed += 1
+                self._wasted.pop(t.path, None)
+            else:
+                self.failed += 1
+                self._wasted[t.path] = self._wasted.get(t.path, 0) + t.done
+        if ok:
+            self.emit(Completed(t.path, size=t.done,
+                                seconds=t.finished - t.started,
+                                skipped=False))
+
+    def skip(self, path: str, quiet: bool = False):
+        """``path`` is already downloaded."""
+        if not quiet:
+            self.message(f"Already downloaded: {os.path.basename(path)}",
+                         "ok", path)
+        self.emit(Completed(path, size=os.path.getsize(path), seconds=0.0,
+                            skipped=True))
+
+    def fail(self, path: str, exc: BaseException, tag: str = ""):
+        """``path`` is given up on after ``exc``."""
+        with self._lock:
+            wasted = self._wasted.pop(path, 0)
+        self.message(f"{tag or os.path.basename(path)} failed: {exc}",
+                     "error", path)
+        self.emit(Failed(path, error=str(exc), done=wasted))
+
+    def message(self, text: str, level: str = "info", path: str = ""):
+        self._messages.append((text, level))
+        self.emit(Info(path, text=text, level=level))
+
+    def drain_messages(self) -> List[Tuple[str, str]]:
+        out = []
+        while self._messages:
+            out.append(self._messages.popleft())
+        return out
+
+    def active(self) -> List[Transfer]:
+        with self._lock:
+            return list(self._active)
+
+    def bytes_done(self) -> int:
+        with self._lock:
+            return self.closed_bytes + sum(t.done for t in self._active)
+
+
+class ProgressRenderer:
+    """Draws a :class:`ProgressBoard` from one thread at a fixed rate.
+
+    On a terminal the view is redrawn in place (summary line plus one row
+    per active file); otherwise plain status lines without colour are
+    printed every ``PROGRESS_LOG_INTERVAL`` seconds so output stays
+    readable in logs.
+    """
+
+    COLORS = {"info": Fore.CYAN, "ok": Fore.GREEN,
+              "warning": Fore.YELLOW, "error": Fore.RED}
+    ANSI = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+    def __init__(self, board: ProgressBoard, stream=None,
+                 refresh: Optional[float] = None):
+        self.board = board
+        self.stream = stream or sys.stdout
+        self.tty = hasattr(self.stream, "isatty") and self.stream.isatty()
+        self.refresh = refresh or (
+            PROGRESS_REFRESH if self.tty else PROGRESS_LOG_INTERVAL
+        )
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._drawn = 0
+        self._samples: deque = deque()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="progress", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._draw(final=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh):
+            self._draw()
+
+    def _rate(self, done: int) -> float:
+        now = time.time()
+        self._samples.append((now, done))
+        while self._samples and now - self._samples[0][0] > \
+                PROGRESS_RATE_WINDOW:
+            self._samples.popleft()
+        t0, b0 = self._samples[0]
+        if now - t0 > 0:
+            return (done - b0) / (now - t0)
+        elapsed = now - self.board.started
+        return done / elapsed if elapsed > 0 else 0.0
+
+    def _summary(self, active: List[Transfer], done: int,
+                 rate: float) -> str:
+        b = self.board
+        line = (f"{format_size(done)} | {format_size(int(rate))}/s | "
+                f"{len(active)} active, {b.completed} done")
+        if b.failed:
+            line += f", {b.failed} failed"
+        remaining = max(
+            sum(max(t.total - t.done, 0) for t in active if t.total),
+            b.expected - done,
+        )
+        if remaining and rate > 0:
+            line += f" | ETA {format_duration(remaining / rate)}"
+        return line
+
+    def _total(self, done: int) -> str:
+        elapsed = max(time.time() - self.board.started, 1e-9)
+        return (f"Transferred {format_size(done)} in "
+                f"{format_duration(elapsed)} "
+                f"({format_size(int(done / elapsed))}/s)")
+
+    @staticmethod
+    def _row(t: Transfer) -> str:
+        name = t.name if len(t.name) <= 32 else t.name[:31] + "…"
+        elapsed = time.time() - t.started
+        speed = t.done / elapsed if elapsed > 0 else 0
+        if t.total:
+            pct = 100.0 * t.done / t.total
+            return (f"  {name:<32} {pct:5.1f}% "
+                    f"{format_size(t.done)}/{format_size(t.total)} "
+                    f"{format_size(int(speed))}/s")
+        return (f"  {name:<32}   ?    {format_size(t.done)} "
+                f"{format_size(int(speed))}/s")
+
+    def _draw(self, final: bool = False):
+        active = self.board.active()
+        done = self.board.bytes_done()
+        rate = self._rate(done)
+        if self.tty:
+            messages = [
+                f"{self.COLORS.get(level, '')}{text}{Style.RESET_ALL}"
+                for text, level in self.board.drain_messages()
+            ]
+        else:
+            # callers may have coloured the text themselves
+            messages = [self.ANSI.sub("", text)
+                        for text, _ in self.board.drain_messages()]
+        out = []
+        if self.tty:
+            if self._drawn:
+                out.append(f"\x1b[{self._drawn}F\x1b[J")
+            out.extend(m + "\n" for m in messages)
+            rows = []
+            if final:
+                if done:
+                    rows.append(f"{Fore.GREEN}{self._total(done)}"
+                                f"{Style.RESET_ALL}")
+            elif active:
+                rows.append(f"{Fore.CYAN}"
+                            f"{self._summary(active, done, rate)}"
+                            f"{Style.RESET_ALL}")
+                rows.extend(self._row(t) for t in active[:PROGRESS_ROWS])
+                if len(active) > PROGRESS_ROWS:
+                    rows.append(
+                        f"  … {len(active) - PROGRESS_ROWS} more"
+                    )
+            out.extend(r + "\n" for r in rows)
+            self._drawn = 0 if final else len(rows)
+        else:
+            out.extend(m + "\n" for m in messages)
+            if final:
+                if done:
+                    out.append(f"[progress] {self._total(done)}\n")
+            elif active:
+                out.append(
+                    "[progress] " + self._summary(active, done, rate)
+                    + "\n"
+                )
+        if out:
+            self.stream.write("".join(out))
+            self.stream.flush()
+
+
+# ─────────────────────── Metrics ─────────────────────────────────
+class _Timer:
+    """Context manager that observes elapsed seconds into a histogram.
+
+    Labels may be added inside the block; ``outcome`` defaults to
+    ``ok`` or ``error`` depending on whether the block raised.
+    """
+
+    def __init__(self, metrics: "Metrics", name: str, labels: dict):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.labels["outcome"] = "error"
+        else:
+            self.labels.setdefault("outcome", "ok")
+        self.metrics.observe(self.name, self.elapsed, **self.labels)
+
+
+class Metrics:
+    """Thread-safe counters and histograms keyed by name and labels.
+
+    Exposed as Prometheus text (``serve``) or as a JSON document written
+    periodically (``dump_every``).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict = {}
+        self._histograms: dict = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(
+            (k, str(v)) for k, v in labels.items()
+        ))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float,
+                buckets: tuple = LATENCY_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = {
+                    "bounds": buckets,
+                    "counts": [0] * len(buckets),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            for i, bound in enumerate(h["bounds"]):
+                if value <= bound:
+                    h["counts"][i] += 1
+                    break
+            h["sum"] += value
+            h["count"] += 1
+
+    def timer(self, name: str, **labels) -> _Timer:
+        return _Timer(self, name, labels)
+
+    def total(self, name: str, **labels) -> float:
+        """Sum of a counter (or of a histogram's observations) over all
+        series whose labels include ``labels``."""
+        want = set(self._key(name, labels)[1])
+        with self._lock:
+            value = sum(
+                v for (n, lb), v in self._counters.items()
+                if n == name and want <= set(lb)
+            )
+            value += sum(
+                h["sum"] for (n, lb), h in self._histograms.items()
+                if n == name and want <= set(lb)
+            )
+        return value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [
+                {"name": n, "labels": dict(lb), "value": v}
+                for (n, lb), v in sorted(self._counters.items())
+            ]
+            histograms = []
+            for (n, lb), h in sorted(self._histograms.items()):
+                cumulative, running = {}, 0
+                for bound, c in zip(h["bounds"], h["counts"]):
+                    running += c
+                    cumulative[str(bound)] = running
+                histograms.append({
+                    "name": n, "labels": dict(lb),
+                    "buckets": cumulative,
+                    "sum": h["sum"], "count": h["count"],
+                })
+        return {
+            "timestamp": time.time(),
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+
+    @staticmethod
+    def _labels_text(labels: dict, extra: str = "") -> str:
+        parts = []
+        for k, v in labels.items():
+            v = (v.replace("\\", "\\\\").replace('"', '\\"')
+                 .replace("\n", "\\n"))
+            parts.append(f'{k}="{v}"')
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def to_prometheus(self) -> str:
+        snap = self.snapshot()
+        lines, typed = [], set()
+        for c in snap["counters"]:
+            if c["name"] not in typed:
+                typed.add(c["name"])
+                lines.append(f"# TYPE {c['name']} counter")
+            lines.append(
+                f"{c['name']}{self._labels_text(c['labels'])} {c['value']}"
+            )
+        for h in snap["histograms"]:
+            name, labels = h["name"], h["labels"]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            for bound, count in h["buckets"].items():
+                le = self._labels_text(labels, f'le="{bound}"')
+                lines.append(f"{name}_bucket{le} {count}")
+            le = self._labels_text(labels, 'le="+Inf"')
+            lines.append(f"{name}_bucket{le} {h['count']}")
+            lb = self._labels_text(labels)
+            lines.append(f"{name}_sum{lb} {h['sum']}")
+            lines.append(f"{name}_count{lb} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+        os.replace(tmp, path)
+
+    def dump_every(self, path: str,
+                   interval: float = METRICS_INTERVAL) -> threading.Event:
+        """Write a JSON dump every ``interval`` s; set the event to stop."""
+        stop = threading.Event()
+
+        def _loop():
+            while not stop.wait(interval):
+                try:
+                    self.write_json(path)
+                except OSError as e:
+                    debug("metrics dump error: %s", e)
+
+        threading.Thread(
+            target=_loop, name="metrics-dump", daemon=True
+        ).start()
+        return stop
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serve ``/metrics`` (Prometheus) and ``/metrics.json``."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body = metrics.to_json().encode()
+                    ctype = "application/json"
+                elif self.path.startswith("/metrics"):
+                    body = metrics.to_prometheus().encode()
+                    ctype = "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(
+            target=server.serve_forever, name="metrics-http", daemon=True
+        ).start()
+        return server
+
+
+METRICS = Metrics()
+
+
+# ─────────────────────── Profiling ───────────────────────────────
+class Profiler:
+    """cProfile + tracemalloc around a run (``--profile DIR``).
+
+    Writes into ``DIR``:
+
+    * ``profile-<stamp>.pstats`` — merged cProfile data of all threads;
+    * ``profile-<stamp>.txt``    — top functions by cumulative time;
+    * ``profile-<stamp>.json``   — per-phase timings (from ``METRICS``),
+      top allocation sites and totals, with sorted keys so two runs can
+      be diffed directly.
+    """
+
+    TOP_FUNCTIONS = 40
+    TOP_ALLOCATIONS = 30
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.stamp = time.strftime("%Y%m%d-%H%M%S")
+        self._lock = threading.Lock()
+        self._profiles: list = []
+        self._main = None
+        self._wall = 0.0
+        self._cpu = 0.0
+
+    def _thread_hook(self, frame, event, arg):
+        import cProfile
+        sys.setprofile(None)
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:  # another profiler already active (3.12+)
+            return
+        with self._lock:
+            self._profiles.append((threading.current_thread(), prof))
+
+    def __enter__(self):
+        import cProfile
+        import tracemalloc
+        os.makedirs(self.out_dir, exist_ok=True)
+        tracemalloc.start()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        threading.setprofile(self._thread_hook)
+        self._main = cProfile.Profile()
+        self._main.enable()
+        return self
+
+    def __exit__(self, *exc):
+        import pstats
+        import tracemalloc
+        self._main.disable()
+        threading.setprofile(None)
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        base = os.path.join(self.out_dir, f"profile-{self.stamp}")
+        stats = pstats.Stats(self._main)
+        with self._lock:
+            for thread, prof in self._profiles:
+                if not thread.is_alive():
+                    stats.add(prof)
+        stats.dump_stats(base + ".pstats")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            stats.stream = f
+            stats.sort_stats("cumulative").print_stats(self.TOP_FUNCTIONS)
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        allocations = [
+            {
+                "where": f"{st.traceback[0].filename}:"
+                         f"{st.traceback[0].lineno}",
+                "size": st.size,
+                "count": st.count,
+            }
+            for st in snapshot.statistics("lineno")[:self.TOP_ALLOCATIONS]
+        ]
+        phases = {}
+        for h in METRICS.snapshot()["histograms"]:
+            labels = ",".join(f"{k}={v}" for k, v in h["labels"].items())
+            key = f"{h['name']}{{{labels}}}" if labels else h["name"]
+            phases[key] = {
+                "count": h["count"],
+                "total": round(h["sum"], 6),
+                "mean": round(h["sum"] / h["count"], 6)
+                if h["count"] else 0,
+            }
+        report = {
+            "wall_seconds": round(wall, 3),
+            "cpu_seconds": round(cpu, 3),
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "phases": phases,
+            "allocations": allocations,
+        }
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"{Fore.CYAN}Profile written to {base}.*{Style.RESET_ALL}")
+
+
 # ─────────────────────── Configuration ───────────────────────────
 class Config:
     def __init__(self):
@@ -130,6 +983,13 @@ class Config:
             self._setup_initial()
         self.display()
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "Config":
+        """Build a config in memory — no disk access, no prompts."""
+        self = cls.__new__(cls)
+        self._config = dict(data)
+        return self
+
     def _load(self):
         if os.path.isfile(CONFIG_FILE):
             with open(CONFIG_FILE, "r", encoding="utf-8") as f:
@@ -220,11 +1080,1275 @@ class Config:
         return self._config.get("credentials", {})
 
 
+# ─────────────────────── Retry policy ────────────────────────────
+class RetryPolicy:
+    """Error classification, exponential backoff and a retry budget.
+
+    One policy is shared by everything a download job does (AJAX calls
+    and transfers). The budget is a token bucket: up to ``budget``
+    retries in a burst, regained at ``refill`` per second, so a dead
+    title stops retrying quickly while an outage early in a long job
+    does not fail everything after it. Permanent errors are never
+    retried.
+    """
+
+    PERMANENT = "permanent"
+    TRANSIENT = "transient"
+    THROTTLED = "throttled"
+
+    PERMANENT_ERRORS = (
+        StreamDecodeError, ContentUnavailableError, InvalidSelectionError,
+        EpisodeOutOfRangeError, SeasonOutOfRangeError, CassetteMissError,
+    )
+    PERMANENT_STATUS = {400, 404, 405, 410, 451}
+    RETRY_ONCE_STATUS = {401, 403}  # often an expired signed CDN link
+    THROTTLE_STATUS = {429, 503}
+
+    def __init__(self, attempts: int = MAX_RETRIES,
+                 base: float = RETRY_BASE_DELAY,
+                 cap: float = RETRY_MAX_DELAY,
+                 budget: int = RETRY_BUDGET,
+                 refill: float = RETRY_REFILL):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.budget = budget
+        self.refill = refill
+        self._tokens = float(budget)
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _status(exc: BaseException) -> Optional[int]:
+        return getattr(getattr(exc, "response", None), "status_code", None)
+
+    def classify(self, exc: BaseException, attempt: int = 1) -> str:
+        if isinstance(exc, self.PERMANENT_ERRORS):
+            return self.PERMANENT
+        status = self._status(exc)
+        if status is not None:
+            if status in self.THROTTLE_STATUS:
+                return self.THROTTLED
+            if status in self.RETRY_ONCE_STATUS:
+                return self.TRANSIENT if attempt == 1 else self.PERMANENT
+            if status in self.PERMANENT_STATUS or 400 <= status < 500:
+                return self.PERMANENT
+            return self.TRANSIENT
+        if isinstance(exc, (DownloaderError, OSError, ValueError)):
+            # network errors (requests' are OSError), bad JSON, short
+            # transfers, expired sessions
+            return self.TRANSIENT
+        return self.PERMANENT
+
+    @staticmethod
+    def _retry_after(exc: BaseException) -> Optional[float]:
+        resp = getattr(exc, "response", None)
+        value = resp.headers.get("Retry-After") if resp is not None else None
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            from email.utils import parsedate_to_datetime
+            return parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+
+    def _take_budget(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self._tokens = min(
+                self.budget,
+                self._tokens + (now - self._refilled) * self.refill,
+            )
+            self._refilled = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def next_delay(self, attempt: int, exc: BaseException,
+                   stage: str) -> Optional[float]:
+        """Seconds to wait before retrying after failed ``attempt``,
+        or ``None`` when the error must be propagated."""
+        kind = self.classify(exc, attempt)
+        if kind == self.PERMANENT:
+            reason = kind
+        elif attempt >= self.attempts:
+            reason = "attempts"
+        elif not self._take_budget():
+            reason = "budget"
+        else:
+            METRICS.inc("hdrezka_retries_total", stage=stage, reason=kind)
+            delay = random.uniform(
+                0, min(self.cap, self.base * 2 ** (attempt - 1))
+            )
+            if kind == self.THROTTLED:
+                retry_after = self._retry_after(exc)
+                if retry_after is not None:
+                    delay = min(max(retry_after, 0.0), RETRY_AFTER_MAX)
+            return delay
+        METRICS.inc("hdrezka_retry_giveups_total", stage=stage, reason=reason)
+        debug("%s: giving up after attempt %d (%s): %s",
+              stage, attempt, reason, exc)
+        return None
+
+
+# ─────────────────────── MP4 check ───────────────────────────────
+def verify_mp4(path: str) -> Optional[str]:
+    """Walk the top-level boxes of an MP4 file.
+
+    Only box headers are read. Returns ``None`` when the file starts with
+    ``ftyp``, contains ``moov`` and ``mdat`` and the declared box sizes
+    add up to the file length, else a short description of the problem.
+    """
+    try:
+        size = os.path.getsize(path)
+        boxes = []
+        with open(path, "rb") as f:
+            offset = 0
+            while offset < size:
+                f.seek(offset)
+                header = f.read(16)
+                if len(header) < 8:
+                    return f"truncated box header at {offset}"
+                box_size, kind = struct.unpack(">I4s", header[:8])
+                min_size = 8
+                if box_size == 1:  # 64-bit largesize
+                    if len(header) < 16:
+                        return f"truncated box header at {offset}"
+                    box_size = struct.unpack(">Q", header[8:])[0]
+                    min_size = 16
+                elif box_size == 0:  # box extends to end of file
+                    box_size = size - offset
+                if box_size < min_size:
+                    return f"bad box size {box_size} at {offset}"
+                boxes.append(kind.decode("latin-1"))
+                offset += box_size
+    except OSError as e:
+        return str(e)
+    if offset != size:
+        return (f"'{boxes[-1]}' box ends {format_size(offset - size)} "
+                f"past end of file")
+    if not boxes or boxes[0] != "ftyp":
+        return "no leading 'ftyp' box"
+    missing = [b for b in MP4_REQUIRED_BOXES if b not in boxes]
+    if missing:
+        return "missing " + ", ".join(f"'{b}'" for b in missing)
+    return None
+
+
+def write_checksum(path: str, digest: str):
+    """Store ``digest`` (SHA-256 hex) next to ``path`` in the format of
+    ``sha256sum``, so ``sha256sum -c`` works on the sidecar too."""
+    sidecar = path + CHECKSUM_SUFFIX
+    with open(sidecar + ".tmp", "w", encoding="utf-8") as f:
+        f.write(f"{digest}  {os.path.basename(path)}\n")
+    os.replace(sidecar + ".tmp", sidecar)
+
+
+def read_checksum(path: str) -> Optional[str]:
+    """SHA-256 recorded for ``path`` at download time, if any."""
+    try:
+        with open(path + CHECKSUM_SUFFIX, "r", encoding="utf-8") as f:
+            digest = f.read(64).lower()
+    except OSError:
+        return None
+    return digest if re.fullmatch(r"[0-9a-f]{64}", digest) else None
+
+
+def verify_checksum(path: str) -> Optional[str]:
+    """Re-hash ``path`` and compare with its sidecar; ``None`` when they
+    match or no digest was recorded."""
+    import hashlib
+    expected = read_checksum(path)
+    if expected is None:
+        return None
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(block)
+    except OSError as e:
+        return str(e)
+    if digest.hexdigest() != expected:
+        return "SHA-256 differs from the one recorded at download"
+    return None
+
+
+def verify_tree(root: str, checksums: bool = False):
+    """Yield ``(path, problem)`` for every ``.mp4`` file under ``root``;
+    with ``checksums`` files are also compared with their sidecar."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(".mp4"):
+                path = os.path.join(dirpath, name)
+                problem = verify_mp4(path)
+                if problem is None and checksums:
+                    problem = verify_checksum(path)
+                yield path, problem
+
+
+# ─────────────────────── DNS cache ───────────────────────────────
+class DnsCache:
+    """TTL cache in front of ``socket.getaddrinfo``, for at most
+    ``size`` lookups (least recently used ones are evicted first).
+
+    ``install()`` swaps the resolver process-wide, so every connection
+    to a CDN host after the first skips the lookup; each call is undone
+    by one ``uninstall()``, and the original resolver is back after
+    the last. Failed lookups are not cached.
+    """
+
+    def __init__(self, ttl: float = DNS_CACHE_TTL,
+                 size: int = DNS_CACHE_MAX):
+        self.ttl = ttl
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._resolve = socket.getaddrinfo
+        self._installs = 0
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and now - hit[0] < self.ttl:
+                self._entries.move_to_end(key)
+            else:
+                hit = None
+        if hit is not None:
+            METRICS.inc("hdrezka_dns_cache_total", outcome="hit")
+            return hit[1]
+        METRICS.inc("hdrezka_dns_cache_total", outcome="miss")
+        with METRICS.timer("hdrezka_dns_seconds"):
+            result = self._resolve(host, port, family, type, proto, flags)
+        with self._lock:
+            self._entries[key] = (now, result)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.size:
+                for k in [k for k, (at, _) in self._entries.items()
+                          if now - at >= self.ttl]:
+                    del self._entries[k]
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return result
+
+    def install(self):
+        with self._lock:
+            self._installs += 1
+            if socket.getaddrinfo != self.getaddrinfo:
+                self._resolve = socket.getaddrinfo
+                socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self):
+        with self._lock:
+            self._installs = max(0, self._installs - 1)
+            if self._installs or socket.getaddrinfo != self.getaddrinfo:
+                return
+            socket.getaddrinfo = self._resolve
+            self._entries.clear()
+
+
+DNS_CACHE = DnsCache()
+
+
+# ─────────────────────── Transports ──────────────────────────────
+def make_cookie(name: str, value: str, domain: str = "", path: str = "/",
+                expires: Optional[float] = None,
+                secure: bool = False) -> Cookie:
+    """Cookie for ``Transport.cookies.set_cookie`` (any backend)."""
+    from http.cookiejar import Cookie
+    return Cookie(
+        version=0, name=name, value=value, port=None, port_specified=False,
+        domain=domain, domain_specified=bool(domain),
+        domain_initial_dot=domain.startswith("."),
+        path=path, path_specified=True, secure=secure,
+        expires=int(expires) if expires else None,
+        discard=not expires, comment=None, comment_url=None,
+        rest={"HttpOnly": None},
+    )
+
+
+class Transport(ABC):
+    """HTTP backend of :class:`HttpClient`.
+
+    ``headers`` are sent with every request (per-call ``headers`` win) and
+    ``cookies`` is an ``http.cookiejar.CookieJar``. Responses provide the
+    part of the ``requests.Response`` API this module uses:
+    ``status_code``, ``headers``, ``content``, ``text``, ``json()``,
+    ``raise_for_status()`` (errors carry ``.response``),
+    ``iter_content()``, ``close()`` and use as a context manager;
+    :meth:`readinto` reads a streamed body into a caller's buffer.
+    Connection failures and timeouts raise one of ``network_errors``.
+    """
+
+    name = "?"
+    network_errors: tuple = (ConnectionError, TimeoutError)
+    headers: dict
+    cookies: CookieJar
+
+    @abstractmethod
+    def request(self, method: str, url: str, *,
+                params: Optional[dict] = None, data=None,
+                headers: Optional[dict] = None, timeout=30,
+                stream: bool = False, allow_redirects: bool = True):
+        """Send one request; see the class docstring for the response."""
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, data=None, **kwargs):
+        return self.request("POST", url, data=data, **kwargs)
+
+    def head(self, url: str, **kwargs):
+        kwargs.setdefault("allow_redirects", False)
+        return self.request("HEAD", url, **kwargs)
+
+    def stream(self, url: str, offset: int = 0, **kwargs):
+        """Streaming GET, from byte ``offset`` via a Range header."""
+        headers = dict(kwargs.pop("headers", None) or {})
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        return self.request("GET", url, headers=headers, stream=True,
+                            **kwargs)
+
+    def readinto(self, response, buf: bytearray) -> int:
+        """Fill ``buf`` from a :meth:`stream` body; 0 at the end."""
+        return response.raw.readinto(buf)
+
+    def close(self):
+        pass
+
+
+class RequestsTransport(Transport):
+    """``requests.Session`` with a connection pool of ``pool_size``."""
+
+    name = "requests"
+
+    def __init__(self, pool_size: int = 10):
+        import requests
+        import urllib3
+        from requests.adapters import HTTPAdapter
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self.headers = self._session.headers
+        self.cookies = self._session.cookies
+        self.network_errors = (
+            requests.ConnectionError, requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            # readinto() reads the urllib3 response directly
+            urllib3.exceptions.HTTPError,
+        )
+
+    def request(self, method: str, url: str, *, params=None, data=None,
+                headers=None, timeout=30, stream=False,
+                allow_redirects=True):
+        return self._session.request(
+            method, url, params=params, data=data, headers=headers,
+            timeout=timeout, stream=stream, allow_redirects=allow_redirects,
+        )
+
+    def readinto(self, response, buf: bytearray) -> int:
+        n = response.raw.readinto(buf)
+        if not n:
+            # lets Response.close() return the connection to the pool
+            response._content_consumed = True
+        return n
+
+    def close(self):
+        self._session.close()
+
+
+class Urllib3Response:
+    """Minimal ``requests.Response`` look-alike over a urllib3 response."""
+    __slots__ = ("raw", "url", "status_code", "headers", "_content",
+                 "_consumed")
+
+    def __init__(self, raw, url: str, consumed: bool):
+        self.raw = raw
+        self.url = url
+        self.status_code = raw.status
+        self.headers = raw.headers
+        self._content: Optional[bytes] = None
+        self._consumed = consumed
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            with Urllib3Transport.wrap_errors():
+                self._content = self.raw.data or b""
+            self._consumed = True
+        return self._content
+
+    @property
+    def text(self) -> str:
+        m = re.search(r"charset=([\w-]+)",
+                      self.headers.get("Content-Type", ""))
+        return self.content.decode(m.group(1) if m else "utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HttpStatusError(
+                f"{self.status_code} {self.raw.reason} for url: {self.url}",
+                response=self,
+            )
+
+    def iter_content(self, chunk_size: int = 1):
+        with Urllib3Transport.wrap_errors():
+            yield from self.raw.stream(chunk_size)
+        self._consumed = True
+
+    def readinto(self, buf: bytearray) -> int:
+        # through urllib3, which decodes and checks Content-Length
+        with Urllib3Transport.wrap_errors():
+            n = self.raw.readinto(buf)
+        if not n:
+            self._consumed = True
+        return n
+
+    def close(self):
+        if not self._consumed:
+            self.raw.close()
+        self.raw.release_conn()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Urllib3Transport(Transport):
+    """urllib3 ``PoolManager`` used directly, without the per-request
+    work of ``requests`` (hooks, adapters, cookie jar merging).
+
+    Redirects are followed here so cookies set on them are kept;
+    urllib3 errors are raised as the builtin ``ConnectionError`` /
+    ``TimeoutError``.
+    """
+
+    name = "urllib3"
+    REDIRECTS = {301, 302, 303, 307, 308}
+    MAX_REDIRECTS = 10
+
+    def __init__(self, pool_size: int = 10):
+        import urllib3
+        from http.cookiejar import CookieJar
+        self._urllib3 = urllib3
+        self._pool = urllib3.PoolManager(maxsize=pool_size, retries=False)
+        self.headers: dict = {}
+        self.cookies = CookieJar()
+
+    @staticmethod
+    @contextmanager
+    def wrap_errors():
+        import urllib3
+        try:
+            yield
+        except urllib3.exceptions.NewConnectionError as e:
+            raise ConnectionError(str(e)) from e
+        except urllib3.exceptions.TimeoutError as e:
+            raise TimeoutError(str(e)) from e
+        except urllib3.exceptions.HTTPError as e:
+            raise ConnectionError(str(e)) from e
+
+    def _timeout(self, timeout):
+        if isinstance(timeout, tuple):
+            return self._urllib3.Timeout(connect=timeout[0], read=timeout[1])
+        return self._urllib3.Timeout(connect=timeout, read=timeout)
+
+    def request(self, method: str, url: str, *, params=None, data=None,
+                headers=None, timeout=30, stream=False,
+                allow_redirects=True):
+        from urllib.parse import urlencode, urljoin
+        from urllib.request import Request
+
+        if params:
+            url += ("&" if "?" in url else "?") + urlencode(params)
+        body = urlencode(data) if isinstance(data, dict) else data
+        merged = self._urllib3.HTTPHeaderDict(self.headers)
+        merged.update(headers or {})
+        if body is not None and "Content-Type" not in merged:
+            merged["Content-Type"] = "application/x-www-form-urlencoded"
+        for _ in range(self.MAX_REDIRECTS + 1):
+            req = Request(url, method=method)
+            self.cookies.add_cookie_header(req)
+            cookie = req.get_header("Cookie")
+            send = self._urllib3.HTTPHeaderDict(merged)
+            if cookie:
+                send["Cookie"] = cookie
+            with self.wrap_errors():
+                raw = self._pool.request(
+                    method, url, body=body, headers=send,
+                    timeout=self._timeout(timeout),
+                    preload_content=not stream, redirect=False,
+                )
+            self.cookies.extract_cookies(_HeaderInfo(raw.headers), req)
+            resp = Urllib3Response(raw, url, consumed=not stream)
+            location = raw.headers.get("Location")
+            if (not allow_redirects or raw.status not in self.REDIRECTS
+                    or not location):
+                return resp
+            resp.close()
+            url = urljoin(url, location)
+            if raw.status == 303 or (raw.status in (301, 302)
+                                     and method == "POST"):
+                method, body = "GET", None
+                merged.pop("Content-Type", None)
+        raise ConnectionError(f"too many redirects: {url}")
+
+    def readinto(self, response, buf: bytearray) -> int:
+        return response.readinto(buf)
+
+    def close(self):
+        self._pool.clear()
+
+
+class _HeaderInfo:
+    """``CookieJar.extract_cookies`` view of urllib3 response headers."""
+    __slots__ = ("_headers",)
+
+    def __init__(self, headers):
+        self._headers = headers
+
+    def info(self):
+        return self
+
+    def get_all(self, name: str, default=None):
+        return self._headers.getlist(name) or default
+
+
+TRANSPORTS = {
+    "requests": RequestsTransport,
+    "urllib3": Urllib3Transport,
+}
+
+
+# ─────────────────────── Record / replay ─────────────────────────
+class CassetteResponse:
+    """A recorded site response, with the response API of
+    :class:`Transport`; the body is stored already decoded."""
+    __slots__ = ("url", "status_code", "reason", "headers", "content")
+
+    def __init__(self, url: str, status_code: int, reason: str,
+                 headers: list, content: bytes):
+        from urllib3 import HTTPHeaderDict
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = HTTPHeaderDict()
+        for name, value in headers:
+            self.headers.add(name, value)
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        m = re.search(r"charset=([\w-]+)",
+                      self.headers.get("Content-Type", ""))
+        return self.content.decode(m.group(1) if m else "utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HttpStatusError(
+                f"{self.status_code} {self.reason} for url: {self.url}",
+                response=self,
+            )
+
+    def iter_content(self, chunk_size: int = 1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Cassette:
+    """Site exchanges recorded to, or replayed from, a JSON file.
+
+    Requests are matched on method, path, query (minus cache busters
+    such as the AJAX ``t`` timestamp), form body and conditional
+    headers, not on the host, so a cassette replays against any
+    ``site_url``. Repeats of a request get the recorded answers in
+    order, then the last one again. On replay each answer is delayed by
+    its recorded time multiplied by ``latency`` (0 for no delay).
+    """
+
+    VERSION = 1
+    VOLATILE_PARAMS = {"t"}
+    MATCH_HEADERS = ("If-None-Match", "If-Modified-Since", "Range")
+
+    def __init__(self, path: str, replay: bool = False,
+                 latency: float = 1.0):
+        self.path = path
+        self.replay = replay
+        self.latency = latency
+        self.exchanges: List[dict] = []
+        self._lock = threading.Lock()
+        if replay:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") != self.VERSION:
+                raise ValueError(f"{path}: not a version {self.VERSION} "
+                                 f"cassette")
+            self.exchanges = state["exchanges"]
+
+    def transport(self, factory: Callable[[], Transport]) -> Transport:
+        """Site transport: ``factory()`` recorded, or a replay."""
+        if self.replay:
+            return ReplayTransport(self)
+        return RecordingTransport(factory(), self)
+
+    @classmethod
+    def key(cls, method: str, url: str, params: Optional[dict] = None,
+            data=None, headers: Optional[dict] = None) -> str:
+        from urllib.parse import parse_qsl, urlencode, urlsplit
+        parts = urlsplit(url)
+        query = [
+            (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if k not in cls.VOLATILE_PARAMS
+        ]
+        query += [(k, str(v)) for k, v in (params or {}).items()]
+        if isinstance(data, dict):
+            body = urlencode(sorted((k, str(v)) for k, v in data.items()))
+        elif isinstance(data, bytes):
+            body = data.decode("utf-8", "replace")
+        else:
+            body = data or ""
+        lowered = {k.lower(): v for k, v in (headers or {}).items()}
+        conditions = [
+            f"{name}: {lowered[name.lower()]}" for name in cls.MATCH_HEADERS
+            if name.lower() in lowered
+        ]
+        target = parts.path or "/"
+        if query:
+            target += "?" + urlencode(sorted(query))
+        return " ".join([method.upper(), target, body] + conditions).strip()
+
+    def add(self, exchange: dict):
+        with self._lock:
+            self.exchanges.append(exchange)
+
+    def save(self):
+        """Write every exchange so far (atomically, owner-only: bodies
+        and cookies may identify the account)."""
+        with self._lock:
+            state = {"version": self.VERSION, "saved": time.time(),
+                     "exchanges": list(self.exchanges)}
+        tmp = self.path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+
+class RecordingTransport(Transport):
+    """Passes site requests to ``inner`` and adds each exchange,
+    including network errors and the time to the end of the body, to a
+    :class:`Cassette`; saved on :meth:`close`."""
+
+    def __init__(self, inner: Transport, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+        self.name = inner.name
+        self.network_errors = inner.network_errors
+
+    @property
+    def headers(self):
+        return self.inner.headers
+
+    @property
+    def cookies(self):
+        return self.inner.cookies
+
+    def request(self, method: str, url: str, *, params=None, data=None,
+                headers=None, timeout=30, stream=False,
+                allow_redirects=True):
+        exchange = {
+            "key": Cassette.key(method, url, params, data, headers),
+            "method": method, "url": url,
+        }
+        started = time.perf_counter()
+        try:
+            with self.inner.request(
+                method, url, params=params, data=data, headers=headers,
+                timeout=timeout, stream=stream,
+                allow_redirects=allow_redirects,
+            ) as resp:
+                content = resp.content  # site answers are small
+        except self.network_errors as e:
+            exchange.update(error=type(e).__name__, message=str(e),
+                            elapsed=round(time.perf_counter() - started, 6))
+            self.cassette.add(exchange)
+            raise
+        raw = getattr(resp, "raw", None)
+        # urllib3's headers keep repeated fields (Set-Cookie) apart
+        headers_out = [[k, v] for k, v in
+                       getattr(raw, "headers", resp.headers).items()]
+        reason = getattr(resp, "reason", None) or getattr(raw, "reason", "")
+        exchange.update(
+            elapsed=round(time.perf_counter() - started, 6),
+            status=resp.status_code, reason=reason or "",
+            final_url=resp.url, headers=headers_out,
+        )
+        try:
+            exchange["body"] = content.decode("utf-8")
+        except UnicodeDecodeError:
+            exchange["body_b64"] = base64.b64encode(content).decode()
+        self.cassette.add(exchange)
+        return CassetteResponse(resp.url, resp.status_code, reason or "",
+                                headers_out, content)
+
+    def close(self):
+        self.inner.close()
+        self.cassette.save()
+
+
+class ReplayTransport(Transport):
+    """Answers site requests from a :class:`Cassette`, offline.
+
+    Cookies set by recorded answers are kept like a live session; a
+    request the cassette has no answer for raises ``CassetteMissError``.
+    """
+
+    name = "replay"
+
+    def __init__(self, cassette: Cassette):
+        from http.cookiejar import CookieJar
+        self.cassette = cassette
+        self.headers: dict = {}
+        self.cookies = CookieJar()
+        self._lock = threading.Lock()
+        self._answers: dict = {}  # key -> deque of exchanges
+        self._last: dict = {}
+        for exchange in cassette.exchanges:
+            self._answers.setdefault(exchange["key"], deque()).append(
+                exchange
+            )
+
+    def request(self, method: str, url: str, *, params=None, data=None,
+                headers=None, timeout=30, stream=False,
+                allow_redirects=True):
+        from urllib.request import Request
+
+        key = Cassette.key(method, url, params, data, headers)
+        with self._lock:
+            answers = self._answers.get(key)
+            if answers:
+                self._last[key] = answers.popleft()
+            exchange = self._last.get(key)
+        if exchange is None:
+            raise CassetteMissError(f"not in {self.cassette.path}: {key}")
+        delay = exchange["elapsed"] * self.cassette.latency
+        if delay > 0:
+            time.sleep(delay)
+        if "error" in exchange:
+            error = (TimeoutError if "Timeout" in exchange["error"]
+                     else ConnectionError)
+            raise error(exchange["message"])
+        if "body_b64" in exchange:
+            content = base64.b64decode(exchange["body_b64"])
+        else:
+            content = exchange["body"].encode("utf-8")
+        resp = CassetteResponse(exchange["final_url"], exchange["status"],
+                                exchange["reason"], exchange["headers"],
+                                content)
+        self.cookies.extract_cookies(_HeaderInfo(resp.headers), Request(url))
+        return resp
+
+
+# ─────────────────────── Write-behind ────────────────────────────
+class BufferPool:
+    """Reusable ``CHUNK_SIZE`` buffers shared by every transfer.
+
+    Buffers are allocated on demand up to ``count``; after that
+    :meth:`acquire` blocks until a writer returns one, which is what
+    slows network readers down to the pace of the disk.
+    """
+
+    def __init__(self, count: int = WRITE_BUFFERS, size: int = CHUNK_SIZE):
+        self.count = count
+        self.size = size
+        self._free: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def acquire(self) -> bytearray:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.count:
+                self._created += 1
+                return bytearray(self.size)
+        started = time.perf_counter()
+        buf = self._free.get()
+        METRICS.inc("hdrezka_write_backpressure_total")
+        METRICS.observe("hdrezka_write_buffer_wait_seconds",
+                        time.perf_counter() - started)
+        return buf
+
+    def release(self, buf: bytearray):
+        self._free.put(buf)
+
+
+class WriteBehind:
+    """Writes and hashes one file on its own thread.
+
+    The network reader passes filled pool buffers to :meth:`submit` and
+    goes straight back to the socket; the buffers are written in order
+    and returned to the pool. Leaving the ``with`` block waits for the queue
+    to drain and re-raises a write error (also raised by the next
+    :meth:`submit`). After an error or an aborted transfer the remaining
+    buffers are released without being written. ``on_write``, if given,
+    is called with the byte count once each buffer is flushed to the file.
+    """
+
+    def __init__(self, f, digest, pool: BufferPool, name: str = "",
+                 on_write: Optional[Callable[[int], None]] = None):
+        self._f = f
+        self._digest = digest
+        self._pool = pool
+        self._on_write = on_write
+        self._queue: queue.Queue = queue.Queue()
+        self._abort = False
+        self.error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._run, name=f"writer-{name}", daemon=True
+        )
+
+    def __enter__(self) -> "WriteBehind":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._abort = exc_type is not None
+        self._queue.put(None)
+        self._thread.join()
+        if exc_type is None and self.error is not None:
+            raise self.error
+
+    def submit(self, buf: bytearray, n: int):
+        if self.error is not None:
+            self._pool.release(buf)
+            raise self.error
+        METRICS.observe("hdrezka_write_queue_depth", self._queue.qsize(),
+                        buckets=DEPTH_BUCKETS)
+        self._queue.put((buf, n))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            buf, n = item
+            try:
+                if self.error is None and not self._abort:
+                    with memoryview(buf) as view:
+                        started = time.perf_counter()
+                        self._f.write(view[:n])
+                        METRICS.observe("hdrezka_disk_write_seconds",
+                                        time.perf_counter() - started,
+                                        buckets=WRITE_BUCKETS)
+                        self._digest.update(view[:n])
+                    if self._on_write is not None:
+                        # readers of the file must see what is announced
+                        self._f.flush()
+                        self._on_write(n)
+            except BaseException as e:
+                self.error = e
+            finally:
+                self._pool.release(buf)
+
+
+# ─────────────────────── Play while downloading ──────────────────
+class LiveFile:
+    """Where the bytes of a file being downloaded are, for
+    :class:`StreamServer` readers.
+
+    The transfer calls :meth:`begin` when it creates the ``.part`` file,
+    :meth:`advance` as bytes reach it and :meth:`end` when it is renamed
+    or removed; a retry begins again from byte 0. Readers block in
+    :meth:`wait` until the bytes they want are written.
+    """
+    __slots__ = ("dest", "path", "size", "written", "attempt", "state",
+                 "_cond")
+
+    def __init__(self, dest: str):
+        self.dest = dest
+        self.path = dest
+        self.size = 0  # 0 while unknown
+        self.written = 0
+        self.attempt = 0
+        # waiting -> writing -> complete; failed attempts go back to
+        # waiting, closed means no attempt will follow
+        self.state = "waiting"
+        self._cond = threading.Condition()
+
+    @classmethod
+    def on_disk(cls, path: str) -> "LiveFile":
+        live = cls(path)
+        live.size = live.written = os.path.getsize(path)
+        live.state = "complete"
+        return live
+
+    def begin(self, path: str, size: int):
+        with self._cond:
+            self.path = path
+            self.size = size
+            self.written = 0
+            self.attempt += 1
+            self.state = "writing"
+            self._cond.notify_all()
+
+    def advance(self, n: int):
+        with self._cond:
+            self.written += n
+            self._cond.notify_all()
+
+    def end(self, ok: bool):
+        with self._cond:
+            if ok:
+                self.path = self.dest
+                self.size = self.written
+                self.state = "complete"
+            elif self.state == "writing":
+                self.state = "waiting"
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            if self.state != "complete":
+                self.state = "closed"
+            self._cond.notify_all()
+
+    def open(self) -> Tuple[object, int, int]:
+        """Wait for the file to exist; return ``(file, size, attempt)``
+        (``size`` 0 while unknown). Raises ``FileNotFoundError`` if no
+        download of it is coming."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.state != "waiting")
+            if self.state == "closed":
+                raise FileNotFoundError(self.dest)
+            path, size, attempt = self.path, self.size, self.attempt
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            # renamed to ``dest`` since we looked
+            f = open(self.dest, "rb")
+        return f, size, attempt
+
+    def wait(self, attempt: int, offset: int) -> int:
+        """Bytes written, once there are more than ``offset`` or the file
+        is complete (then possibly exactly ``offset``: the end). Raises
+        ``ConnectionAbortedError`` if ``attempt`` was abandoned."""
+        with self._cond:
+            if self.written > offset and self.attempt == attempt:
+                return self.written
+            started = time.perf_counter()
+            self._cond.wait_for(lambda: (
+                self.attempt != attempt or self.state != "writing"
+                or self.written > offset
+            ))
+            METRICS.observe("hdrezka_play_wait_seconds",
+                            time.perf_counter() - started)
+            if self.attempt != attempt or self.state not in (
+                    "writing", "complete"):
+                raise ConnectionAbortedError(
+                    f"download of {os.path.basename(self.dest)} restarted"
+                )
+            return self.written
+
+
+class PriorityGate:
+    """Gives one file of a job the bandwidth and the others what is left.
+
+    While the transfer of ``dest`` runs, the other transfers of the job
+    wait for one of ``slots`` before they connect, and together read at
+    most ``share`` bytes per byte the priority transfer reads (``floor``
+    bytes/s at least, so their CDN connections are not dropped as idle).
+    :meth:`finish` lifts both limits. ``live`` is the priority file as
+    published on a :class:`StreamServer`.
+    """
+
+    def __init__(self, dest: str, live: Optional[LiveFile] = None,
+                 share: float = PRIORITY_SHARE, slots: int = PRIORITY_SLOTS,
+                 floor: float = PRIORITY_FLOOR):
+        self.dest = dest
+        self.live = live
+        self.share = share
+        self.slots = slots
+        self.floor = floor
+        self._cond = threading.Condition()
+        self._done = False
+        self._holders = 0
+        self._fed = 0
+        self._window: deque = deque()  # (time, bytes fed) of the priority
+        self._next = 0.0  # when the others may read again
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    @contextmanager
+    def slot(self, dest: str):
+        """Held by a transfer while it is connected to the CDN."""
+        if dest == self.dest:
+            yield
+            return
+        with self._cond:
+            while not self._done and self._holders >= self.slots:
+                self._cond.wait()
+            self._holders += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._holders -= 1
+                self._cond.notify()
+
+    def feed(self, n: int):
+        """``n`` more bytes of the priority file were read."""
+        now = time.monotonic()
+        with self._cond:
+            self._fed += n
+            self._window.append((now, self._fed))
+            while (len(self._window) > 2
+                   and now - self._window[1][0] >= PROGRESS_RATE_WINDOW):
+                self._window.popleft()
+
+    def _rate(self, now: float) -> float:
+        if len(self._window) < 2:
+            return 0.0
+        since, fed = self._window[0]
+        return (self._fed - fed) / max(now - since, 1e-3)
+
+    def throttle(self, n: int) -> float:
+        """Called after another transfer read ``n`` bytes: wait until
+        the others' budget allows it; returns the seconds waited."""
+        started = time.monotonic()
+        with self._cond:
+            if self._done:
+                return 0.0
+            rate = max(self.floor, self.share * self._rate(started))
+            self._next = max(self._next, started) + n / rate
+            self._cond.wait_for(lambda: self._done,
+                                timeout=self._next - started)
+        waited = time.monotonic() - started
+        METRICS.inc("hdrezka_priority_throttle_seconds_total", waited)
+        return waited
+
+    def finish(self):
+        """The priority transfer is over: no more limits."""
+        with self._cond:
+            self._done = True
+            self._cond.notify_all()
+        if self.live is not None:
+            self.live.close()
+
+
+class StreamServer:
+    """HTTP server for the files under ``root``, with Range support.
+
+    Files registered with :meth:`publish` can be played while they are
+    downloaded: a request for bytes that are not written yet waits for
+    them. Other files are served once they are on disk.
+    """
+
+    def __init__(self, root: str = DOWNLOADS_DIR, port: int = PLAY_PORT,
+                 host: str = "127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.root = os.path.abspath(root)
+        self._lock = threading.Lock()
+        self._live: dict = {}  # absolute path -> LiveFile
+        streams = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                streams._serve(self, body=True)
+
+            def do_HEAD(self):
+                streams._serve(self, body=False)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self.host = host
+        self.port = self._server.server_address[1]
+        threading.Thread(
+            target=self._server.serve_forever, name="stream-http",
+            daemon=True,
+        ).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def publish(self, dest: str) -> LiveFile:
+        """Serve ``dest`` from now on, while it downloads."""
+        live = LiveFile(dest)
+        with self._lock:
+            self._prune()
+            self._live[os.path.abspath(dest)] = live
+        return live
+
+    def _prune(self):
+        # finished downloads are served from disk like any other file;
+        # readers of an entry keep their own reference to it
+        for path in [p for p, live in self._live.items()
+                     if live.state in ("complete", "closed")]:
+            del self._live[path]
+
+    def url(self, dest: str) -> str:
+        from urllib.parse import quote
+        rel = os.path.relpath(os.path.abspath(dest), self.root)
+        return (f"http://{self.host}:{self.port}/"
+                + quote(rel.replace(os.sep, "/")))
+
+    def _lookup(self, url_path: str) -> Optional[LiveFile]:
+        from urllib.parse import unquote
+        rel = unquote(urlparse(url_path).path).lstrip("/")
+        path = os.path.abspath(os.path.join(self.root, rel))
+        if os.path.commonpath([path, self.root]) != self.root:
+            return None
+        with self._lock:
+            self._prune()
+            live = self._live.get(path)
+        if live is None and os.path.isfile(path):
+            live = LiveFile.on_disk(path)
+        return live
+
+    @staticmethod
+    def _range(header: str, size: int) -> Optional[Tuple[int, int]]:
+        """``(first, last)`` byte of a single-range ``Range`` header;
+        ``None`` to send the whole file. Raises ``ValueError`` if the
+        range is past the end."""
+        m = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+        if not m or not (m.group(1) or m.group(2)):
+            return None
+        if m.group(1):
+            first = int(m.group(1))
+            last = int(m.group(2)) if m.group(2) else size - 1
+        else:
+            first, last = max(0, size - int(m.group(2))), size - 1
+        last = min(last, size - 1)
+        if first > last:
+            raise ValueError(header)
+        return first, last
+
+    def _serve(self, h, body: bool):
+        live = self._lookup(h.path)
+        if live is None:
+            h.send_error(404)
+            return
+        try:
+            f, size, attempt = live.open()
+        except OSError:
+            h.send_error(404)
+            return
+        with f:
+            first, last = 0, size - 1
+            span = None
+            if size and h.headers.get("Range"):
+                try:
+                    span = self._range(h.headers["Range"], size)
+                except ValueError:
+                    h.send_response(416)
+                    h.send_header("Content-Range", f"bytes */{size}")
+                    h.send_header("Content-Length", "0")
+                    h.end_headers()
+                    return
+            if span is not None:
+                first, last = span
+            h.send_response(206 if span is not None else 200)
+            h.send_header("Content-Type", "video/mp4"
+                          if live.dest.endswith(".mp4")
+                          else "application/octet-stream")
+            if size:
+                h.send_header("Accept-Ranges", "bytes")
+                h.send_header("Content-Length", str(last - first + 1))
+            else:
+                # length unknown until the download ends
+                h.close_connection = True
+            if span is not None:
+                h.send_header("Content-Range",
+                              f"bytes {first}-{last}/{size}")
+            h.end_headers()
+            if not body:
+                return
+            METRICS.inc("hdrezka_play_requests_total")
+            pos = first
+            try:
+                while not size or pos <= last:
+                    ready = live.wait(attempt, pos)
+                    if ready <= pos:
+                        break
+                    f.seek(pos)
+                    end = ready if not size else min(ready, last + 1)
+                    chunk = f.read(min(end - pos, CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    h.wfile.write(chunk)
+                    pos += len(chunk)
+                    METRICS.inc("hdrezka_play_bytes_total", len(chunk))
+            except OSError as e:
+                # player gone, or the download restarted: a player
+                # reconnects with a Range request
+                debug("stream %s: %s", live.dest, e)
+                h.close_connection = True
+
+
 # ─────────────────────── HTTP session ────────────────────────────
 class HttpClient:
-    def __init__(self, site_url: str, credentials: dict):
+    """Site session shared by the whole process.
+
+    The cookie jar is saved to ``session_file`` (per site URL) and
+    restored on start; with a restored jar the homepage visit is skipped
+    until the site reports an expired session. Without one, the visit
+    happens lazily before the first site request. With a
+    :class:`Cassette` site requests are recorded or replayed instead,
+    starting from a fresh session. ``dns_cache`` installs
+    :data:`DNS_CACHE` process-wide until :meth:`close`; it is meant for
+    the CLI, not for a host application with resolvers of its own.
+    """
+
+    def __init__(self, site_url: str, credentials: dict,
+                 session_file: Optional[str] = SESSION_FILE,
+                 transport: str = "requests",
+                 cassette: Optional[Cassette] = None,
+                 dns_cache: bool = False):
+        self._dns_cache = dns_cache
+        if dns_cache:
+            DNS_CACHE.install()
+        factory = TRANSPORTS[transport]
         self.site_url = site_url.rstrip("/")
-        self._session = requests.Session()
+        # a cassette records or replays site requests (CDN ones stay
+        # live) from a fresh session, so the saved one is not used
+        self._session = (cassette.transport(factory) if cassette
+                         else factory())
+        if cassette:
+            session_file = None
         self._session.headers.update({
             "User-Agent": USER_AGENT,
             "Accept": (
@@ -239,42 +2363,176 @@ class HttpClient:
         if credentials:
             for key, val in credentials.items():
                 if val:
-                    self._session.cookies.set(
+                    self._session.cookies.set_cookie(make_cookie(
                         key, val,
-                        domain=urlparse(site_url).hostname,
-                    )
-        self._init_session()
+                        domain=urlparse(site_url).hostname or "",
+                    ))
+        # CDN transfers share one pooled session so finished and
+        # pre-warmed connections are reused by the next episode
+        self._cdn = factory(pool_size=CDN_POOL_SIZE)
+        self._cdn.headers.update({
+            "User-Agent": USER_AGENT,
+            "Accept": "*/*",
+            "Accept-Encoding": "identity",
+            "Connection": "keep-alive",
+        })
+        self._buffers = BufferPool()
+        self._prewarm_pool = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="prewarm"
+        )
+        self._prewarm_lock = threading.Lock()
+        self._prewarmed: dict = {}
+        self._session_file = session_file
+        self._credential_names = set(credentials or {})
+        self._init_lock = threading.Lock()
+        self._generation = 0
+        self._session_ready = self._restore_session()
 
     def _init_session(self):
-        debug(f"HttpClient._init_session() GET {self.site_url}/")
+        debug("HttpClient._init_session() GET %s/", self.site_url)
         try:
-            resp = self._session.get(self.site_url + "/", timeout=15)
-            debug(
-                f"HttpClient._init_session() status={resp.status_code}, "
-                f"cookies={dict(self._session.cookies)}"
-            )
+            with METRICS.timer("hdrezka_session_init_seconds"):
+                resp = self._session.get(self.site_url + "/", timeout=15)
+            debug("HttpClient._init_session() status=%s, cookies=%d",
+                  resp.status_code, len(self._session.cookies))
+            self.save_session()
         except Exception as e:
-            debug(f"HttpClient._init_session() error: {e}")
+            debug("HttpClient._init_session() error: %s", e)
+        finally:
+            self._session_ready = True
 
-    def get(self, url: str, **kwargs) -> requests.Response:
+    def _ensure_session(self):
+        if not self._session_ready:
+            with self._init_lock:
+                if not self._session_ready:
+                    self._init_session()
+
+    @property
+    def session_generation(self) -> int:
+        """Bumped on every refresh; read it before a request so a late
+        "session expired" answer can be recognised as stale."""
+        return self._generation
+
+    def refresh_session(self, seen_generation: int) -> bool:
+        """Single-flight session refresh.
+
+        Only the first caller that saw ``seen_generation`` re-inits; the
+        others block on the lock and return once it is done. Returns
+        whether this call performed the refresh.
+        """
+        with self._init_lock:
+            if self._generation != seen_generation:
+                return False
+            self._init_session()
+            self._generation += 1
+            return True
+
+    def _load_session_file(self) -> dict:
+        try:
+            with open(self._session_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _restore_session(self) -> bool:
+        if not self._session_file:
+            return False
+        saved = self._load_session_file().get(self.site_url)
+        if not saved or time.time() - saved.get("saved", 0) > SESSION_TTL:
+            return False
+        now = time.time()
+        restored = 0
+        for c in saved.get("cookies", []):
+            if c.get("expires") and c["expires"] < now:
+                continue
+            self._session.cookies.set_cookie(make_cookie(
+                c["name"], c["value"],
+                domain=c.get("domain", ""), path=c.get("path", "/"),
+                expires=c.get("expires"), secure=c.get("secure", False),
+            ))
+            restored += 1
+        debug("HttpClient restored %d cookie(s) from %s",
+              restored, self._session_file)
+        return restored > 0
+
+    def save_session(self):
+        """Persist the cookie jar (minus configured credentials)."""
+        if not self._session_file:
+            return
+        cookies = [
+            {
+                "name": c.name, "value": c.value, "domain": c.domain,
+                "path": c.path, "expires": c.expires, "secure": c.secure,
+            }
+            for c in list(self._session.cookies)
+            if c.name not in self._credential_names and not c.is_expired()
+        ]
+        state = self._load_session_file()
+        state[self.site_url] = {"saved": time.time(), "cookies": cookies}
+        tmp = self._session_file + ".tmp"
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp, self._session_file)
+        except OSError as e:
+            debug("save_session() error: %s", e)
+
+    def close(self):
+        self.save_session()
+        self._prewarm_pool.shutdown(wait=False)
+        self._session.close()
+        self._cdn.close()
+        if self._dns_cache:
+            self._dns_cache = False
+            DNS_CACHE.uninstall()
+
+    def get(self, url: str, **kwargs) -> Response:
+        self._ensure_session()
         kwargs.setdefault("timeout", 30)
         return self._session.get(url, **kwargs)
 
-    def get_page(self, url: str) -> requests.Response:
+    def get_page(self, url: str) -> Response:
         """GET page — sets Referer for subsequent AJAX calls."""
+        self._ensure_session()
         self._session.headers.update({
             "Referer": self.site_url + "/",
             "Sec-Fetch-Dest": "document",
             "Sec-Fetch-Mode": "navigate",
             "Sec-Fetch-Site": "same-origin",
         })
-        resp = self._session.get(url, timeout=30)
-        resp.raise_for_status()
-        self._session.headers["Referer"] = url
+        with METRICS.timer("hdrezka_page_seconds"):
+            resp = self._session.get(url, timeout=30)
+            resp.raise_for_status()
+        self.set_referer(url)
         return resp
 
-    def post_ajax(self, url: str, data: dict) -> requests.Response:
+    def set_referer(self, url: str):
+        """Send ``url`` as Referer from now on, as after :meth:`get_page`."""
+        self._session.headers["Referer"] = url
+
+    def fetch_page(self, url: str, params: Optional[dict] = None,
+                   headers: Optional[dict] = None) -> Response:
+        """Thread-safe page GET: headers are per request, session and
+        Referer are left untouched. The status is not checked so callers
+        can handle ``304 Not Modified``."""
+        self._ensure_session()
+        page_headers = {
+            "Referer": self.site_url + "/",
+            "Sec-Fetch-Dest": "document",
+            "Sec-Fetch-Mode": "navigate",
+            "Sec-Fetch-Site": "same-origin",
+        }
+        page_headers.update(headers or {})
+        with METRICS.timer("hdrezka_page_seconds"):
+            return self._session.get(
+                url, params=params, headers=page_headers, timeout=30
+            )
+
+    def post_ajax(self, url: str, data: dict) -> Response:
         """POST AJAX with browser-like headers."""
+        self._ensure_session()
         ajax_headers = {
             "X-Requested-With": "XMLHttpRequest",
             "Content-Type": (
@@ -290,130 +2548,319 @@ class HttpClient:
             url, data=data, headers=ajax_headers, timeout=30
         )
 
-    def download_stream(self, url: str, dest: str):
-        """Download a stream URL to file with progress bar."""
-        # Use a separate session for CDN downloads to avoid header conflicts
-        with requests.Session() as dl_session:
-            dl_session.headers.update({
-                "User-Agent": USER_AGENT,
-                "Accept": "*/*",
-                "Accept-Encoding": "identity",
-                "Connection": "keep-alive",
-            })
-            with dl_session.get(url, stream=True, timeout=60) as r:
-                r.raise_for_status()
-                total = int(r.headers.get("content-length", 0))
-
-                if total > 0:
-                    print(f"{Fore.CYAN}  File size: "
-                          f"{format_size(total)}{Style.RESET_ALL}")
-
-                os.makedirs(os.path.dirname(dest), exist_ok=True)
-                tmp = dest + ".part"
+    def content_length(self, url: str) -> Optional[int]:
+        """Size of a CDN file from a HEAD request; ``None`` if unknown."""
+        try:
+            with METRICS.timer("hdrezka_cdn_head_seconds"):
+                r = self._cdn.head(url, allow_redirects=True, timeout=15)
+            r.raise_for_status()
+            return int(r.headers["content-length"])
+        except (OSError, KeyError, ValueError) as e:
+            debug("content_length(%s) failed: %s", url, e)
+            return None
 
-                try:
-                    downloaded = 0
-                    start_time = time.time()
-
-                    with open(tmp, "wb") as f:
-                        if total > 0:
-                            with tqdm(
-                                total=total,
-                                unit="B",
-                                unit_scale=True,
-                                unit_divisor=1024,
-                                desc=os.path.basename(dest),
-                                ncols=80,
-                                bar_format=(
-                                    "{l_bar}{bar}| {n_fmt}/{total_fmt} "
-                                    "[{elapsed}<{remaining}, {rate_fmt}]"
-                                ),
-                            ) as bar:
-                                for chunk in r.iter_content(
-                                    chunk_size=CHUNK_SIZE
-                                ):
-                                    if chunk:
-                                        f.write(chunk)
-                                        bar.update(len(chunk))
-                                        downloaded += len(chunk)
+    def probe_rate(self, url: str,
+                   size: int = ETA_PROBE_BYTES) -> Optional[float]:
+        """Bytes/s of one connection reading the first ``size`` bytes of
+        ``url``, counted from the first ``READ_SLICE`` bytes; ``None`` on
+        failure."""
+        buf = self._buffers.acquire()
+        try:
+            with self._cdn.stream(
+                url, headers={"Range": f"bytes=0-{size - 1}"},
+                timeout=(15, STALL_TIMEOUT),
+            ) as r:
+                r.raise_for_status()
+                got = first = 0
+                started = ended = 0.0
+                want = READ_SLICE  # a small first read starts the clock
+                while got < size:
+                    n = self._cdn.readinto(r, memoryview(buf)[:want])
+                    if not n:
+                        break
+                    ended = time.perf_counter()
+                    if not started:
+                        started, first = ended, n
+                        want = len(buf)
+                    got += n
+        except self._cdn.network_errors + (OSError,) as e:
+            debug("probe_rate(%s) failed: %s", url, e)
+            return None
+        finally:
+            self._buffers.release(buf)
+        if ended <= started:
+            return None
+        rate = (got - first) / (ended - started)
+        METRICS.observe("hdrezka_eta_probe_rate_bytes_per_second", rate,
+                        buckets=RATE_BUCKETS)
+        return rate
+
+    def prewarm(self, url: str):
+        """Resolve and connect (TCP + TLS) to ``url``'s host in the
+        background, leaving the connection in the CDN pool."""
+        host = urlparse(url).hostname
+        now = time.monotonic()
+        with self._prewarm_lock:
+            last = self._prewarmed.get(host)
+            if not host or (last is not None
+                            and now - last < PREWARM_INTERVAL):
+                return
+            self._prewarmed[host] = now
+        self._prewarm_pool.submit(self._prewarm, url, host)
+
+    def _prewarm(self, url: str, host: str):
+        try:
+            with METRICS.timer("hdrezka_cdn_prewarm_seconds", host=host):
+                self._cdn.head(url, timeout=15).close()
+        except OSError as e:
+            debug("prewarm(%s) failed: %s", host, e)
+
+    def download_stream(self, url: str, dest: str,
+                        board: Optional[ProgressBoard] = None,
+                        resolve: Optional[Callable[[], str]] = None,
+                        label: Optional[str] = None,
+                        gate: Optional[PriorityGate] = None):
+        """Download a stream URL to file, reporting to a progress board.
+
+        Without ``board`` a private board and renderer are used, so a
+        standalone call still shows progress. If the CDN stalls or drops
+        the connection and ``resolve`` is given, it is called for a fresh
+        URL (often another CDN host) and the download continues from the
+        current offset with a Range request. ``label`` names the file on
+        the board (default: its basename). With ``gate`` the transfer is
+        either the job's priority one, published on the gate's live file
+        as it grows, or one of the others, which yield to it.
+        """
+        if board is None:
+            board = ProgressBoard()
+            with ProgressRenderer(board):
+                return self.download_stream(url, dest, board, resolve,
+                                            label, gate)
+
+        import hashlib
+        resumable = self._cdn.network_errors + (
+            ConnectionError, TimeoutError, StallError, RangeMismatchError,
+        )
+        # bytes arrive in file order, resumes included: one running hash
+        digest = hashlib.sha256()
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = dest + ".part"
+        name = label or os.path.basename(dest)
+        transfer: Optional[Transfer] = None
+        total = switches = 0
+        host = urlparse(url).hostname or "?"
+        priority = gate is not None and gate.dest == dest
+        live = gate.live if priority else None
+        slot = gate.slot(dest) if gate is not None else nullcontext()
+        try:
+            with slot, open(tmp, "wb") as f, WriteBehind(
+                f, digest, self._buffers, name,
+                live.advance if live is not None else None,
+            ) as writer:
+                while True:
+                    offset = transfer.done if transfer else 0
+                    requested = time.perf_counter()
+                    try:
+                        with self._cdn.stream(
+                            url, offset, timeout=(15, STALL_TIMEOUT),
+                        ) as r:
+                            # stream() returns once the headers are in
+                            ttfb = time.perf_counter() - requested
+                            METRICS.observe("hdrezka_cdn_ttfb_seconds",
+                                            ttfb, host=host)
+                            r.raise_for_status()
+                            if offset:
+                                self._check_resume(r, offset, total, host)
+                            if transfer is None:
+                                total = int(
+                                    r.headers.get("content-length", 0)
+                                )
+                                transfer = board.open(dest, total,
+                                                      label)
+                                transfer.ttfb = ttfb
+                                if live is not None:
+                                    live.begin(tmp, total)
+                            self._read_body(r, writer, transfer,
+                                            requested, gate, priority)
+                        if total and transfer.done < total:
+                            raise ConnectionError(
+                                "connection closed early"
+                            )
+                        break
+                    except resumable as exc:
+                        if (resolve is None
+                                or switches >= MAX_CDN_SWITCHES):
+                            raise
+                        switches += 1
+                        if isinstance(exc, StallError):
+                            reason, what = "slow", f"too slow ({exc})"
+                        elif isinstance(exc, RangeMismatchError):
+                            reason, what = "range", f"cannot resume ({exc})"
                         else:
-                            # No content-length — manual progress
-                            print(f"{Fore.YELLOW}  Downloading "
-                                  f"(size unknown)...{Style.RESET_ALL}")
-                            for chunk in r.iter_content(
-                                chunk_size=CHUNK_SIZE
-                            ):
-                                if chunk:
-                                    f.write(chunk)
-                                    downloaded += len(chunk)
-                                    elapsed = time.time() - start_time
-                                    speed = (
-                                        downloaded / elapsed
-                                        if elapsed > 0 else 0
-                                    )
-                                    sys.stdout.write(
-                                        f"\r  Downloaded: "
-                                        f"{format_size(downloaded)} "
-                                        f"({format_size(int(speed))}/s)"
-                                    )
-                                    sys.stdout.flush()
-                            print()  # newline after progress
-
-                    # Verify download
-                    actual_size = os.path.getsize(tmp)
-                    if total > 0 and actual_size < total * SIZE_TOLERANCE:
-                        raise DownloaderError(
-                            f"Incomplete: {format_size(actual_size)} / "
-                            f"{format_size(total)}"
+                            reason, what = "dropped", "dropped the connection"
+                        METRICS.inc(
+                            "hdrezka_transfer_stalls_total", host=host,
+                            reason=reason,
+                        )
+                        debug("%s: %s stalled: %s", name, host, exc)
+                        board.message(
+                            f"  {name}: {host} {what}"
+                            + ", re-resolving and resuming at "
+                            f"{transfer.done if transfer else 0} bytes",
+                            "warning", dest,
                         )
+                        url = resolve()
+                        host = urlparse(url).hostname or "?"
+                        METRICS.inc("hdrezka_cdn_switches_total",
+                                    host=host)
+
+            # Verify download
+            actual_size = os.path.getsize(tmp)
+            if total > 0 and actual_size != total:
+                raise DownloaderError(
+                    f"Incomplete: {format_size(actual_size)} / "
+                    f"{format_size(total)}"
+                )
+            problem = verify_mp4(tmp)
+            METRICS.inc("hdrezka_verify_total",
+                        outcome="ok" if problem is None else "bad")
+            if problem is not None:
+                raise DownloaderError(f"Broken MP4: {problem}")
+
+            os.replace(tmp, dest)
+            if live is not None:
+                live.end(ok=True)
+            try:
+                write_checksum(dest, digest.hexdigest())
+            except OSError as e:
+                log.warning("no checksum written for %s: %s", dest, e)
+            board.close(transfer, ok=True)
+
+            elapsed = transfer.finished - transfer.started
+            avg_speed = (
+                transfer.done / elapsed if elapsed > 0 else 0
+            )
+            self._record_transfer(host, transfer, "ok")
+            METRICS.observe(
+                "hdrezka_transfer_rate_bytes_per_second",
+                avg_speed, buckets=RATE_BUCKETS, host=host,
+            )
+            board.message(
+                f"  ✓ Saved {transfer.name}: "
+                f"{format_size(actual_size)} in "
+                f"{elapsed:.1f}s "
+                f"({format_size(int(avg_speed))}/s, "
+                f"TTFB {transfer.ttfb * 1000:.0f} ms)",
+                "ok", dest,
+            )
 
-                    os.replace(tmp, dest)
+        except Exception:
+            if transfer is not None:
+                board.close(transfer, ok=False)
+                self._record_transfer(host, transfer, "error")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if live is not None:
+                live.end(ok=False)
+            raise
 
-                    elapsed = time.time() - start_time
-                    avg_speed = downloaded / elapsed if elapsed > 0 else 0
-                    print(
-                        f"{Fore.GREEN}  ✓ Saved: "
-                        f"{format_size(actual_size)} in "
-                        f"{elapsed:.1f}s "
-                        f"({format_size(int(avg_speed))}/s)"
-                        f"{Style.RESET_ALL}"
-                    )
+    @staticmethod
+    def _check_resume(r: Response, offset: int, total: int, host: str):
+        """Raise ``RangeMismatchError`` unless ``r`` is the rest of the
+        same ``total``-byte file from byte ``offset``."""
+        if r.status_code != 206:
+            raise RangeMismatchError(f"{host} ignored Range request")
+        header = r.headers.get("content-range", "")
+        m = re.fullmatch(r"\s*bytes\s+(\d+)-\d+/(\d+|\*)\s*", header)
+        if not m or int(m.group(1)) != offset:
+            raise RangeMismatchError(
+                f"{host} sent {header or 'no range'} for bytes {offset}-"
+            )
+        if total and m.group(2) != "*" and int(m.group(2)) != total:
+            raise RangeMismatchError(
+                f"{host} serves {m.group(2)} bytes, not {total}"
+            )
 
-                except Exception:
-                    if os.path.exists(tmp):
-                        os.remove(tmp)
-                    raise
+    def _read_body(self, r: Response, writer: WriteBehind,
+                   transfer: Transfer, requested: float,
+                   gate: Optional[PriorityGate] = None,
+                   priority: bool = False):
+        """Read a response body into pool buffers handed to ``writer``;
+        raise ``StallError`` when the rate over the last ``STALL_WINDOW``
+        seconds is too low. Time spent held back by ``gate`` does not
+        count towards that rate.
+
+        A buffer is filled ``READ_SLICE`` bytes per read, so a CDN that
+        trickles data is checked every few seconds rather than once per
+        ``CHUNK_SIZE``."""
+        window = deque([(requested, transfer.done)])
+        paused = 0.0
+        buf: Optional[bytearray] = None
+        filled = 0
+        try:
+            while True:
+                if buf is None:
+                    buf = self._buffers.acquire()
+                    filled = 0
+                n = self._cdn.readinto(
+                    r, memoryview(buf)[filled:filled + READ_SLICE]
+                )
+                filled += n
+                if filled and (not n or filled == len(buf)):
+                    writer.submit(buf, filled)
+                    buf = None
+                if not n:
+                    return
+                transfer.add(n)
+                if gate is not None and priority:
+                    gate.feed(n)
+                elif gate is not None:
+                    paused += gate.throttle(n)
+                now = time.perf_counter() - paused
+                if now - window[-1][0] >= 1.0:
+                    # a sample a second keeps the window short
+                    window.append((now, transfer.done))
+                while (len(window) > 1
+                       and now - window[1][0] >= STALL_WINDOW):
+                    window.popleft()
+                since, done = window[0]
+                if now - since >= STALL_WINDOW:
+                    rate = (transfer.done - done) / (now - since)
+                    if rate < STALL_MIN_RATE:
+                        raise StallError(
+                            f"stalled at {format_size(int(rate))}/s"
+                        )
+        finally:
+            if buf is not None and filled:
+                # bytes already read are written before a resume
+                writer.submit(buf, filled)
+            elif buf is not None:
+                self._buffers.release(buf)
+
+    @staticmethod
+    def _record_transfer(host: str, transfer: Transfer, outcome: str):
+        METRICS.inc("hdrezka_transfer_bytes_total", transfer.done,
+                    host=host, outcome=outcome)
+        METRICS.observe("hdrezka_transfer_seconds",
+                        transfer.finished - transfer.started,
+                        host=host, outcome=outcome)
 
 
 # ─────────────────────── Stream decoder ──────────────────────────
 class StreamDecoder:
-    _trash_codes: Optional[list] = None
-
     @classmethod
-    def _build_trash_codes(cls) -> list:
-        if cls._trash_codes is None:
-            codes = []
-            for length in range(2, 4):
-                for combo in product(TRASH_CHARS, repeat=length):
-                    codes.append(
-                        base64.b64encode(
-                            "".join(combo).encode()
-                        ).decode()
-                    )
-            codes.sort(key=len, reverse=True)
-            cls._trash_codes = codes
-        return cls._trash_codes
+    def decode(cls, data: str) -> str:
+        with METRICS.timer("hdrezka_decode_seconds"):
+            return cls._decode(data)
 
     @classmethod
-    def decode(cls, data: str) -> str:
+    def _decode(cls, data: str) -> str:
         if not data:
             raise StreamDecodeError("Empty stream data")
 
-        debug(f"decode() input length: {len(data)}")
-        if len(data) > 200:
-            debug(f"decode() first 200: {data[:200]}")
-        else:
-            debug(f"decode() data: {data}")
+        if log.isEnabledFor(logging.DEBUG):
+            debug("decode() input length: %d", len(data))
+            debug("decode() data: %.200s", data)
 
         # Already decoded?
         if data.lstrip().startswith("[") and "http" in data:
@@ -425,7 +2872,7 @@ class StreamDecoder:
         for sep in SEPARATORS:
             if sep in data:
                 separator = sep
-                debug(f"decode() separator: {repr(sep)}")
+                debug("decode() separator: %r", sep)
                 break
 
         if separator is None:
@@ -435,10 +2882,10 @@ class StreamDecoder:
             raise StreamDecodeError("Unknown encoding format")
 
         parts = data.replace("#h", "").split(separator)
-        debug(f"decode() {len(parts)} parts")
+        debug("decode() %d parts", len(parts))
         blob = "".join(parts)
 
-        for code in cls._build_trash_codes():
+        for code in TRASH_CODES:
             blob = blob.replace(code, "")
 
         blob = re.sub(r"[^A-Za-z0-9+/=]", "", blob)
@@ -448,7 +2895,7 @@ class StreamDecoder:
             try:
                 result = base64.b64decode(blob).decode(encoding)
                 if "http" in result:
-                    debug(f"decode() OK ({encoding})")
+                    debug("decode() OK (%s)", encoding)
                     return result
             except (UnicodeDecodeError, BinasciiError):
                 continue
@@ -477,7 +2924,7 @@ class StreamDecoder:
                 if ".mp4" in url_part:
                     url_part = url_part.split(".mp4")[0] + ".mp4"
                 items.append((label, url_part))
-        debug(f"parse_qualities() → {len(items)} items")
+        debug("parse_qualities() → %d items", len(items))
         return items
 
     @classmethod
@@ -494,51 +2941,167 @@ class StreamDecoder:
 
 
 # ─────────────────────── Stream fetcher ──────────────────────────
+class VoiceInfo:
+    """What one translator offers: qualities and (series) episode lists,
+    ``{season: [episode numbers]}``."""
+    __slots__ = ("translator_id", "name", "qualities", "episodes", "error")
+
+    def __init__(self, translator_id: str, name: str):
+        self.translator_id = translator_id
+        self.name = name
+        self.qualities: List[str] = []
+        self.episodes: dict = {}
+        self.error: Optional[str] = None
+
+    @property
+    def best_quality(self) -> str:
+        return max(self.qualities, key=quality_rank, default="")
+
+    @property
+    def episode_count(self) -> int:
+        return sum(len(e) for e in self.episodes.values())
+
+    @staticmethod
+    def best(voices: List["VoiceInfo"]) -> Optional["VoiceInfo"]:
+        """Highest quality first, then the most episodes."""
+        usable = [v for v in voices if v.qualities and not v.error]
+        return max(
+            usable,
+            key=lambda v: (quality_rank(v.best_quality), v.episode_count),
+            default=None,
+        )
+
+
 class StreamFetcher:
     def __init__(self, client: HttpClient):
         self.client = client
         self._current_page_url: Optional[str] = None
         self._page_html: str = ""
+        self._page_generation = -1
+        self._page_lock = threading.Lock()
+        self._ajax_lock = threading.Lock()
+        self._ajax_inflight: dict = {}
+        self._ajax_recent: OrderedDict = OrderedDict()
+
+    def _page_current(self, page_url: str) -> bool:
+        return (self._current_page_url == page_url and
+                self._page_generation == self.client.session_generation)
 
     def _ensure_page_visited(self, page_url: str):
-        """Visit the content page to establish session cookies + Referer."""
-        if self._current_page_url == page_url:
+        """Visit the content page to establish session cookies + Referer.
+
+        Done once per page and session generation, however many workers
+        ask for it at the same time.
+        """
+        if self._page_current(page_url):
             return
-        debug(f"_ensure_page_visited() → {page_url}")
-        resp = self.client.get_page(page_url)
-        self._current_page_url = page_url
-        self._page_html = resp.text
-        debug(f"_ensure_page_visited() HTML={len(self._page_html)}, "
-              f"cookies={dict(self.client._session.cookies)}")
+        with self._page_lock:
+            if self._page_current(page_url):
+                return
+            generation = self.client.session_generation
+            debug("_ensure_page_visited() → %s", page_url)
+            resp = self.client.get_page(page_url)
+            self._page_html = resp.text
+            self._current_page_url = page_url
+            self._page_generation = generation
+            debug("_ensure_page_visited() HTML=%d, cookies=%d",
+                  len(self._page_html), len(self.client._session.cookies))
+
+    def use_page(self, page_url: str, html: str):
+        """Take ``html`` (e.g. a title page from :class:`TitleCache`) as
+        the visit of ``page_url`` instead of fetching it again. If the
+        site's session ended since, expiry handling visits it anew."""
+        with self._page_lock:
+            self.client.set_referer(page_url)
+            self._page_html = html
+            self._current_page_url = page_url
+            self._page_generation = self.client.session_generation
 
     def _ajax_url(self) -> str:
         t = str(time.time() * 1000)
         return f"{self.client.site_url}/ajax/get_cdn_series/?t={t}"
 
-    def _post_ajax(self, data: dict) -> dict:
+    @staticmethod
+    def _payload_key(data: dict) -> tuple:
+        return tuple(sorted((k, str(v)) for k, v in data.items()))
+
+    def _post_ajax(self, data: dict, reuse: bool = True) -> dict:
+        """POST with request coalescing keyed on the normalized payload.
+
+        Callers asking for a payload already in flight wait for that
+        request's answer; a successful answer is also reused for
+        ``AJAX_CACHE_TTL`` seconds unless ``reuse`` is False (e.g. when a
+        fresh stream URL is needed). The returned dict is shared and
+        must not be mutated.
+        """
+        key = self._payload_key(data)
+        action = data.get("action", "?")
+        with self._ajax_lock:
+            recent = self._ajax_recent.get(key) if reuse else None
+            if recent and time.time() - recent[0] < AJAX_CACHE_TTL:
+                METRICS.inc("hdrezka_ajax_coalesced_total",
+                            action=action, kind="recent")
+                return recent[1]
+            fut = self._ajax_inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._ajax_inflight[key] = Future()
+        if not leader:
+            METRICS.inc("hdrezka_ajax_coalesced_total",
+                        action=action, kind="inflight")
+            return fut.result()
+
+        try:
+            result = self._timed_ajax(data)
+        except BaseException as e:
+            with self._ajax_lock:
+                del self._ajax_inflight[key]
+            fut.set_exception(e)
+            raise
+        with self._ajax_lock:
+            del self._ajax_inflight[key]
+            if result.get("success"):
+                self._ajax_recent[key] = (time.time(), result)
+                self._ajax_recent.move_to_end(key)
+                while len(self._ajax_recent) > AJAX_CACHE_MAX:
+                    self._ajax_recent.popitem(last=False)
+        fut.set_result(result)
+        return result
+
+    def _timed_ajax(self, data: dict) -> dict:
+        with METRICS.timer(
+            "hdrezka_ajax_seconds", action=data.get("action", "?")
+        ) as timer:
+            result = self._request_ajax(data)
+            if not result.get("success"):
+                timer.labels["outcome"] = "rejected"
+            return result
+
+    def _request_ajax(self, data: dict) -> dict:
         url = self._ajax_url()
-        debug(f"_post_ajax() POST {url}")
-        debug(f"_post_ajax() data={data}")
+        debug("_post_ajax() POST %s data=%s", url, data)
 
         resp = self.client.post_ajax(url, data)
-        debug(f"_post_ajax() status={resp.status_code}, "
-              f"len={len(resp.text)}")
+        debug("_post_ajax() status=%s, len=%d",
+              resp.status_code, len(resp.content))
+        if resp.status_code >= 400:
+            resp.raise_for_status()
 
         try:
             result = resp.json()
         except Exception as e:
-            debug(f"_post_ajax() JSON error: {e}")
-            debug(f"_post_ajax() text[:500]: {resp.text[:500]}")
+            debug("_post_ajax() JSON error: %s", e)
+            debug("_post_ajax() text[:500]: %.500s", resp.text)
             raise
 
         success = result.get("success")
         url_val = result.get("url", "")
-        debug(f"_post_ajax() success={success}, "
-              f"has_url={bool(url_val)}")
+        debug("_post_ajax() success=%s, has_url=%s",
+              success, bool(url_val))
 
         if not success:
             msg = result.get("message", "")
-            debug(f"_post_ajax() message: {msg}")
+            debug("_post_ajax() message: %s", msg)
 
         return result
 
@@ -559,7 +3122,7 @@ class StreamFetcher:
             re.DOTALL,
         ):
             call_body = call_match.group(1)
-            debug(f"  initCDN call body len={len(call_body)}")
+            debug("  initCDN call body len=%d", len(call_body))
 
             # Extract all quoted strings
             for str_match in re.finditer(
@@ -573,15 +3136,14 @@ class StreamFetcher:
                 if len(s) < 50:
                     continue
                 candidates.append(s)
-                debug(f"  candidate len={len(s)}, "
-                      f"first80={s[:80]}")
+                debug("  candidate len=%d, first80=%.80s", len(s), s)
 
         # Also check for streams: 'encoded...' pattern
         for m in re.finditer(
             r"""streams\s*:\s*['"]([^'"]{100,})['"]""", html
         ):
             candidates.append(m.group(1))
-            debug(f"  streams: candidate len={len(m.group(1))}")
+            debug("  streams: candidate len=%d", len(m.group(1)))
 
         # Check for strings containing separators
         for sep in SEPARATORS:
@@ -592,24 +3154,25 @@ class StreamFetcher:
             ):
                 if len(m.group(1)) > 100:
                     candidates.append(m.group(1))
-                    debug(f"  sep-based candidate len={len(m.group(1))}")
+                    debug("  sep-based candidate len=%d", len(m.group(1)))
 
         if not candidates:
             debug("  no candidates found")
-            self._dump_html_debug()
+            if log.isEnabledFor(logging.DEBUG):
+                self._dump_html_debug()
             return None
 
         # Pick the longest candidate
         best = max(candidates, key=len)
-        debug(f"  best candidate len={len(best)}")
+        debug("  best candidate len=%d", len(best))
 
         # Validate it looks like encoded stream
         has_sep = any(sep in best for sep in SEPARATORS)
         has_b64 = bool(re.search(r'[A-Za-z0-9+/=]{20,}', best))
         has_http = "http" in best
 
-        debug(f"  has_sep={has_sep}, has_b64={has_b64}, "
-              f"has_http={has_http}")
+        debug("  has_sep=%s, has_b64=%s, has_http=%s",
+              has_sep, has_b64, has_http)
 
         if has_sep or has_b64 or has_http:
             return best
@@ -628,20 +3191,19 @@ class StreamFetcher:
             r'sof\.tv\.(initCDN\w+)\s*\(([^)]{0,300})',
             html,
         ):
-            debug(f"  {m.group(1)}({m.group(2)[:200]}...)")
+            debug("  %s(%.200s...)", m.group(1), m.group(2))
 
         for m in re.finditer(r'data-translator_id="(\d+)"', html):
-            debug(f"  translator_id={m.group(1)}")
+            debug("  translator_id=%s", m.group(1))
 
-        soup = BeautifulSoup(html, "html.parser")
+        soup = parse_html(html)
         scripts = soup.select("script")
         inline = [s for s in scripts if s.string]
         for i, s in enumerate(inline):
             text = s.string.strip()
             if any(kw in text.lower() for kw in
                    ("cdn", "stream", "player", "initcdn")):
-                debug(f"  script#{i} len={len(text)}: "
-                      f"{text[:300]}...")
+                debug("  script#%d len=%d: %.300s...", i, len(text), text)
 
     def _get_translator_info(self, html: str) -> dict:
         info = {}
@@ -665,21 +3227,46 @@ class StreamFetcher:
 
         return info
 
+    @staticmethod
+    def _session_expired(message: str) -> bool:
+        return "истекло" in message or "сессии" in message.lower()
+
+    def _refresh_session(self, page_url: str, action: str,
+                         seen_generation: int):
+        if self.client.refresh_session(seen_generation):
+            debug("Session expired, re-initialised")
+            METRICS.inc("hdrezka_session_reinits_total", action=action)
+        else:
+            METRICS.inc("hdrezka_session_reinit_joins_total", action=action)
+        self._ensure_page_visited(page_url)
+
     def get_stream_url(
         self, page_url: str, data: dict,
-        quality: str, is_series: bool
+        quality: str, is_series: bool,
+        policy: Optional[RetryPolicy] = None,
+        reuse: bool = True,
+        fallback: bool = True,
     ) -> str:
         """
         Get stream URL. Order:
-        1. AJAX request
+        1. AJAX request (retried per ``policy``)
         2. If AJAX fails — extract from page HTML
+        3. Then the page's own translator via AJAX
+
+        ``reuse=False`` skips recently cached answers, for when the
+        previous URL turned out to be dead or slow. ``fallback=False``
+        stops after 1: the other two may be a different voice.
         """
+        policy = policy or RetryPolicy()
         self._ensure_page_visited(page_url)
 
         # === AJAX ===
-        for attempt in range(1, MAX_RETRIES + 1):
+        attempt = 0
+        while True:
+            attempt += 1
+            generation = self.client.session_generation
             try:
-                r = self._post_ajax(data)
+                r = self._post_ajax(data, reuse=reuse)
                 if r.get("success") and r.get("url"):
                     debug("get_stream_url() AJAX OK")
                     decoded = StreamDecoder.decode(r["url"])
@@ -687,21 +3274,24 @@ class StreamFetcher:
                         decoded, quality
                     )
                     return url
-                else:
-                    msg = r.get("message", "")
-                    if "истекло" in msg or "сессии" in msg.lower():
-                        debug("Session expired, re-init...")
-                        self._current_page_url = None
-                        self.client._init_session()
-                        self._ensure_page_visited(page_url)
-                        if attempt < 3:
-                            time.sleep(RETRY_DELAY)
-                            continue
-                    break
+                msg = r.get("message", "")
+                if self._session_expired(msg):
+                    self._refresh_session(
+                        page_url, data.get("action", "?"), generation
+                    )
+                    raise SessionExpiredError(msg)
+                break
             except Exception as e:
-                debug(f"get_stream_url() AJAX err#{attempt}: {e}")
-                if attempt < MAX_RETRIES:
-                    time.sleep(RETRY_DELAY)
+                debug("get_stream_url() AJAX err#%d: %s", attempt, e)
+                delay = policy.next_delay(attempt, e, "ajax")
+                if delay is None:
+                    break
+                time.sleep(delay)
+
+        if not fallback:
+            raise ContentUnavailableError(
+                f"No stream for voice {data.get('translator_id')}"
+            )
 
         # === HTML fallback ===
         debug("get_stream_url() → HTML fallback")
@@ -712,20 +3302,20 @@ class StreamFetcher:
                 label, url = StreamDecoder.select_quality(
                     decoded, quality
                 )
-                debug(f"get_stream_url() HTML OK: {label}")
+                debug("get_stream_url() HTML OK: %s", label)
                 return url
             except StreamDecodeError as e:
-                debug(f"get_stream_url() HTML decode fail: {e}")
+                debug("get_stream_url() HTML decode fail: %s", e)
 
         # === Alt translator ===
         info = self._get_translator_info(self._page_html)
         alt_tid = info.get("translator_id")
         if alt_tid and alt_tid != data.get("translator_id"):
-            debug(f"get_stream_url() trying alt translator={alt_tid}")
+            debug("get_stream_url() trying alt translator=%s", alt_tid)
             alt = dict(data)
             alt["translator_id"] = alt_tid
             try:
-                r = self._post_ajax(alt)
+                r = self._post_ajax(alt, reuse=reuse)
                 if r.get("success") and r.get("url"):
                     decoded = StreamDecoder.decode(r["url"])
                     _, url = StreamDecoder.select_quality(
@@ -733,20 +3323,114 @@ class StreamFetcher:
                     )
                     return url
             except Exception as e:
-                debug(f"get_stream_url() alt fail: {e}")
+                debug("get_stream_url() alt fail: %s", e)
 
         raise ContentUnavailableError(
             "Cannot get stream. Region-locked? Try VPN."
         )
 
+    @staticmethod
+    def probe_payload(media: dict, translator_id: str,
+                      season: int = 1, episode: int = 1) -> dict:
+        """AJAX payload resolving one stream of ``media`` for a voice."""
+        payload: dict = {
+            "id": media["data-id"],
+            "translator_id": translator_id,
+        }
+        if media["type"] != "movie":
+            payload.update({
+                "season": season, "episode": episode,
+                "action": "get_stream",
+            })
+        else:
+            payload.update({
+                "is_camrip": 0, "is_ads": 0,
+                "is_director": 0, "favs": "",
+                "action": "get_movie",
+            })
+        return payload
+
+    def discover_voices(self, media: dict,
+                        max_workers: int = DISCOVERY_WORKERS,
+                        timeout: float = DISCOVERY_TIMEOUT
+                        ) -> List[VoiceInfo]:
+        """Resolve qualities (and episode maps) of every voice at once.
+
+        Voices that do not finish within ``timeout`` seconds are returned
+        with ``error="timeout"`` and nothing else; their probes may still
+        run, but on objects of their own. With several voices the HTML /
+        other translator fallbacks are skipped so each row describes
+        only that voice.
+        """
+        voices = media.get("translations_list") or []
+        if not voices:
+            tid = self.detect_translator_id(media.get("html", "")) or "0"
+            voices = [{"name": "Default", "id": tid}]
+        infos = [VoiceInfo(v["id"], v["name"]) for v in voices]
+        fallback = len(infos) == 1
+        self._ensure_page_visited(media["url"])
+
+        pool = ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(infos))),
+            thread_name_prefix="discover",
+        )
+        futures = {
+            pool.submit(self._discover_voice, media, info, fallback): info
+            for info in infos
+        }
+        done, pending = wait(futures, timeout=timeout)
+        for f in pending:
+            f.cancel()
+            futures[f].error = "timeout"
+        for f in done:
+            info = futures[f]
+            if f.exception() is not None:
+                info.error = str(f.exception())
+            else:
+                found = f.result()
+                info.episodes = found.episodes
+                info.qualities = found.qualities
+        pool.shutdown(wait=False)
+        debug("discover_voices() %d voice(s), %d timed out",
+              len(infos), len(pending))
+        return infos
+
+    def _discover_voice(self, media: dict, voice: VoiceInfo,
+                        fallback: bool) -> VoiceInfo:
+        """Probe ``voice`` into a new :class:`VoiceInfo`."""
+        info = VoiceInfo(voice.translator_id, voice.name)
+        is_series = media["type"] != "movie"
+        season = 1
+        if is_series:
+            info.episodes = self.get_episode_lists(
+                media["url"], media["data-id"], info.translator_id
+            )
+            if info.episodes:
+                season = min(info.episodes)
+        info.qualities = self.get_available_qualities(
+            media["url"],
+            self.probe_payload(media, info.translator_id, season),
+            is_series, fallback=fallback,
+        )
+        return info
+
     def get_available_qualities(
-        self, page_url: str, data: dict, is_series: bool
+        self, page_url: str, data: dict, is_series: bool,
+        fallback: bool = True,
     ) -> List[str]:
-        """Get list of available quality labels."""
+        """Get list of available quality labels.
+
+        ``fallback=False`` skips the page-HTML and alternative translator
+        fallbacks, which may describe a different voice.
+        """
         self._ensure_page_visited(page_url)
+        policy = RetryPolicy(attempts=2)
 
         # AJAX
-        for attempt in range(1, 3):
+        attempt = 0
+        while True:
+            attempt += 1
+            generation = self.client.session_generation
             try:
                 r = self._post_ajax(data)
                 if r.get("success") and r.get("url"):
@@ -756,20 +3440,25 @@ class StreamFetcher:
                         in StreamDecoder.parse_qualities(decoded)
                     ]
                     if quals:
-                        debug(f"qualities AJAX: {quals}")
+                        debug("qualities AJAX: %s", quals)
                         return quals
-                else:
-                    msg = r.get("message", "")
-                    if "истекло" in msg:
-                        self._current_page_url = None
-                        self.client._init_session()
-                        self._ensure_page_visited(page_url)
-                        time.sleep(RETRY_DELAY)
-                        continue
                     break
-            except Exception as e:
-                debug(f"qualities AJAX err: {e}")
+                msg = r.get("message", "")
+                if self._session_expired(msg):
+                    self._refresh_session(
+                        page_url, data.get("action", "?"), generation
+                    )
+                    raise SessionExpiredError(msg)
                 break
+            except Exception as e:
+                debug("qualities AJAX err: %s", e)
+                delay = policy.next_delay(attempt, e, "ajax")
+                if delay is None:
+                    break
+                time.sleep(delay)
+
+        if not fallback:
+            return []
 
         # HTML fallback
         debug("qualities → HTML fallback")
@@ -782,16 +3471,16 @@ class StreamFetcher:
                     in StreamDecoder.parse_qualities(decoded)
                 ]
                 if quals:
-                    debug(f"qualities HTML: {quals}")
+                    debug("qualities HTML: %s", quals)
                     return quals
             except Exception as e:
-                debug(f"qualities HTML err: {e}")
+                debug("qualities HTML err: %s", e)
 
         # Alt translator
         info = self._get_translator_info(self._page_html)
         alt_tid = info.get("translator_id")
         if alt_tid and alt_tid != data.get("translator_id"):
-            debug(f"qualities → alt translator={alt_tid}")
+            debug("qualities → alt translator=%s", alt_tid)
             alt = dict(data)
             alt["translator_id"] = alt_tid
             try:
@@ -805,7 +3494,7 @@ class StreamFetcher:
                     if quals:
                         return quals
             except Exception as e:
-                debug(f"qualities alt err: {e}")
+                debug("qualities alt err: %s", e)
 
         return []
 
@@ -813,7 +3502,22 @@ class StreamFetcher:
         self, page_url: str, data_id: str, translator_id: str
     ) -> dict:
         """Get {season: episode_count} map for a translator."""
-        self._ensure_page_visited(page_url)
+        return {
+            season: len(eps) for season, eps in
+            self.get_episode_lists(page_url, data_id, translator_id).items()
+        }
+
+    def get_episode_lists(
+        self, page_url: str, data_id: str, translator_id: str,
+        visit: bool = True,
+    ) -> dict:
+        """Get {season: [episode numbers]} for a translator ({} on error).
+
+        One ``get_episodes`` call; ``visit=False`` skips the title page
+        when the session is already established (watchlist sync).
+        """
+        if visit:
+            self._ensure_page_visited(page_url)
         payload = {
             "id": data_id,
             "translator_id": translator_id,
@@ -825,24 +3529,33 @@ class StreamFetcher:
                 combined = (r.get("seasons", "") or "") + \
                            (r.get("episodes", "") or "")
                 if combined:
-                    soup = BeautifulSoup(combined, "html.parser")
-                    tabs = soup.select("li[data-tab_id]")
-                    if tabs:
-                        eps = {}
-                        for li in tabs:
-                            sn = int(li.get("data-tab_id", 0))
-                            if sn > 0:
-                                items = soup.select(
-                                    f"li[data-season_id='{sn}']"
-                                )
-                                eps[sn] = len(items)
-                        if eps:
-                            debug(f"get_episodes_map() {eps}")
-                            return eps
+                    eps = self._parse_episode_lists(parse_html(combined))
+                    if eps:
+                        debug("get_episode_lists() %s",
+                              {s: len(e) for s, e in eps.items()})
+                        return eps
         except Exception as e:
-            debug(f"get_episodes_map() err: {e}")
+            debug("get_episode_lists() err: %s", e)
         return {}
 
+    @staticmethod
+    def _parse_episode_lists(soup) -> dict:
+        eps: dict = {}
+        for li in soup.select("li[data-tab_id]"):
+            sn = int(li.get("data-tab_id", 0))
+            if sn <= 0:
+                continue
+            numbers = []
+            for item in soup.select(f"li[data-season_id='{sn}']"):
+                try:
+                    numbers.append(int(item.get("data-episode_id", 0)))
+                except ValueError:
+                    continue
+            numbers = sorted({n for n in numbers if n > 0})
+            if numbers:
+                eps[sn] = numbers
+        return eps
+
     def episode_exists(
         self, page_url: str, data_id: str,
         translator_id: str, season: int, episode: int
@@ -869,7 +3582,7 @@ class StreamFetcher:
         ):
             m = re.search(pattern, html)
             if m:
-                debug(f"detect_translator_id() → {m.group(1)}")
+                debug("detect_translator_id() → %s", m.group(1))
                 return m.group(1)
         return None
 
@@ -894,22 +3607,36 @@ class SearchResult:
 
 
 class Search:
-    def __init__(self, query: str, client: HttpClient, site_url: str):
+    def __init__(self, query: str, client: HttpClient, site_url: str,
+                 content: Optional[bytes] = None):
         self._results: list = []
         self._site_url = site_url
-        resp = client.get(
-            f"{site_url}/search/",
-            params={
-                "do": "search",
-                "subaction": "search",
-                "q": query,
-            },
-        )
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.content, "html.parser")
+        if content is None:
+            resp = client.get(
+                self.url(site_url), params=self.params(query)
+            )
+            resp.raise_for_status()
+            content = resp.content
+        soup = parse_html(content)
         for tag in soup.select("div.b-content__inline_item"):
             self._parse_item(tag)
 
+    @classmethod
+    def from_results(cls, results: list, site_url: str) -> "Search":
+        """A search answered without a request (see :class:`Catalog`)."""
+        self = cls.__new__(cls)
+        self._results = list(results)
+        self._site_url = site_url
+        return self
+
+    @staticmethod
+    def url(site_url: str) -> str:
+        return f"{site_url}/search/"
+
+    @staticmethod
+    def params(query: str) -> dict:
+        return {"do": "search", "subaction": "search", "q": query}
+
     def _parse_item(self, tag):
         link_div = tag.select_one("div.b-content__inline_item-link")
         if not link_div:
@@ -967,16 +3694,22 @@ class Search:
 
 # ─────────────────────── Media info ──────────────────────────────
 class MediaInfo:
-    def __init__(self, result: SearchResult, client: HttpClient):
+    def __init__(self, result: SearchResult, client: HttpClient,
+                 html: Optional[str] = None):
         self._result = result
         self._client = client
-        self.url = result.url.split(".html")[0] + ".html"
-        resp = client.get_page(self.url)
-        self._html = resp.text
-        self._soup = BeautifulSoup(self._html, "html.parser")
+        self.url = self.page_url(result)
+        if html is None:
+            html = client.get_page(self.url).text
+        self._html = html
+        self._soup = parse_html(self._html)
         self._data: dict = {}
         self._parse()
 
+    @staticmethod
+    def page_url(result: SearchResult) -> str:
+        return result.url.split(".html")[0] + ".html"
+
     def _is_movie(self) -> bool:
         return "/films/" in self.url
 
@@ -1001,13 +3734,20 @@ class MediaInfo:
             base["type"] = "movie"
         else:
             base["type"] = "series"
-            seasons = self._soup.select(
-                "#simple-seasons-tabs > li"
-            )
-            base["seasons_count"] = max(len(seasons), 1)
+            seasons = []
+            for i, li in enumerate(
+                self._soup.select("#simple-seasons-tabs > li"), 1
+            ):
+                # tabs carry the season number, which may skip some
+                try:
+                    seasons.append(int(li.get("data-tab_id", i)))
+                except ValueError:
+                    seasons.append(i)
+            seasons = sorted(set(seasons)) or [1]
+            base["seasons_count"] = len(seasons)
             eps: dict = {}
             total = 0
-            for i in range(1, base["seasons_count"] + 1):
+            for i in seasons:
                 c = len(self._soup.select(
                     f"#simple-episodes-list-{i} > li"
                 ))
@@ -1073,77 +3813,563 @@ class MediaInfo:
         print()
 
 
+# ─────────────────────── Title cache ─────────────────────────────
+class _CacheEntry:
+    __slots__ = ("value", "fetched", "etag", "last_modified")
+
+    def __init__(self, value, resp: Response):
+        self.value = value
+        self.fetched = time.time()
+        self.etag = resp.headers.get("ETag")
+        self.last_modified = resp.headers.get("Last-Modified")
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class TitleCache:
+    """In-process cache of searches and parsed title pages.
+
+    Entries are served as-is within their TTL, then revalidated with a
+    conditional GET (``ETag`` / ``Last-Modified``); a ``304`` keeps the
+    parsed object. ``prefetch`` parses the top results' title pages in
+    the background so that selecting one is instant.
+
+    With a :class:`Catalog`, everything fetched is recorded there and a
+    search made before (in any earlier run) is answered from it at once,
+    refreshed in the background once older than ``SEARCH_CACHE_TTL``;
+    when the site cannot be reached, known titles are searched offline.
+    """
+
+    def __init__(self, client: HttpClient, site_url: str,
+                 prefetch_count: int = PREFETCH_TOP_N,
+                 catalog: Optional["Catalog"] = None):
+        self._client = client
+        self._site_url = site_url
+        self.catalog = catalog
+        self.prefetch_count = prefetch_count
+        self._lock = threading.Lock()
+        self._searches: OrderedDict = OrderedDict()
+        self._titles: OrderedDict = OrderedDict()
+        self._pending: dict = {}
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(prefetch_count, 1),
+            thread_name_prefix="prefetch",
+        )
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+    def _get(self, store: OrderedDict, key) -> Optional[_CacheEntry]:
+        with self._lock:
+            entry = store.get(key)
+            if entry is not None:
+                store.move_to_end(key)
+            return entry
+
+    def _put(self, store: OrderedDict, key, entry: _CacheEntry):
+        with self._lock:
+            store[key] = entry
+            store.move_to_end(key)
+            while len(store) > CACHE_MAX_ENTRIES:
+                store.popitem(last=False)
+
+    def _fetch(self, store: OrderedDict, key, ttl: float, url: str,
+               params: Optional[dict], parse):
+        entry = self._get(store, key)
+        if entry is not None and time.time() - entry.fetched < ttl:
+            METRICS.inc("hdrezka_cache_total", kind=key[0], result="hit")
+            return entry.value
+        resp = self._client.fetch_page(
+            url, params=params,
+            headers=entry.conditional_headers() if entry else None,
+        )
+        if entry is not None and resp.status_code == 304:
+            METRICS.inc("hdrezka_cache_total", kind=key[0],
+                        result="revalidated")
+            entry.fetched = time.time()
+            return entry.value
+        resp.raise_for_status()
+        METRICS.inc("hdrezka_cache_total", kind=key[0], result="miss")
+        value = parse(resp)
+        self._put(store, key, _CacheEntry(value, resp))
+        return value
+
+    def search(self, query: str, refresh: bool = True) -> Search:
+        query = query.strip()
+        catalog = self.catalog
+        if catalog is not None and self._get(
+            self._searches, ("search", query.lower())
+        ) is None:
+            known = catalog.search(self._client.site_url, query)
+            if known is not None:
+                fetched, results = known
+                METRICS.inc("hdrezka_cache_total", kind="search",
+                            result="catalog")
+                if refresh and time.time() - fetched >= SEARCH_CACHE_TTL:
+                    self._pool.submit(self._refresh_search, query)
+                return Search.from_results(results, self._site_url)
+        try:
+            return self._search_live(query)
+        except OSError as e:
+            found = catalog.find(self._client.site_url, query) if catalog else []
+            if not found:
+                raise
+            log.warning("search failed (%s), showing %d known title(s)",
+                        e, len(found))
+            return Search.from_results(found, self._site_url)
+
+    def _search_live(self, query: str) -> Search:
+        def parse(resp: Response) -> Search:
+            search = Search(query, self._client, self._site_url,
+                            resp.content)
+            if self.catalog is not None:
+                self.catalog.record_search(self._client.site_url, query,
+                                           search.results)
+            return search
+
+        return self._fetch(
+            self._searches, ("search", query.lower()), SEARCH_CACHE_TTL,
+            Search.url(self._site_url), Search.params(query), parse,
+        )
+
+    def _refresh_search(self, query: str):
+        try:
+            self._search_live(query)
+        except Exception as e:
+            debug("background refresh of %r failed: %s", query, e)
+
+    def _load_title(self, result: SearchResult) -> MediaInfo:
+        def parse(resp: Response) -> MediaInfo:
+            info = MediaInfo(result, self._client, resp.text)
+            if self.catalog is not None:
+                self.catalog.record_media(self._client.site_url,
+                                         info.data)
+            return info
+
+        url = MediaInfo.page_url(result)
+        return self._fetch(
+            self._titles, ("title", url), TITLE_CACHE_TTL, url, None, parse,
+        )
+
+    def prefetch(self, results: list):
+        """Start loading the first ``prefetch_count`` title pages."""
+        for result in results[:self.prefetch_count]:
+            url = MediaInfo.page_url(result)
+            with self._lock:
+                if url in self._pending:
+                    continue
+                fut = self._pool.submit(self._load_title, result)
+                self._pending[url] = fut
+            fut.add_done_callback(
+                lambda f, u=url: self._forget(u, f)
+            )
+
+    def _forget(self, url: str, fut: Future):
+        with self._lock:
+            if self._pending.get(url) is fut:
+                del self._pending[url]
+
+    def media(self, result: SearchResult) -> MediaInfo:
+        """Parsed title page — waits for a running prefetch if any."""
+        with self._lock:
+            fut = self._pending.get(MediaInfo.page_url(result))
+        if fut is not None:
+            try:
+                return fut.result()
+            except Exception as e:
+                debug("prefetch of %s failed: %s", result.url, e)
+        return self._load_title(result)
+
+
+# ─────────────────────── Catalog ─────────────────────────────────
+class Catalog:
+    """Persistent index of every title seen, in SQLite (``catalog.db``).
+
+    Search results, parsed title pages and voice discovery are recorded
+    per site; repeat searches are answered from here without a request
+    and :meth:`find` does full-text lookups (FTS5, or ``LIKE`` where the
+    SQLite build lacks it). Safe to share between threads.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS titles (
+            site TEXT NOT NULL, data_id TEXT NOT NULL,
+            name TEXT, media_type TEXT, year TEXT, country TEXT,
+            genre TEXT, url TEXT,
+            translators TEXT,  -- JSON [{"name", "id"}]
+            episodes TEXT,     -- JSON {translator_id: {season: [numbers]}},
+                               -- "" for the title page's default voice
+            details TEXT,      -- JSON duration / rating / genres
+            seen REAL, detailed REAL,
+            PRIMARY KEY (site, data_id)
+        );
+        CREATE TABLE IF NOT EXISTS searches (
+            site TEXT NOT NULL, query TEXT NOT NULL,
+            data_ids TEXT NOT NULL,  -- JSON, in result order
+            fetched REAL NOT NULL,
+            PRIMARY KEY (site, query)
+        );
+    """
+
+    def __init__(self, path: str = CATALOG_FILE):
+        import sqlite3
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        try:
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS titles_fts USING fts5("
+                "site UNINDEXED, data_id UNINDEXED, "
+                "name, year, country, genre, voices)"
+            )
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            debug("Catalog: no FTS5 (%s), using LIKE", e)
+            self.fts = False
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ── writes ──
+    def record_search(self, site: str, query: str, results: list):
+        now = time.time()
+        with self._lock, self._db:
+            for r in results:
+                self._db.execute(
+                    "INSERT INTO titles (site, data_id, name, media_type, "
+                    "year, country, genre, url, seen) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (site, data_id) DO UPDATE SET "
+                    "name=excluded.name, media_type=excluded.media_type, "
+                    "year=excluded.year, country=excluded.country, "
+                    "genre=excluded.genre, url=excluded.url, "
+                    "seen=excluded.seen",
+                    (site, r.data_id, r.name, r.media_type, r.year,
+                     r.country, r.genre, r.url, now),
+                )
+                self._reindex(site, r.data_id)
+            self._db.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?)",
+                (site, self._normalize(query),
+                 json.dumps([r.data_id for r in results]), now),
+            )
+
+    def record_media(self, site: str, data: dict):
+        """Store a parsed :class:`MediaInfo` (``data`` dict); a title no
+        search has listed yet is added from ``data``."""
+        details = {
+            "duration": data.get("duration"),
+            "rating": data.get("rating"),
+            "genres": data.get("genre"),
+        }
+        genre = data.get("genre")
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO titles (site, data_id, name, media_type, year, "
+                "country, genre, url, translators, details, seen, detailed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (site, data_id) DO UPDATE SET "
+                "translators=excluded.translators, "
+                "details=excluded.details, detailed=excluded.detailed",
+                (site, data["data-id"], data.get("name", ""),
+                 data.get("type", ""), data.get("year", ""),
+                 data.get("country", ""),
+                 ", ".join(genre) if isinstance(genre, list) else genre or "",
+                 data.get("url", ""),
+                 json.dumps(data.get("translations_list") or [],
+                            ensure_ascii=False),
+                 json.dumps(details, ensure_ascii=False), now, now),
+            )
+            if data.get("type") == "series":
+                self._set_episodes(site, data["data-id"], "", {
+                    s: episode_numbers(data, s)
+                    for s in season_numbers(data)
+                })
+            self._reindex(site, data["data-id"])
+
+    def record_episodes(self, site: str, data_id: str,
+                        translator_id: str, episodes: dict):
+        """Store one voice's ``{season: [episode numbers]}``."""
+        with self._lock, self._db:
+            self._set_episodes(site, data_id, translator_id, episodes)
+
+    def _set_episodes(self, site: str, data_id: str, translator_id: str,
+                      episodes: dict):
+        # a title not listed by any search yet gets a bare row
+        self._db.execute(
+            "INSERT OR IGNORE INTO titles (site, data_id, seen) "
+            "VALUES (?, ?, ?)", (site, data_id, time.time()),
+        )
+        row = self._db.execute(
+            "SELECT episodes FROM titles WHERE site=? AND data_id=?",
+            (site, data_id),
+        ).fetchone()
+        stored = json.loads(row[0] or "{}")
+        # the numbers, not counts: the site's lists may skip some
+        stored[translator_id] = {str(s): list(e) for s, e in episodes.items()}
+        self._db.execute(
+            "UPDATE titles SET episodes=? WHERE site=? AND data_id=?",
+            (json.dumps(stored), site, data_id),
+        )
+
+    def _reindex(self, site: str, data_id: str):
+        if not self.fts:
+            return
+        row = self._db.execute(
+            "SELECT name, year, country, genre, translators FROM titles "
+            "WHERE site=? AND data_id=?", (site, data_id),
+        ).fetchone()
+        if row is None:
+            return
+        self._db.execute(
+            "DELETE FROM titles_fts WHERE site=? AND data_id=?",
+            (site, data_id),
+        )
+        voices = " ".join(t["name"] for t in json.loads(row[4] or "[]"))
+        self._db.execute(
+            "INSERT INTO titles_fts VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (site, data_id) + tuple(row[:4]) + (voices,),
+        )
+
+    # ── reads ──
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    # SearchResult's constructor order
+    _FIELDS = ("name", "media_type", "year", "country", "genre", "data_id",
+               "url")
+    _COLUMNS = ", ".join(_FIELDS)
+
+    def search(self, site: str, query: str
+               ) -> Optional[Tuple[float, List[SearchResult]]]:
+        """``(fetched, results)`` of an earlier identical search."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data_ids, fetched FROM searches "
+                "WHERE site=? AND query=?", (site, self._normalize(query)),
+            ).fetchone()
+            if row is None:
+                return None
+            found = {}
+            for data_id in json.loads(row[0]):
+                r = self._db.execute(
+                    f"SELECT {self._COLUMNS} FROM titles "
+                    f"WHERE site=? AND data_id=?", (site, data_id),
+                ).fetchone()
+                if r is not None:
+                    found[data_id] = r
+        results = [SearchResult(i, *r)
+                   for i, r in enumerate(found.values(), 1)]
+        return row[1], results
+
+    def find(self, site: str, text: str,
+             limit: int = CATALOG_FIND_LIMIT) -> List[SearchResult]:
+        """Known titles matching every word of ``text`` (name, year,
+        country, genre or voice), best match first."""
+        words = re.findall(r"\w+", text.lower())
+        if not words:
+            return []
+        with self._lock:
+            if self.fts:
+                match = " ".join(f'"{w}"*' for w in words)
+                rows = self._db.execute(
+                    f"SELECT {', '.join('t.' + c for c in self._FIELDS)} "
+                    f"FROM titles_fts f JOIN titles t "
+                    f"ON t.site = f.site AND t.data_id = f.data_id "
+                    f"WHERE titles_fts MATCH ? AND f.site = ? "
+                    f"ORDER BY bm25(titles_fts) LIMIT ?",
+                    (match, site, limit),
+                ).fetchall()
+            else:
+                cond = " AND ".join(
+                    "lower(name || ' ' || year || ' ' || country || ' ' "
+                    "|| genre || ' ' || ifnull(translators, '')) LIKE ?"
+                    for _ in words
+                )
+                rows = self._db.execute(
+                    f"SELECT {self._COLUMNS} FROM titles "
+                    f"WHERE site = ? AND {cond} ORDER BY seen DESC LIMIT ?",
+                    (site, *[f"%{w}%" for w in words], limit),
+                ).fetchall()
+        return [SearchResult(i, *r) for i, r in enumerate(rows, 1)]
+
+    def title(self, site: str, data_id: str) -> Optional[dict]:
+        """Everything stored about one title, or ``None``."""
+        with self._lock:
+            cur = self._db.execute(
+                "SELECT * FROM titles WHERE site=? AND data_id=?",
+                (site, data_id),
+            )
+            row = cur.fetchone()
+            names = [c[0] for c in cur.description]
+        if row is None:
+            return None
+        d = dict(zip(names, row))
+        for key in ("translators", "episodes", "details"):
+            d[key] = json.loads(d[key]) if d[key] else None
+        return d
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT count(*) FROM titles"
+            ).fetchone()[0]
+
+
 # ─────────────────────── Downloader ──────────────────────────────
+def episode_numbers(media: dict, season: int) -> Sequence[int]:
+    """Episode numbers of ``season`` in ascending order.
+
+    From the site's episode list (``media["seasons_episodes"]``), which
+    may skip numbers; ``1..count`` when only counts are known.
+    """
+    lists = media.get("seasons_episodes") or {}
+    if season in lists:
+        return lists[season]
+    return range(1, media["seasons_episodes_count"].get(season, 0) + 1)
+
+
+def season_numbers(media: dict) -> List[int]:
+    """Season numbers of a series in ascending order; like episodes,
+    the site's season tabs may skip numbers."""
+    return sorted(media["seasons_episodes_count"])
+
+
+def numbers_text(numbers: Sequence[int]) -> str:
+    """``1–5`` for a run without gaps, ``1, 3, 4`` otherwise."""
+    if not numbers:
+        return "none"
+    if len(numbers) == 1:
+        return str(numbers[0])
+    if numbers[-1] - numbers[0] + 1 == len(numbers):
+        return f"{numbers[0]}–{numbers[-1]}"
+    return ", ".join(map(str, numbers))
+
+
+class PlannedEpisode:
+    """One episode of a job; ``url`` and ``size`` come from preflight."""
+    __slots__ = ("season", "episode", "dest", "url", "size", "downloader")
+
+    def __init__(self, season: int, episode: int, dest: str,
+                 downloader: "Downloader"):
+        self.season = season
+        self.episode = episode
+        self.dest = dest
+        self.url: Optional[str] = None
+        self.size: Optional[int] = None
+        self.downloader = downloader
+
+    @property
+    def tag(self) -> str:
+        tag = f"S{self.season:02d}E{self.episode:02d}"
+        subdir = self.downloader.subdir
+        return f"{subdir}/{tag}" if subdir else tag
+
+
 class Downloader:
+    """Downloads one title for one voice and quality.
+
+    Nothing is printed or prompted: status lines, transfers and failures
+    are reported to ``board`` (see :class:`ProgressBoard` and the event
+    classes), which a :class:`ProgressRenderer` or a
+    :class:`DownloadJob` consumes. With ``server`` the first episode
+    still to download (or the movie) goes first at full speed and can be
+    played from the server while it downloads.
+    """
+
     def __init__(self, media: dict, quality: str,
-                 config: Config, client: HttpClient):
+                 config: Config, client: HttpClient,
+                 stream: Optional[StreamFetcher] = None,
+                 translator_id: Optional[str] = None,
+                 board: Optional[ProgressBoard] = None,
+                 subdir: Optional[str] = None,
+                 server: Optional[StreamServer] = None):
         self.media = media
         self.quality = quality
         self.config = config
         self.client = client
-        self.stream = StreamFetcher(client)
+        self.board = board or ProgressBoard()
+        self.server = server
+        self.subdir = sanitize_filename(subdir) if subdir else None
+        # sharing the caller's fetcher lets the quality probe, the
+        # episode map and the first episode reuse each other's AJAX calls
+        self.stream = stream or StreamFetcher(client)
         self.safe_name = sanitize_filename(media["name"])
-        self.translator_id = self._choose_translation()
+        self.translator_id = translator_id or self._default_translation()
         if media["type"] != "movie":
             self._refresh_episode_map()
 
-    def _choose_translation(self) -> str:
+    def _default_translation(self) -> str:
         tlist = self.media.get("translations_list") or []
-        if not tlist:
-            detected = self.stream.detect_translator_id(
-                self.media.get("html", "")
-            )
-            if detected:
-                print(f"{Fore.CYAN}Auto-detected translator: "
-                      f"{detected}{Style.RESET_ALL}")
-                return detected
-            return "0"
-        if len(tlist) == 1:
-            print(f"{Fore.CYAN}Voice: "
-                  f"{tlist[0]['name']}{Style.RESET_ALL}")
+        if tlist:
+            self.board.message(f"Voice: {tlist[0]['name']}")
             return tlist[0]["id"]
-        print(f"{Fore.YELLOW}Available voices:{Style.RESET_ALL}")
-        for i, t in enumerate(tlist, 1):
-            print(f"  {Fore.CYAN}{i} — {t['name']}{Style.RESET_ALL}")
-        idx = prompt_int("Select voice", 1, len(tlist))
-        return tlist[idx - 1]["id"]
+        detected = self.stream.detect_translator_id(
+            self.media.get("html", "")
+        )
+        if detected:
+            self.board.message(f"Auto-detected translator: {detected}")
+            return detected
+        return "0"
 
     def _refresh_episode_map(self):
-        print(f"{Fore.YELLOW}Refreshing episodes…{Style.RESET_ALL}")
-        eps_map = self.stream.get_episodes_map(
+        self.board.message("Refreshing episodes…", "warning")
+        lists = self.stream.get_episode_lists(
             self.media["url"],
             self.media["data-id"],
             self.translator_id,
         )
-        if eps_map:
+        if lists:
+            eps_map = {s: len(e) for s, e in lists.items()}
             self.media["seasons_count"] = len(eps_map)
             self.media["seasons_episodes_count"] = eps_map
+            self.media["seasons_episodes"] = lists
             self.media["allepisodes"] = sum(eps_map.values())
-            print(
-                f"{Fore.GREEN}{len(eps_map)} season(s), "
-                f"{self.media['allepisodes']} episode(s)"
-                f"{Style.RESET_ALL}"
+            self.board.message(
+                f"{len(eps_map)} season(s), "
+                f"{self.media['allepisodes']} episode(s)", "ok"
             )
         else:
             self._probe_episodes()
 
     def _probe_episodes(self):
+        """Episode counts from ``get_stream`` probes when the site sends
+        no episode list; assumes episodes are numbered from 1 without
+        gaps."""
         eps_map: dict = {}
         total = 0
         did = self.media["data-id"]
         tid = self.translator_id
         purl = self.media["url"]
+
+        def exists(season: int, episode: int) -> bool:
+            return self.stream.episode_exists(purl, did, tid, season, episode)
+
         for season in range(1, MAX_SEASONS_SCAN + 1):
-            if not self.stream.episode_exists(
-                purl, did, tid, season, 1
-            ):
+            if not exists(season, 1):
                 break
-            lo, hi, best = 1, MAX_EPISODES_SCAN, 1
+            # gallop to the first missing power of two, then bisect:
+            # O(log n) probes however long the season is
+            best, hi = 1, 2
+            while hi <= EPISODE_PROBE_LIMIT and exists(season, hi):
+                best, hi = hi, hi * 2
+            lo, hi = best + 1, min(hi, EPISODE_PROBE_LIMIT + 1) - 1
             while lo <= hi:
                 mid = (lo + hi) // 2
-                if self.stream.episode_exists(
-                    purl, did, tid, season, mid
-                ):
+                if exists(season, mid):
                     best = mid
                     lo = mid + 1
                 else:
@@ -1153,20 +4379,38 @@ class Downloader:
         if eps_map:
             self.media["seasons_count"] = len(eps_map)
             self.media["seasons_episodes_count"] = eps_map
+            self.media.pop("seasons_episodes", None)
             self.media["allepisodes"] = total
-            print(
-                f"{Fore.GREEN}Probed: {len(eps_map)} season(s), "
-                f"{total} episode(s){Style.RESET_ALL}"
+            self.board.message(
+                f"Probed: {len(eps_map)} season(s), "
+                f"{total} episode(s)", "ok"
             )
 
+    def download(self, episodes: Optional[List[Tuple[int, int]]] = None):
+        """Movie, or the given ``(season, episode)`` pairs of a series
+        (all episodes when ``None``)."""
+        if self.media["type"] == "movie":
+            self.download_movie()
+        elif episodes is None:
+            self.download_all()
+        else:
+            episodes = list(episodes)
+            self._validate_episodes(episodes)
+            self._download_eps(episodes)
+
     def download_movie(self):
+        gate = None
+        if self.server is not None:
+            gate = self._priority(self._movie_path())
+        self._download_movie(gate)
+
+    def _download_movie(self, gate: Optional[PriorityGate]):
         dest = self._movie_path()
         if self._file_ok(dest):
-            print(f"{Fore.GREEN}Already downloaded: "
-                  f"{os.path.basename(dest)}{Style.RESET_ALL}")
+            self.board.skip(dest)
             return
 
-        print(f"{Fore.CYAN}Getting stream URL...{Style.RESET_ALL}")
+        self.board.message("Getting stream URL...")
         data = {
             "id": self.media["data-id"],
             "translator_id": self.translator_id,
@@ -1176,101 +4420,379 @@ class Downloader:
             "favs": "",
             "action": "get_movie",
         }
-        url = self.stream.get_stream_url(
-            self.media["url"], data, self.quality, is_series=False
-        )
-        print(f"{Fore.CYAN}Downloading: "
-              f"{os.path.basename(dest)}{Style.RESET_ALL}")
-        self.client.download_stream(url, dest)
+        try:
+            self._transfer(data, dest, self.board, RetryPolicy(),
+                           os.path.basename(dest), gate=gate)
+        except Exception as exc:
+            self.board.fail(dest, exc, os.path.basename(dest))
+        finally:
+            if gate is not None and gate.dest == dest:
+                gate.finish()
 
     def download_all(self):
-        for s in range(1, self.media["seasons_count"] + 1):
-            self.download_season(s)
+        seasons = season_numbers(self.media)
+        if not seasons:
+            raise SeasonOutOfRangeError("No seasons listed")
+        self._download_seasons(seasons)
 
     def download_season(self, season: int):
-        self._validate_season(season)
-        count = self.media["seasons_episodes_count"].get(season, 0)
-        print(f"{Fore.YELLOW}Season {season}: "
-              f"{count} episode(s){Style.RESET_ALL}")
-        self._download_eps(season, 1, count)
+        self.download_seasons(season, season)
 
     def download_seasons(self, start: int, end: int):
+        """Listed seasons numbered ``start..end``."""
         self._validate_season(start)
         self._validate_season(end)
-        for s in range(start, end + 1):
-            self.download_season(s)
+        self._download_seasons(
+            [s for s in season_numbers(self.media) if start <= s <= end]
+        )
+
+    def _download_seasons(self, seasons: List[int]):
+        for s in seasons:
+            count = self.media["seasons_episodes_count"].get(s, 0)
+            self.board.message(f"Season {s}: {count} episode(s)", "warning")
+        self._download_eps(
+            (s, e) for s in seasons for e in episode_numbers(self.media, s)
+        )
 
     def download_episodes(self, season: int, start: int, end: int):
+        """Episodes numbered ``start..end`` of ``season``; numbers the
+        site does not list inside the range are skipped."""
         self._validate_season(season)
-        count = self.media["seasons_episodes_count"].get(season, 0)
-        if start < 1 or end > count or start > end:
+        numbers = episode_numbers(self.media, season)
+        if (not numbers or start > end or start < numbers[0]
+                or end > numbers[-1]):
             raise EpisodeOutOfRangeError(
-                f"Range {start}-{end} invalid (has {count})"
+                f"Range {start}-{end} invalid (has "
+                + (f"{numbers[0]}–{numbers[-1]})" if numbers else "none)")
             )
-        self._download_eps(season, start, end)
+        self._download_eps(
+            (season, e) for e in numbers if start <= e <= end
+        )
 
-    def _download_eps(self, season: int, start: int, end: int):
-        with ThreadPoolExecutor(
-            max_workers=self.config.threads
-        ) as pool:
-            futures = {
-                pool.submit(self._dl_episode, season, ep): ep
-                for ep in range(start, end + 1)
-            }
-            for f in as_completed(futures):
-                ep = futures[f]
-                try:
-                    f.result()
-                except Exception as exc:
-                    print(
-                        f"{Fore.RED}S{season:02d}E{ep:02d} "
-                        f"failed: {exc}{Style.RESET_ALL}"
+    @classmethod
+    def download_voices(cls, downloaders: List["Downloader"],
+                        episodes: Optional[List[Tuple[int, int]]] = None):
+        """Several voices of one title as a single job.
+
+        The downloaders should share one ``board`` and ``stream`` and
+        have distinct ``subdir``; the first one's thread count applies.
+        Series episodes of every voice are planned together and run in
+        one pool; ``episodes`` a voice lacks are skipped for that voice.
+        With a ``server`` the first voice's first episode is prioritised.
+        """
+        lead = downloaders[0]
+        if lead.media["type"] == "movie":
+            gate = (lead._priority(lead._movie_path())
+                    if lead.server is not None else None)
+            with ThreadPoolExecutor(
+                max_workers=min(lead.config.threads, len(downloaders))
+            ) as pool:
+                list(pool.map(lambda dl: dl._download_movie(gate),
+                              downloaders))
+            return
+        pending: List[Iterable[PlannedEpisode]] = []
+        for dl in downloaders:
+            if episodes is None:
+                wanted: Iterable[Tuple[int, int]] = (
+                    (s, e) for s in season_numbers(dl.media)
+                    for e in episode_numbers(dl.media, s)
+                )
+            else:
+                known: dict = {}
+                for s in {s for s, _ in episodes}:
+                    known[s] = set(episode_numbers(dl.media, s))
+                wanted = [(s, e) for s, e in episodes if e in known[s]]
+                if len(wanted) < len(episodes):
+                    lead.board.message(
+                        f"{dl.subdir or dl.translator_id}: "
+                        f"{len(episodes) - len(wanted)} episode(s) not in "
+                        f"this voice", "warning"
                     )
+            pending.append(dl._pending(wanted))
+        first = next(pending[0], None) if lead.server is not None else None
+        lead._run(lead._preflight(chain.from_iterable(pending)), first)
+
+    def _download_eps(self, episodes: Iterable[Tuple[int, int]]):
+        pending = self._pending(episodes)
+        first = next(pending, None) if self.server is not None else None
+        self._run(self._preflight(pending), first)
+
+    def _run(self, plan: Iterable[PlannedEpisode],
+             first: Optional[PlannedEpisode] = None):
+        """Download ``plan`` on ``config.threads`` workers.
+
+        ``plan`` is consumed lazily: at most twice the thread count is
+        submitted at a time, so a job of thousands of episodes holds no
+        more futures than a short one. ``first`` starts before ``plan``
+        is preflighted and has priority over it (see
+        :class:`PriorityGate`).
+        """
+        board = self.board
+        policy = RetryPolicy()
+        threads = self.config.threads
+        items = iter(plan)
+        running: dict = {}
+        error: Optional[BaseException] = None
+        gate = None
+        if first is not None:
+            gate = first.downloader._priority(first.dest)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            if first is not None:
+                running[pool.submit(self._dl_episode, first, board,
+                                    policy, None, gate)] = first
+            # the next ``threads`` items: the last one starts when the
+            # task being submitted finishes, so that task warms its host
+            try:
+                ahead = deque(islice(items, threads))
+            except Exception as exc:
+                if not running:
+                    raise
+                ahead, error = deque(), exc
+            while ahead or running:
+                while ahead and len(running) < 2 * threads:
+                    item = ahead.popleft()
+                    if error is None:
+                        try:
+                            ahead.extend(islice(items, 1))
+                        except Exception as exc:
+                            # e.g. a later preflight round found no space:
+                            # finish what was planned, then re-raise
+                            error = exc
+                    upcoming = ahead[-1] if len(ahead) >= threads else None
+                    running[pool.submit(self._dl_episode, item, board,
+                                        policy, upcoming, gate)] = item
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for f in done:
+                    item = running.pop(f)
+                    try:
+                        f.result()
+                    except Exception as exc:
+                        board.fail(item.dest, exc, item.tag)
+        if error is not None:
+            raise error
+
+    def _pending(self, episodes: Iterable[Tuple[int, int]]
+                 ) -> Iterator[PlannedEpisode]:
+        """The ``episodes`` not yet on disk, lazily (the others are
+        reported as skipped)."""
+        skipped = 0
+        for season, episode in episodes:
+            item = PlannedEpisode(
+                season, episode, self._episode_path(season, episode), self
+            )
+            if self._file_ok(item.dest):
+                self.board.skip(item.dest, quiet=True)
+                skipped += 1
+            else:
+                yield item
+        if skipped:
+            self.board.message(
+                f"{skipped} episode(s) already downloaded", "ok"
+            )
 
-    def _dl_episode(self, season: int, episode: int):
-        dest = self._episode_path(season, episode)
-        tag = f"S{season:02d}E{episode:02d}"
-        if self._file_ok(dest):
-            print(f"{Fore.GREEN}{tag} already done{Style.RESET_ALL}")
+    def _preflight(self, plan: Iterable[PlannedEpisode]
+                   ) -> Iterator[PlannedEpisode]:
+        """Resolve and size planned episodes concurrently, check free
+        space and yield them largest first.
+
+        A long ``plan`` is handled ``PREFLIGHT_BATCH`` episodes at a time,
+        each round when the previous one is about to run out, so
+        resolved stream links are still fresh when they are used.
+        Raises ``InsufficientSpaceError`` when the known sizes of a round,
+        plus what earlier rounds still have to write, do not fit on the
+        disk holding ``DOWNLOADS_DIR``.
+        """
+        items = iter(plan)
+        batch = list(islice(items, PREFLIGHT_BATCH))
+        following = list(islice(items, 1))
+        rounds = planned = 0
+        written = self.board.bytes_done()
+        policy = RetryPolicy(attempts=2)
+        while batch:
+            rounds += 1
+            scope = (
+                f"{len(batch)}" if rounds == 1 and not following
+                else f"{'next' if rounds > 1 else 'first'} {len(batch)}"
+            )
+            self.board.message(
+                f"Preflight: checking {scope} episode(s)…", "warning"
+            )
+            self._resolve_batch(batch, policy)
+            batch.sort(key=lambda p: p.size or 0, reverse=True)
+
+            total = sum(p.size for p in batch if p.size is not None)
+            unknown = sum(p.size is None for p in batch)
+            free = self._free_space(self._base_dir())
+            # bytes of earlier rounds that are not on disk yet
+            owed = max(0, planned - (self.board.bytes_done() - written))
+            eta = self._estimate_eta(total, batch)
+            self.board.expect(total)
+            self.board.message(
+                f"Planned: {scope} episode(s), {format_size(total)}"
+                + (f" (+{unknown} of unknown size)" if unknown else "")
+                + (f", {format_size(free)} free" if free is not None else "")
+                + ", ETA "
+                + (format_duration(eta) if eta is not None else "unknown")
+            )
+            if free is not None and total + owed > free:
+                raise InsufficientSpaceError(
+                    f"Need {format_size(total + owed)}, only "
+                    f"{format_size(free)} free for "
+                    f"{os.path.abspath(DOWNLOADS_DIR)}"
+                )
+            planned += total
+            yield from batch
+            batch = following + list(islice(items, PREFLIGHT_BATCH - 1))
+            following = list(islice(items, 1))
+
+    @staticmethod
+    def _resolve_batch(batch: List[PlannedEpisode], policy: RetryPolicy):
+        with METRICS.timer("hdrezka_preflight_seconds"), ThreadPoolExecutor(
+            max_workers=PREFLIGHT_WORKERS, thread_name_prefix="preflight"
+        ) as pool:
+            list(pool.map(
+                lambda p: p.downloader._resolve_planned(p, policy), batch
+            ))
+
+    def _resolve_planned(self, item: PlannedEpisode, policy: RetryPolicy):
+        try:
+            item.url = self.stream.get_stream_url(
+                self.media["url"], self._episode_payload(item),
+                self.quality, is_series=True, policy=policy,
+                fallback=self.subdir is None,
+            )
+        except Exception as exc:
+            # left for the transfer to resolve (and report) itself
+            debug("preflight %s: %s", item.tag, exc)
             return
+        item.size = self.client.content_length(item.url)
+        self.board.emit(Resolved(item.dest, url=item.url, size=item.size))
+
+    def _estimate_eta(self, total: int,
+                      batch: List[PlannedEpisode]) -> Optional[float]:
+        """Seconds for ``total`` bytes of ``batch`` at the per-file rate
+        of this process's earlier transfers or, before the first one, of
+        a short read from the first resolved file; ``None`` if neither
+        is available."""
+        seconds = METRICS.total("hdrezka_transfer_seconds", outcome="ok")
+        done = METRICS.total("hdrezka_transfer_bytes_total", outcome="ok")
+        if seconds > 0 and done > 0:
+            rate: Optional[float] = done / seconds
+        else:
+            url = next((p.url for p in batch if p.url), None)
+            rate = self.client.probe_rate(url) if url and total else None
+            if not rate:
+                return None
+        return total / (rate * min(self.config.threads, len(batch)))
 
-        payload = {
-            "id": self.media["data-id"],
-            "translator_id": self.translator_id,
-            "season": season,
-            "episode": episode,
-            "action": "get_stream",
-        }
-        for attempt in range(1, MAX_RETRIES + 1):
+    @staticmethod
+    def _free_space(path: str) -> Optional[int]:
+        path = os.path.abspath(path)
+        while not os.path.isdir(path):
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+        return shutil.disk_usage(path).free
+
+    def _episode_payload(self, item: PlannedEpisode) -> dict:
+        return StreamFetcher.probe_payload(
+            self.media, self.translator_id, item.season, item.episode
+        )
+
+    def _dl_episode(self, item: PlannedEpisode,
+                    board: ProgressBoard, policy: RetryPolicy,
+                    upcoming: Optional[PlannedEpisode] = None,
+                    gate: Optional[PriorityGate] = None):
+        if upcoming is not None and upcoming.url:
+            self.client.prewarm(upcoming.url)
+        dl = item.downloader
+        try:
+            dl._transfer(dl._episode_payload(item), item.dest, board,
+                         policy, item.tag, url=item.url, gate=gate)
+        finally:
+            if gate is not None and gate.dest == item.dest:
+                gate.finish()
+
+    def _priority(self, dest: str) -> Optional[PriorityGate]:
+        """Gate giving ``dest`` precedence, which is published on
+        ``server`` for playing while it downloads; ``None`` if ``dest``
+        is already on disk (the server has it as is)."""
+        name = self._label(dest) or os.path.basename(dest)
+        if self._file_ok(dest):
+            self.board.message(
+                f"▶ {name} plays at {self.server.url(dest)}", "ok", dest,
+            )
+            return None
+        gate = PriorityGate(dest, self.server.publish(dest))
+        self.board.message(
+            f"▶ {name} plays at {self.server.url(dest)} while it "
+            f"downloads", "ok", dest,
+        )
+        return gate
+
+    def _transfer(self, payload: dict, dest: str, board: ProgressBoard,
+                  policy: RetryPolicy, tag: str, url: Optional[str] = None,
+                  gate: Optional[PriorityGate] = None):
+        """Resolve + download with retries; permanent errors fail fast.
+
+        A ``url`` resolved in advance is used for the first attempt only;
+        later attempts and mid-transfer CDN switches bypass the AJAX cache.
+        """
+        def resolve(reuse: bool = False) -> str:
+            # a voice's directory must not get another voice's stream
+            found = self.stream.get_stream_url(
+                self.media["url"], payload, self.quality,
+                is_series=payload["action"] == "get_stream",
+                policy=policy, reuse=reuse, fallback=self.subdir is None,
+            )
+            board.emit(Resolved(dest, url=found, size=None))
+            return found
+
+        attempt = 0
+        while True:
+            attempt += 1
             try:
-                url = self.stream.get_stream_url(
-                    self.media["url"], payload,
-                    self.quality, is_series=True,
-                )
-                print(f"{Fore.CYAN}{tag} downloading...{Style.RESET_ALL}")
-                self.client.download_stream(url, dest)
+                if url is None:
+                    url = resolve(reuse=attempt == 1)
+                self.client.download_stream(url, dest, board, resolve,
+                                            self._label(dest), gate)
                 if self._file_ok(dest):
-                    print(f"{Fore.GREEN}{tag} ✓{Style.RESET_ALL}")
                     return
+                raise DownloaderError("file missing after transfer")
             except Exception as exc:
-                if attempt < MAX_RETRIES:
-                    print(
-                        f"{Fore.YELLOW}{tag} attempt "
-                        f"{attempt}: {exc}{Style.RESET_ALL}"
-                    )
-                    time.sleep(RETRY_DELAY)
-                else:
+                url = None
+                delay = policy.next_delay(attempt, exc, "transfer")
+                if delay is None:
                     raise
+                board.message(
+                    f"{tag} attempt {attempt}: {exc} — "
+                    f"retry in {delay:.1f}s", "warning", dest
+                )
+                time.sleep(delay)
+
+    def _label(self, dest: str) -> Optional[str]:
+        """Display name of a file: prefixed with the voice when several
+        voices of a title are downloaded together."""
+        if self.subdir:
+            return f"{self.subdir}/{os.path.basename(dest)}"
+        return None
 
     def _base_dir(self) -> str:
+        if self.subdir:
+            return os.path.join(DOWNLOADS_DIR, self.safe_name, self.subdir)
         return os.path.join(DOWNLOADS_DIR, self.safe_name)
 
     def _episode_path(self, season: int, episode: int) -> str:
         return os.path.join(
             self._base_dir(),
-            f"s{season:02d}e{episode:02d}-{self.quality}.mp4",
+            self.episode_filename(season, episode, self.quality),
         )
 
+    @staticmethod
+    def episode_filename(season: int, episode: int, quality: str) -> str:
+        return f"s{season:02d}e{episode:02d}-{quality}.mp4"
+
     def _movie_path(self) -> str:
         return os.path.join(
             self._base_dir(),
@@ -1279,145 +4801,848 @@ class Downloader:
 
     @staticmethod
     def _file_ok(path: str) -> bool:
-        return os.path.isfile(path) and os.path.getsize(path) > 0
+        return (os.path.isfile(path) and os.path.getsize(path) > 0
+                and verify_mp4(path) is None)
 
     def _validate_season(self, season: int):
-        if season < 1 or season > self.media["seasons_count"]:
+        seasons = season_numbers(self.media)
+        if season not in seasons:
             raise SeasonOutOfRangeError(
-                f"Season {season} not in "
-                f"1–{self.media['seasons_count']}"
+                f"Season {season} not in {numbers_text(seasons)}"
             )
 
+    def _validate_episodes(self, episodes: List[Tuple[int, int]]):
+        known: dict = {}
+        for season, episode in episodes:
+            if season not in known:
+                self._validate_season(season)
+                known[season] = set(episode_numbers(self.media, season))
+            if episode not in known[season]:
+                numbers = episode_numbers(self.media, season)
+                raise EpisodeOutOfRangeError(
+                    f"S{season:02d}E{episode:02d} not listed"
+                    + (f" ({len(numbers)} episode(s), "
+                       f"{numbers[0]}–{numbers[-1]})" if numbers else "")
+                )
 
-# ─────────────────────── Main ────────────────────────────────────
-def main():
-    config = Config()
 
-    while True:
-        query = input(
-            f"\n{Fore.YELLOW}Search title "
-            f"(or '1' for settings, 'q' to quit): "
-            f"{Style.RESET_ALL}"
-        ).strip()
-
-        if query.lower() == "q":
-            print(f"{Fore.CYAN}Bye!{Style.RESET_ALL}")
+# ─────────────────────── Library API ─────────────────────────────
+class JobResult:
+    """Outcome of a :class:`DownloadJob`, by file path."""
+    __slots__ = ("completed", "skipped", "failed", "bytes")
+
+    def __init__(self):
+        self.completed: List[str] = []
+        self.skipped: List[str] = []
+        self.failed: dict = {}  # path -> error message
+        self.bytes = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+class DownloadJob:
+    """Handle of a download started with :func:`start_download`.
+
+    ``future`` resolves to a :class:`JobResult`, or to the error that
+    stopped the whole job (bad selection, not enough disk space). Events
+    are read with :meth:`events` or with ``async for event in job`` —
+    pick one per job. Until then only the last ``EVENT_BACKLOG`` of them
+    are kept, without :class:`Progress`; a reader that falls behind
+    loses progress events, never the others.
+    """
+
+    def __init__(self, board: ProgressBoard):
+        self.board = board
+        self.future: Future = Future()
+        self._result = JobResult()
+        self._backlog: deque = deque(maxlen=EVENT_BACKLOG)
+        self._queue: Optional[queue.Queue] = None  # set by events()
+        self._lock = threading.Lock()
+        self._async: Optional[tuple] = None
+        board.listener = self._emit
+
+    def _emit(self, event: Event):
+        with self._lock:
+            r = self._result
+            if isinstance(event, Completed):
+                if event.skipped:
+                    r.skipped.append(event.path)
+                else:
+                    r.completed.append(event.path)
+                    r.bytes += event.size
+            elif isinstance(event, Failed):
+                r.failed[event.path] = event.error
+            if isinstance(event, Progress):
+                # superseded by the next tick: only for a reader keeping up
+                if self._async is not None:
+                    if self._async[1].qsize() >= EVENT_BACKLOG:
+                        return
+                elif (self._queue is None
+                      or self._queue.qsize() >= EVENT_BACKLOG):
+                    return
+            if self._async is not None:
+                loop, aqueue = self._async
+                try:
+                    loop.call_soon_threadsafe(aqueue.put_nowait, event)
+                    return
+                except RuntimeError:
+                    # the reader stopped and its event loop is closed
+                    self._async = None
+                    if isinstance(event, Progress):
+                        return
+            if self._queue is not None:
+                self._queue.put(event)
+            else:
+                self._backlog.append(event)
+
+    def _run(self, action: Callable[[], None]):
+        _TICKER.add(self)
+        error: Optional[BaseException] = None
+        try:
+            action()
+        except BaseException as exc:
+            error = exc
+        _TICKER.discard(self)
+        try:
+            self._emit(_END)
+        finally:
+            if error is not None:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(self._result)
+
+    def start(self, action: Callable[[], None]) -> "DownloadJob":
+        threading.Thread(target=self._run, args=(action,),
+                         name="download-job", daemon=True).start()
+        return self
+
+    def tick(self):
+        """Emit a :class:`Progress` event per active transfer."""
+        for t in self.board.active():
+            self._emit(Progress(t.path, done=t.done, total=t.total))
+
+    def result(self, timeout: Optional[float] = None) -> JobResult:
+        return self.future.result(timeout)
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def events(self, timeout: Optional[float] = None) -> Iterator[Event]:
+        """Yield events until the job ends; ``queue.Empty`` is raised
+        after ``timeout`` seconds without one."""
+        with self._lock:
+            if self._queue is None:
+                self._queue = queue.Queue()
+                for event in self._backlog:
+                    self._queue.put(event)
+                self._backlog.clear()
+        while True:
+            event = self._queue.get(timeout=timeout)
+            if event is _END:
+                return
+            yield event
+
+    def __aiter__(self) -> AsyncIterator[Event]:
+        return self._aevents()
+
+    async def _aevents(self):
+        import asyncio
+        aqueue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            for event in self._backlog:
+                aqueue.put_nowait(event)
+            self._backlog.clear()
+            while self._queue is not None and not self._queue.empty():
+                aqueue.put_nowait(self._queue.get_nowait())
+            self._async = (asyncio.get_running_loop(), aqueue)
+        while True:
+            event = await aqueue.get()
+            if event is _END:
+                return
+            yield event
+
+
+class _ProgressTicker:
+    """One thread emitting :class:`Progress` events for all running jobs."""
+
+    def __init__(self, interval: float = PROGRESS_EVENT_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._jobs: set = set()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, job: DownloadJob):
+        with self._lock:
+            self._jobs.add(job)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="job-progress", daemon=True
+                )
+                self._thread.start()
+
+    def discard(self, job: DownloadJob):
+        with self._lock:
+            self._jobs.discard(job)
+
+    def _run(self):
+        try:
+            while True:
+                time.sleep(self.interval)
+                with self._lock:
+                    jobs = list(self._jobs)
+                for job in jobs:
+                    try:
+                        job.tick()
+                    except Exception as e:
+                        log.warning("progress events of a job failed: %s",
+                                    e)
+        finally:
+            with self._lock:
+                self._thread = None
+
+
+_TICKER = _ProgressTicker()
+_END = Event()  # end-of-stream marker on a job's event queue
+
+
+def start_download(client: HttpClient, media: dict, quality: str, *,
+                   translator_id: Optional[str] = None,
+                   translator_ids: Optional[List[str]] = None,
+                   episodes: Optional[List[Tuple[int, int]]] = None,
+                   threads: int = 10,
+                   stream: Optional[StreamFetcher] = None,
+                   board: Optional[ProgressBoard] = None,
+                   server: Optional[StreamServer] = None) -> DownloadJob:
+    """Download ``media`` (a :class:`MediaInfo` ``data`` dict) in the
+    background without printing or prompting.
+
+    ``translator_id`` defaults to the first voice; ``translator_ids``
+    downloads several voices in one pool instead, each into a
+    subdirectory named after the voice. For a series ``episodes`` lists
+    ``(season, episode)`` pairs (default: all). Pass ``board`` to draw
+    the job with a :class:`ProgressRenderer`. With ``server`` the first
+    episode still to download is fetched ahead of the rest and can be
+    played from the server while it downloads.
+    """
+    job = DownloadJob(board or ProgressBoard())
+
+    def action():
+        config = Config.from_dict({"threads": threads})
+        if not translator_ids:
+            Downloader(
+                media, quality, config, client, stream,
+                translator_id=translator_id, board=job.board,
+                server=server,
+            ).download(episodes)
             return
-        if query == "1":
-            config.change()
-            continue
-        if not query:
-            continue
-
-        client = HttpClient(config.site_url, config.credentials)
-        search = Search(query, client, config.site_url)
-        search.display()
-        if not search.results:
-            continue
-
-        title_idx = prompt_int(
-            "Select title #", 1, len(search.results)
-        )
-        result = search.get(title_idx)
+        # one fetcher: the title page is visited once for all voices
+        fetcher = stream or StreamFetcher(client)
+        names = {t["id"]: t["name"]
+                 for t in media.get("translations_list") or []}
+        Downloader.download_voices([
+            Downloader(dict(media), quality, config, client, fetcher,
+                       translator_id=tid, board=job.board,
+                       subdir=names.get(tid, tid), server=server)
+            for tid in translator_ids
+        ], episodes)
+
+    return job.start(action)
+
+
+# ─────────────────────── Watchlist ───────────────────────────────
+class WatchEntry:
+    """A followed series (one voice and quality) and the episodes seen."""
+    __slots__ = ("data_id", "translator_id", "quality", "name", "url",
+                 "interval", "checked", "episodes")
+
+    def __init__(self, data_id: str, translator_id: str, quality: str,
+                 name: str, url: str, interval: float = SYNC_INTERVAL):
+        self.data_id = data_id
+        self.translator_id = translator_id
+        self.quality = quality
+        self.name = name
+        self.url = url
+        self.interval = interval
+        self.checked = 0.0
+        self.episodes: dict = {}  # season -> sorted episode numbers
+
+    @property
+    def key(self) -> str:
+        return f"{self.data_id}:{self.translator_id}:{self.quality}"
+
+    def due(self, now: float) -> bool:
+        return now - self.checked >= self.interval
+
+    def new_episodes(self, lists: dict) -> List[Tuple[int, int]]:
+        return [(s, e) for s in sorted(lists) for e in lists[s]
+                if e not in self.episodes.get(s, ())]
+
+    def mark(self, season: int, episode: int):
+        seen = self.episodes.setdefault(season, [])
+        if episode not in seen:
+            seen.append(episode)
+            seen.sort()
+
+    def media(self) -> dict:
+        """Minimal :class:`MediaInfo` ``data`` for :class:`Downloader`."""
+        counts = {s: len(e) for s, e in self.episodes.items()}
+        return {
+            "name": self.name, "url": self.url, "data-id": self.data_id,
+            "type": "series", "translations_list": [],
+            "seasons_count": len(counts),
+            "seasons_episodes_count": counts,
+            "seasons_episodes": dict(self.episodes),
+            "allepisodes": sum(counts.values()),
+        }
 
-        info = MediaInfo(result, client)
-        info.display()
-        media = info.data
+    def to_dict(self) -> dict:
+        d = {name: getattr(self, name) for name in self.__slots__}
+        d["episodes"] = {str(s): e for s, e in self.episodes.items()}
+        return d
 
-        # ── Quality selection ──
+    @classmethod
+    def from_dict(cls, d: dict) -> "WatchEntry":
+        self = cls(d["data_id"], d["translator_id"], d["quality"],
+                   d.get("name", d["data_id"]), d["url"],
+                   d.get("interval", SYNC_INTERVAL))
+        self.checked = d.get("checked", 0.0)
+        self.episodes = {int(s): sorted(e)
+                         for s, e in d.get("episodes", {}).items()}
+        return self
+
+
+class Watchlist:
+    """Followed series, stored in ``watchlist.json``.
+
+    :meth:`check` asks the site for each due title's episode lists (one
+    ``get_episodes`` call per title, titles in parallel) and returns only
+    the episodes not seen before; :meth:`fetch` downloads them and marks
+    the ones that made it to disk.
+    """
+
+    def __init__(self, path: str = WATCHLIST_FILE):
+        self.path = path
+        self.entries: dict = {}  # key -> WatchEntry
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for d in json.load(f).get("titles", []):
+                    entry = WatchEntry.from_dict(d)
+                    self.entries[entry.key] = entry
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("ignoring unreadable %s: %s", path, e)
+
+    def save(self):
+        with self._lock:
+            state = {"titles": [e.to_dict() for e in self.entries.values()]}
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+    def add(self, media: dict, translator_id: str, quality: str,
+            episodes: dict, interval: float = SYNC_INTERVAL) -> WatchEntry:
+        """Follow ``media``; ``episodes`` ({season: [numbers]}) are the
+        ones already released, which later syncs will not fetch.
+
+        Raises ``ContentUnavailableError`` if ``episodes`` is empty: the
+        first sync would otherwise fetch the whole series.
+        """
+        if not any(episodes.values()):
+            raise ContentUnavailableError(
+                f"no released episodes known for {media['name']}"
+            )
+        entry = WatchEntry(media["data-id"], translator_id, quality,
+                           media["name"], media["url"], interval)
+        entry.episodes = {s: sorted(e) for s, e in episodes.items()}
+        entry.checked = time.time()
+        self.entries[entry.key] = entry
+        self.save()
+        return entry
+
+    def remove(self, key: str):
+        self.entries.pop(key, None)
+        self.save()
+
+    def check(self, stream: StreamFetcher, force: bool = False,
+              workers: int = SYNC_WORKERS,
+              catalog: Optional[Catalog] = None
+              ) -> List[Tuple[WatchEntry, Optional[List[Tuple[int, int]]]]]:
+        """New episodes per due title (``None`` if the check failed);
+        titles checked within their ``interval`` are left out unless
+        ``force``. The episode lists found are also stored in
+        ``catalog``."""
+        now = time.time()
+        due = [e for e in self.entries.values() if force or e.due(now)]
+        if not due:
+            return []
+
+        def lists(entry: WatchEntry) -> dict:
+            return stream.get_episode_lists(
+                entry.url, entry.data_id, entry.translator_id, visit=False
+            )
+
+        with METRICS.timer("hdrezka_sync_seconds"), ThreadPoolExecutor(
+            max_workers=min(workers, len(due)), thread_name_prefix="sync"
+        ) as pool:
+            found = list(pool.map(lists, due))
+        out = []
+        for entry, eps in zip(due, found):
+            METRICS.inc("hdrezka_sync_checks_total",
+                        outcome="ok" if eps else "error")
+            if not eps:
+                out.append((entry, None))
+                continue
+            entry.checked = now
+            out.append((entry, entry.new_episodes(eps)))
+            if catalog is not None:
+                catalog.record_episodes(stream.client.site_url,
+                                        entry.data_id, entry.translator_id,
+                                        eps)
+        self.save()
+        return out
+
+    def fetch(self, client: HttpClient, entry: WatchEntry,
+              episodes: List[Tuple[int, int]], threads: int = 10,
+              stream: Optional[StreamFetcher] = None,
+              board: Optional[ProgressBoard] = None) -> JobResult:
+        """Download ``episodes`` of ``entry`` and mark the saved ones.
+
+        Passing the ``stream`` used by :meth:`check` lets the download
+        reuse its ``get_episodes`` answer.
+        """
+        result = start_download(
+            client, entry.media(), entry.quality,
+            translator_id=entry.translator_id, episodes=episodes,
+            threads=threads, stream=stream, board=board,
+        ).result()
+        failed = {os.path.basename(p) for p in result.failed}
+        for season, episode in episodes:
+            name = Downloader.episode_filename(season, episode,
+                                               entry.quality)
+            if name not in failed:
+                entry.mark(season, episode)
+        self.save()
+        return result
+
+
+# ─────────────────────── Main ────────────────────────────────────
+def parse_args(argv: Optional[list] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Search and download movies and series from HDRezka."
+    )
+    parser.add_argument(
+        "--log-level", choices=LOG_LEVELS, default="warning",
+        help="diagnostic log level on stderr (default: warning)",
+    )
+    parser.add_argument(
+        "--log-json", action="store_true",
+        help="emit log records as JSON lines",
+    )
+    parser.add_argument(
+        "--profile", metavar="DIR",
+        help="profile the run (cProfile + tracemalloc), reports in DIR",
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, metavar="PORT",
+        help="serve Prometheus metrics on 127.0.0.1:PORT/metrics",
+    )
+    parser.add_argument(
+        "--metrics-json", metavar="FILE",
+        help="periodically dump metrics as JSON to FILE",
+    )
+    parser.add_argument(
+        "--metrics-interval", type=float, default=METRICS_INTERVAL,
+        metavar="SEC",
+        help=f"JSON dump interval (default: {METRICS_INTERVAL}s)",
+    )
+    parser.add_argument(
+        "--transport", choices=list(TRANSPORTS), default="requests",
+        help="HTTP backend (default: requests)",
+    )
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument(
+        "--record", metavar="FILE",
+        help="save every site request and response to a cassette FILE",
+    )
+    cassette.add_argument(
+        "--replay", metavar="FILE",
+        help="answer site requests from a cassette FILE, offline "
+             "(CDN downloads still use the network)",
+    )
+    parser.add_argument(
+        "--replay-latency", type=float, default=1.0, metavar="SCALE",
+        help="with --replay, multiply recorded response times by SCALE "
+             "(default: 1, 0 = no delay)",
+    )
+    parser.add_argument(
+        "--play", nargs="?", type=int, const=PLAY_PORT, metavar="PORT",
+        help=f"download the first chosen episode ahead of the others and "
+             f"stream it on 127.0.0.1:PORT while it downloads "
+             f"(default port: {PLAY_PORT})",
+    )
+    parser.add_argument(
+        "--verify", nargs="?", const=DOWNLOADS_DIR, metavar="DIR",
+        help=f"check MP4 structure of every file under DIR "
+             f"(default: {DOWNLOADS_DIR}) and exit",
+    )
+    parser.add_argument(
+        "--checksums", action="store_true",
+        help=f"with --verify, also re-hash files and compare with their "
+             f"{CHECKSUM_SUFFIX} sidecars",
+    )
+    parser.add_argument(
+        "--sync", action="store_true",
+        help=f"download new episodes of the series in {WATCHLIST_FILE} "
+             f"that are due for a check, then exit",
+    )
+    parser.add_argument(
+        "--sync-all", action="store_true",
+        help="like --sync, but check every title now",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list] = None):
+    args = parse_args(argv)
+    init_console()
+    setup_logging(args.log_level, args.log_json)
+    if args.metrics_port:
+        METRICS.serve(args.metrics_port)
+    with ExitStack() as stack:
+        if args.metrics_json:
+            stack.callback(METRICS.write_json, args.metrics_json)
+            stack.callback(METRICS.dump_every(
+                args.metrics_json, args.metrics_interval
+            ).set)
+        if args.profile:
+            stack.enter_context(Profiler(args.profile))
+        if args.verify is not None:
+            return _verify(args.verify, args.checksums)
+        cassette = None
+        if args.record or args.replay:
+            cassette = Cassette(args.record or args.replay,
+                                replay=bool(args.replay),
+                                latency=args.replay_latency)
+        if args.sync or args.sync_all:
+            return _sync(args.transport, force=args.sync_all,
+                         cassette=cassette)
+        server = None
+        if args.play is not None:
+            server = StreamServer(DOWNLOADS_DIR, args.play)
+            stack.callback(server.close)
+        _interactive(args.transport, cassette, server)
+
+
+def _verify(root: str, checksums: bool = False) -> int:
+    """Bulk MP4 check; exit status 1 if any file is broken."""
+    if not os.path.isdir(root):
+        print(f"{Fore.RED}Not a directory: {root}{Style.RESET_ALL}")
+        return 2
+    started = time.perf_counter()
+    checked = bad = unhashed = 0
+    for path, problem in verify_tree(root, checksums):
+        checked += 1
+        if problem is not None:
+            bad += 1
+            print(f"{Fore.RED}✗ {path}: {problem}{Style.RESET_ALL}")
+        elif checksums and read_checksum(path) is None:
+            unhashed += 1
+    elapsed = time.perf_counter() - started
+    color = Fore.RED if bad else Fore.GREEN
+    print(f"{color}Checked {checked} file(s) in {elapsed:.2f}s, "
+          f"{bad} broken"
+          + (f", {unhashed} without checksum" if unhashed else "")
+          + Style.RESET_ALL)
+    return 1 if bad else 0
+
+
+def _sync(transport: str = "requests", force: bool = False,
+          cassette: Optional[Cassette] = None) -> int:
+    """Fetch new watchlist episodes; exit status 1 if anything failed."""
+    watchlist = Watchlist()
+    if not watchlist.entries:
+        print(f"{Fore.YELLOW}Watchlist is empty — add a series after "
+              f"choosing its voice and quality.{Style.RESET_ALL}")
+        return 0
+    config = Config()
+    client = HttpClient(config.site_url, config.credentials,
+                        transport=transport, cassette=cassette,
+                        dns_cache=True)
+    catalog = Catalog()
+    failed = 0
+    try:
         stream = StreamFetcher(client)
-        is_series = media["type"] != "movie"
+        started = time.perf_counter()
+        checked = watchlist.check(stream, force=force, catalog=catalog)
+        updates = [(e, new) for e, new in checked if new]
+        print(f"{Fore.CYAN}Checked {len(checked)} of "
+              f"{len(watchlist.entries)} title(s) in "
+              f"{time.perf_counter() - started:.2f}s, "
+              f"{len(updates)} with new episodes{Style.RESET_ALL}")
+        for entry, new in checked:
+            if new is None:
+                failed += 1
+                print(f"{Fore.RED}✗ {entry.name}: check failed"
+                      f"{Style.RESET_ALL}")
+        for entry, new in updates:
+            print(f"{Fore.YELLOW}{entry.name}: "
+                  + ", ".join(f"S{s:02d}E{e:02d}" for s, e in new)
+                  + Style.RESET_ALL)
+            board = ProgressBoard()
+            try:
+                with ProgressRenderer(board):
+                    result = watchlist.fetch(client, entry, new,
+                                             config.threads, stream, board)
+            except DownloaderError as exc:
+                failed += 1
+                print(f"{Fore.RED}✗ {entry.name}: {exc}{Style.RESET_ALL}")
+                continue
+            failed += len(result.failed)
+    finally:
+        catalog.close()
+        client.close()
+    return 1 if failed else 0
 
-        first_tid = (
-            media["translations_list"][0]["id"]
-            if media["translations_list"]
-            else stream.detect_translator_id(
-                media.get("html", "")
-            ) or "0"
-        )
 
-        debug(f"data-id={media['data-id']}, "
-              f"translator={first_tid}, series={is_series}")
+def _interactive(transport: str = "requests",
+                 cassette: Optional[Cassette] = None,
+                 server: Optional[StreamServer] = None):
+    config = Config()
+    catalog = Catalog()
+    client: Optional[HttpClient] = None
+    cache: Optional[TitleCache] = None
+    try:
+        while True:
+            query = input(
+                f"\n{Fore.YELLOW}Search title "
+                f"(or '1' for settings, 'q' to quit): "
+                f"{Style.RESET_ALL}"
+            ).strip()
+
+            if query.lower() == "q":
+                print(f"{Fore.CYAN}Bye!{Style.RESET_ALL}")
+                return
+            if query == "1":
+                config.change()
+                if client is not None:
+                    cache.close()
+                    client.close()
+                client = cache = None
+                continue
+            if not query:
+                continue
+
+            if client is None:
+                client = HttpClient(config.site_url, config.credentials,
+                                    transport=transport, cassette=cassette,
+                                    dns_cache=True)
+                cache = TitleCache(client, config.site_url,
+                                   catalog=catalog)
+            search = cache.search(query)
+            search.display()
+            if not search.results:
+                continue
+            cache.prefetch(search.results)
 
-        probe: dict = {
-            "id": media["data-id"],
-            "translator_id": first_tid,
-        }
+            title_idx = prompt_int(
+                "Select title #", 1, len(search.results)
+            )
+            info = cache.media(search.get(title_idx))
+            info.display()
+            _run_title(config, client, info.data, catalog, server)
+    finally:
+        if client is not None:
+            cache.close()
+            client.close()
+        catalog.close()
+
+
+def _print_voices(voices: List[VoiceInfo], is_series: bool,
+                  best: VoiceInfo):
+    print(f"{Fore.YELLOW}Available voices:{Style.RESET_ALL}")
+    for i, v in enumerate(voices, 1):
+        quals = " ".join(q.strip("[]") for q in v.qualities)
+        line = f"  {i:>2} — {v.name[:28]:<28} {quals}"
         if is_series:
-            probe.update({
-                "season": 1, "episode": 1,
-                "action": "get_stream",
-            })
-        else:
-            probe.update({
-                "is_camrip": 0, "is_ads": 0,
-                "is_director": 0, "favs": "",
-                "action": "get_movie",
-            })
+            line += (f" | {v.episode_count} ep. / "
+                     f"{len(v.episodes)} season(s)")
+        mark = " ★" if v is best else ""
+        print(f"{Fore.CYAN}{line}{mark}{Style.RESET_ALL}")
+
+
+def _run_title(config: Config, client: HttpClient, media: dict,
+               catalog: Optional[Catalog] = None,
+               server: Optional[StreamServer] = None):
+    # ── Voice × quality discovery ──
+    stream = StreamFetcher(client)
+    if media.get("html"):
+        # the title page was just loaded, or prefetched: no second GET
+        stream.use_page(media["url"], media["html"])
+    is_series = media["type"] != "movie"
+    debug("data-id=%s, series=%s", media["data-id"], is_series)
+
+    print(f"{Fore.YELLOW}Checking voices…{Style.RESET_ALL}")
+    found = stream.discover_voices(media)
+    voices = [v for v in found if v.qualities]
+    if not voices:
+        print(f"{Fore.RED}No qualities found. "
+              f"Try different voice or VPN.{Style.RESET_ALL}")
+        return
+    if catalog is not None and is_series:
+        for v in voices:
+            catalog.record_episodes(client.site_url, media["data-id"],
+                                    v.translator_id, v.episodes)
+    if len(voices) < len(found):
+        print(f"{Fore.YELLOW}{len(found) - len(voices)} voice(s) "
+              f"unavailable or timed out.{Style.RESET_ALL}")
+    best = VoiceInfo.best(voices) or voices[0]
+    _print_voices(voices, is_series, best)
+    picked = [voices[i - 1] for i in prompt_indices(
+        "Select voice # (several: 1,3 / 2-4 / all)", len(voices),
+        default=voices.index(best) + 1,
+    )] if len(voices) > 1 else voices
+    voice = picked[0]
+
+    # with several voices: the qualities all of them have, if any
+    qualities = [
+        q for q in voice.qualities if all(q in v.qualities for v in picked)
+    ] or sorted({q for v in picked for q in v.qualities}, key=quality_rank)
+    print(f"{Fore.YELLOW}Available qualities:{Style.RESET_ALL}")
+    for i, q in enumerate(qualities, 1):
+        print(f"  {Fore.CYAN}{i} — {q}{Style.RESET_ALL}")
+    q_idx = prompt_int(
+        "Select quality #", 1, len(qualities),
+        default=qualities.index(max(qualities, key=quality_rank)) + 1,
+    )
+    quality = qualities[q_idx - 1].strip("[]")
+
+    lists: dict = {}
+    for v in picked:
+        for s, numbers in v.episodes.items():
+            lists[s] = sorted(set(lists.get(s, ())).union(numbers))
+    if is_series and lists:
+        media["seasons_count"] = len(lists)
+        media["seasons_episodes_count"] = {s: len(e) for s, e in lists.items()}
+        media["seasons_episodes"] = lists
+        media["allepisodes"] = sum(len(e) for e in lists.values())
+    if is_series and len(picked) == 1:
+        _offer_watch(media, voice, quality)
+    episodes = _choose_episodes(media) if is_series else None
+
+    board = ProgressBoard()
+    job = start_download(client, media, quality,
+                         translator_id=voice.translator_id,
+                         translator_ids=(
+                             [v.translator_id for v in picked]
+                             if len(picked) > 1 else None
+                         ),
+                         episodes=episodes, threads=config.threads,
+                         stream=stream, board=board, server=server)
+    try:
+        with ProgressRenderer(board):
+            result = job.result()
+    except InsufficientSpaceError as exc:
+        print(f"{Fore.RED}Not enough disk space: {exc}{Style.RESET_ALL}")
+        return
+    if result.failed:
+        print(f"\n{Fore.RED}✗ {len(result.failed)} file(s) "
+              f"failed{Style.RESET_ALL}")
+    else:
+        print(f"\n{Fore.GREEN}✓ Download complete!{Style.RESET_ALL}")
+    if server is not None:
+        print(f"{Fore.CYAN}Downloads stay playable on "
+              f"{server.host}:{server.port} until you quit"
+              f"{Style.RESET_ALL}")
+
+
+def _offer_watch(media: dict, voice: VoiceInfo, quality: str):
+    watchlist = Watchlist()
+    entry = watchlist.entries.get(
+        f"{media['data-id']}:{voice.translator_id}:{quality}"
+    )
+    if entry is not None:
+        print(f"{Fore.CYAN}On the watchlist, checked every "
+              f"{format_duration(entry.interval)}{Style.RESET_ALL}")
+        return
+    if not voice.episodes:
+        # no baseline: the first --sync would fetch every episode
+        print(f"{Fore.YELLOW}No episode list for this voice, so it "
+              f"cannot be watched for new episodes{Style.RESET_ALL}")
+        return
+    if prompt_choice("Add to watchlist for --sync? (y/N)",
+                     ["y", "n"], default="n") != "y":
+        return
+    hours = prompt_int("Check for new episodes every N hours", 1, 24 * 7,
+                       default=SYNC_INTERVAL // 3600)
+    # the episodes discovery found are the baseline; --sync fetches
+    # what comes next
+    try:
+        watchlist.add(media, voice.translator_id, quality, voice.episodes,
+                      interval=hours * 3600)
+    except ContentUnavailableError as exc:
+        print(f"{Fore.RED}Not added: {exc}{Style.RESET_ALL}")
+        return
+    print(f"{Fore.GREEN}Added to {WATCHLIST_FILE}{Style.RESET_ALL}")
 
-        qualities = stream.get_available_qualities(
-            media["url"], probe, is_series
-        )
-        if not qualities:
-            print(f"{Fore.RED}No qualities found. "
-                  f"Try different voice or VPN.{Style.RESET_ALL}")
-            continue
-
-        print(f"{Fore.YELLOW}Available qualities:{Style.RESET_ALL}")
-        for i, q in enumerate(qualities, 1):
-            print(f"  {Fore.CYAN}{i} — {q}{Style.RESET_ALL}")
-        q_idx = prompt_int("Select quality #", 1, len(qualities))
-        quality = qualities[q_idx - 1].strip("[]")
-
-        dl = Downloader(media, quality, config, client)
-
-        if media["type"] == "movie":
-            dl.download_movie()
-            print(f"\n{Fore.GREEN}✓ Movie download "
-                  f"complete!{Style.RESET_ALL}")
-        else:
-            print(f"{Fore.YELLOW}Download options:{Style.RESET_ALL}")
-            print("  1 — Single season")
-            print("  2 — Episode range")
-            print("  3 — Season range")
-            print("  4 — Entire series")
-            choice = prompt_int("Option", 1, 4)
-
-            sc = media["seasons_count"]
-
-            if choice == 1:
-                s = prompt_int(f"Season (1–{sc})", 1, sc)
-                dl.download_season(s)
-            elif choice == 2:
-                s = prompt_int(f"Season (1–{sc})", 1, sc)
-                ec = media["seasons_episodes_count"].get(s, 0)
-                print(f"{Fore.CYAN}Season {s}: "
-                      f"{ec} episode(s){Style.RESET_ALL}")
-                e1 = prompt_int("Start episode", 1, ec)
-                e2 = prompt_int("End episode", e1, ec)
-                dl.download_episodes(s, e1, e2)
-            elif choice == 3:
-                s1 = prompt_int(f"Start season (1–{sc})", 1, sc)
-                s2 = prompt_int(
-                    f"End season ({s1}–{sc})", s1, sc
-                )
-                dl.download_seasons(s1, s2)
-            elif choice == 4:
-                dl.download_all()
 
-            print(f"\n{Fore.GREEN}✓ Download "
-                  f"complete!{Style.RESET_ALL}")
+def _prompt_season(message: str, seasons: List[int]) -> int:
+    while True:
+        s = prompt_int(f"{message} ({numbers_text(seasons)})",
+                       seasons[0], seasons[-1])
+        if s in seasons:
+            return s
+        print(f"{Fore.RED}Season {s} is not listed.{Style.RESET_ALL}")
+
+
+def _choose_episodes(media: dict) -> List[Tuple[int, int]]:
+    print(f"{Fore.YELLOW}Download options:{Style.RESET_ALL}")
+    print("  1 — Single season")
+    print("  2 — Episode range")
+    print("  3 — Season range")
+    print("  4 — Entire series")
+    choice = prompt_int("Option", 1, 4)
+
+    seasons = season_numbers(media)
+    if not seasons:
+        print(f"{Fore.RED}No seasons listed.{Style.RESET_ALL}")
+        return []
+    if choice == 2:
+        s = _prompt_season("Season", seasons)
+        numbers = episode_numbers(media, s)
+        if not numbers:
+            print(f"{Fore.RED}Season {s} has no episodes.{Style.RESET_ALL}")
+            return []
+        first, last = numbers[0], numbers[-1]
+        print(f"{Fore.CYAN}Season {s}: {len(numbers)} episode(s)"
+              + (f", numbered {first}–{last}"
+                 if last - first + 1 != len(numbers) or first != 1 else "")
+              + Style.RESET_ALL)
+        e1 = prompt_int("Start episode", first, last)
+        e2 = prompt_int("End episode", e1, last)
+        return [(s, e) for e in numbers if e1 <= e <= e2]
+    if choice == 1:
+        s1 = s2 = _prompt_season("Season", seasons)
+    elif choice == 3:
+        s1 = _prompt_season("Start season", seasons)
+        s2 = _prompt_season("End season", [s for s in seasons if s >= s1])
+    else:
+        s1, s2 = seasons[0], seasons[-1]
+    return [(s, e) for s in seasons if s1 <= s <= s2
+            for e in episode_numbers(media, s)]
 
 
 if __name__ == "__main__":
     try:
-        main()
+        sys.exit(main())
     except KeyboardInterrupt:
         print(f"\n{Fore.YELLOW}Interrupted.{Style.RESET_ALL}")
         sys.exit(0)
     except Exception as exc:
         print(f"{Fore.RED}Fatal: {exc}{Style.RESET_ALL}")
-        if DEBUG:
-            import traceback
-            traceback.print_exc()
+        log.debug("fatal error", exc_info=True)
         sys.exit(1)